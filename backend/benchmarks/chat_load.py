@@ -0,0 +1,252 @@
+"""
+聊天链路端到端压测
+
+在进程内启动 legacy FastAPI 应用（uvicorn），替换为：
+- 假大模型（FakeDouBaoService，可配置首 token 延迟和生成速度）
+- 确定性哈希 embedding（EMBEDDING_ENGINE=hash）
+- 本地内存向量库（VECTOR_STORE_BACKEND=local），预先写入合成中医语料
+- 内存中的 MongoDB（mongomock）
+然后以指定并发压测 /api/v1/chat 和 /api/v1/knowledge/search，
+统计吞吐、p50/p99 延迟、首字节时间（TTFT）、响应在线路上的字节数以及 Server-Timing 中各阶段的平均耗时
+（serialize 为响应序列化耗时）。--accept-encoding 控制是否请求压缩，--excerpts 让引用只返回摘要。
+检索结果缓存默认关闭（问题集会重复，开启后测的主要是缓存命中），--retrieval-cache 开启并报告命中率。
+
+接口目前不是流式返回，TTFT 为客户端收到第一个响应字节的时间。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.chat_load --concurrency 8 --requests 200 --output results/chat_load.json
+    python -m benchmarks.chat_load --compare results/chat_load.json
+"""
+
+import argparse
+import asyncio
+import importlib
+import os
+import socket
+import threading
+import time
+from typing import Dict, List
+
+from benchmarks.common import compare_results, run_metadata, save_results, setup_paths, summarize
+from benchmarks.corpus import generate_corpus, generate_questions
+
+BENCH_API_KEY = "bench-api-key"
+
+ENDPOINTS = {
+    "chat": "/api/v1/chat",
+    "search": "/api/v1/knowledge/search",
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def build_app(args):
+    """
+    以离线配置导入 legacy 应用并生成合成语料
+    """
+    os.environ["DOUBAO_AK"] = BENCH_API_KEY
+    os.environ["VECTOR_STORE_BACKEND"] = "local"
+    os.environ["EMBEDDING_ENGINE"] = "hash"
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    os.environ["RETRIEVAL_CACHE_ENABLED"] = "true" if args.retrieval_cache else "false"
+    setup_paths()
+
+    from benchmarks.fakes import use_mongomock
+
+    legacy_main = importlib.import_module("main")
+    use_mongomock()
+    docs = generate_corpus(args.docs, seed=args.seed)
+    return legacy_main.app, docs
+
+
+def seed_services(app, docs, args):
+    """
+    服务容器在 lifespan 中创建：等后台预热结束后替换大模型服务，并把合成语料写入共享的向量库
+    （预热会创建真实的大模型服务，先替换可能被预热中的创建覆盖）
+    """
+    from benchmarks.fakes import FakeDouBaoService
+
+    services = app.state.services
+    if not services.warmed_up.wait(timeout=120):
+        raise RuntimeError("服务预热超时")
+    services.doubao = FakeDouBaoService(
+        first_token_latency=args.llm_latency,
+        tokens_per_second=args.llm_tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        blocking=args.llm_blocking
+    )
+    texts = [doc["content"] for doc in docs]
+    # 合成文档 id 不是 Mongo ObjectId，放在 corpus_doc_id 中，避免被当作文档 _id 返回
+    metadatas = [
+        {"corpus_doc_id": doc["doc_id"], **{key: doc[key] for key in ("title", "category", "tags", "source")}}
+        for doc in docs
+    ]
+    services.rag.vector_store.add_texts(texts, metadatas=metadatas)
+
+
+def start_server(app, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("uvicorn 启动超时")
+        time.sleep(0.05)
+    return server, thread
+
+
+def _payload(endpoint: str, question: str, args) -> Dict:
+    if endpoint == "chat":
+        return {"query": question, "history": [], "excerpts": args.excerpts}
+    return {"query": question, "limit": args.limit, "excerpts": args.excerpts}
+
+
+def _parse_server_timing(header: str) -> Dict[str, float]:
+    stages = {}
+    for item in filter(None, (part.strip() for part in header.split(","))):
+        name, _, dur = item.partition(";dur=")
+        if dur:
+            stages[name] = float(dur)
+    return stages
+
+
+async def run_endpoint(base_url: str, endpoint: str, questions: List[Dict], args) -> Dict:
+    import httpx
+
+    path = ENDPOINTS[endpoint]
+    headers = {"X-API-Key": BENCH_API_KEY, "Accept-Encoding": args.accept_encoding or "identity"}
+    latencies, ttfts, sizes, errors = [], [], [], 0
+    stage_totals: Dict[str, List[float]] = {}
+    counter = iter(range(args.warmup + args.requests))
+
+    async def worker(client):
+        nonlocal errors
+        for i in counter:
+            question = questions[i % len(questions)]["question"]
+            start = time.perf_counter()
+            first_byte = None
+            size = 0
+            async with client.stream("POST", path, json=_payload(endpoint, question, args), headers=headers) as resp:
+                async for raw in resp.aiter_raw():
+                    if first_byte is None:
+                        first_byte = time.perf_counter()
+                    size += len(raw)
+                status = resp.status_code
+                server_timing = resp.headers.get("server-timing", "")
+            end = time.perf_counter()
+
+            if i < args.warmup:
+                continue
+            if status != 200:
+                errors += 1
+                continue
+            latencies.append((end - start) * 1000)
+            ttfts.append(((first_byte or end) - start) * 1000)
+            sizes.append(size)
+            for stage, dur in _parse_server_timing(server_timing).items():
+                stage_totals.setdefault(stage, []).append(dur)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    completed = len(latencies)
+    return {
+        "requests": args.requests,
+        "completed": completed,
+        "errors": errors,
+        "concurrency": args.concurrency,
+        # 包含预热请求的墙钟时间，吞吐按全部请求计算
+        "throughput_rps": (args.warmup + args.requests) / elapsed if elapsed else 0.0,
+        "latency_ms": summarize(latencies),
+        "ttft_ms": summarize(ttfts),
+        "response_bytes": summarize(sizes),
+        "server_timing_mean_ms": {
+            stage: sum(values) / len(values) for stage, values in sorted(stage_totals.items())
+        },
+    }
+
+
+def print_report(results: Dict):
+    for endpoint, result in results["endpoints"].items():
+        latency, ttft = result["latency_ms"], result["ttft_ms"]
+        print(f"\n[{endpoint}] {result['completed']}/{result['requests']} ok, {result['errors']} errors, "
+              f"concurrency={result['concurrency']}")
+        print(f"  throughput   {result['throughput_rps']:.1f} req/s")
+        print(f"  latency ms   p50={latency['p50']:.1f}  p99={latency['p99']:.1f}  mean={latency['mean']:.1f}")
+        print(f"  ttft ms      p50={ttft['p50']:.1f}  p99={ttft['p99']:.1f}")
+        print(f"  bytes        mean={result['response_bytes']['mean']:.0f}  max={result['response_bytes']['max']:.0f}")
+        if "retrieval_cache_hit_rate" in result:
+            print(f"  cache        hit_rate={result['retrieval_cache_hit_rate']:.2f}")
+        stages = "  ".join(f"{name}={dur:.1f}" for name, dur in result["server_timing_mean_ms"].items())
+        print(f"  stages ms    {stages}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="聊天链路端到端压测")
+    parser.add_argument("--endpoints", default="chat,search", help="逗号分隔: chat,search")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="每个接口的请求数（不含预热）")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--docs", type=int, default=300, help="合成语料文档数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="假大模型首 token 延迟（秒）")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--answer-tokens", type=int, default=100)
+    parser.add_argument("--llm-blocking", action="store_true", help="用同步 sleep 模拟阻塞事件循环的 LLM 调用")
+    parser.add_argument("--limit", type=int, default=3, help="检索接口返回的结果数")
+    parser.add_argument("--excerpts", action="store_true", help="引用/检索结果只返回分块ID和摘要")
+    parser.add_argument("--accept-encoding", default="", help="请求的压缩编码，如 br,gzip；默认不压缩")
+    parser.add_argument("--retrieval-cache", action="store_true", help="开启检索结果缓存")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="结果 JSON 路径")
+    parser.add_argument("--compare", help="与之前保存的结果 JSON 对比")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    app, docs = build_app(args)
+    questions = generate_questions(docs, n_questions=max(args.requests, 100), seed=args.seed)
+
+    port = _free_port()
+    server, thread = start_server(app, port)
+    seed_services(app, docs, args)
+    from rag_service.retrieval_cache import get_retrieval_cache
+    cache = get_retrieval_cache()
+    try:
+        endpoints = {}
+        for endpoint in filter(None, args.endpoints.split(",")):
+            hits, misses = cache.cache.hits, cache.cache.misses
+            endpoints[endpoint] = asyncio.run(
+                run_endpoint(f"http://127.0.0.1:{port}", endpoint, questions, args)
+            )
+            if args.retrieval_cache:
+                hits, misses = cache.cache.hits - hits, cache.cache.misses - misses
+                endpoints[endpoint]["retrieval_cache_hit_rate"] = hits / (hits + misses) if hits + misses else 0.0
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    results = {"meta": run_metadata(args), "endpoints": endpoints}
+    print_report(results)
+    save_results(results, args.output)
+    if args.compare:
+        compare_results(
+            args.compare, results,
+            ["throughput_rps", "latency_ms.p50", "latency_ms.p99", "ttft_ms.p50", "response_bytes.mean"],
+            group_key="endpoints"
+        )
+
+
+if __name__ == "__main__":
+    main()
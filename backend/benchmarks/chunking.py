@@ -0,0 +1,279 @@
+"""
+检索分块基准：recall@k / MRR vs 查询延迟 vs 索引大小
+
+对给定语料和带标注的问题集，按「分块器 × chunk_size × chunk_overlap × embedding 模型」的网格
+分别建立本地向量索引，统计：
+- recall@k、MRR（命中 = 分块来自标注的来源文件，且包含标注答案原文）
+- 索引大小（向量 + 分块文本字节数）、分块数、入库耗时
+- 查询延迟（embedding + 检索）
+- 平均 prompt 长度（top-k 分块字符数之和，中文约等于 token 数）
+
+--parent-sizes 同时评估父文档（small-to-big）检索：用 chunk_size 的子分块召回 top-k，
+换成所在的父章节（parent_size）并合并同一文件中相邻的章节，recall 和 prompt 长度按合并后的上下文统计。
+
+最后对每个 k 给出推荐：在 recall 不低于最优值 - tolerance 的配置中，prompt 最短的一个。
+
+问题集为 JSONL，每行: {"question": "...", "answer": "可选，应出现在命中分块中的原文",
+                      "relevant_sources": ["相对语料目录的文件路径", ...]}
+
+用法（在 backend 目录下）:
+    python -m benchmarks.chunking --corpus /data/tcm_docs --questions questions.jsonl \\
+        --chunk-sizes 200,500,1000 --overlaps 0,50,200 --embeddings hash:,huggingface:shibing624/text2vec-base-chinese
+    python -m benchmarks.chunking --synthetic --splitters chinese --chunk-sizes 100,200 --overlaps 0,20 \
+        --parent-sizes 500,1000
+    python -m benchmarks.chunking --synthetic --output results/chunking.json
+"""
+
+import argparse
+import itertools
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from benchmarks.common import compare_results, run_metadata, save_results, setup_paths, summarize
+from benchmarks.corpus import generate_corpus, generate_questions
+
+
+def load_corpus(corpus_dir: str, pattern: str) -> List[Tuple[str, str]]:
+    root = Path(corpus_dir)
+    return [
+        (str(path.relative_to(root)), path.read_text(encoding="utf-8", errors="replace"))
+        for path in sorted(root.glob(pattern)) if path.is_file()
+    ]
+
+
+def load_questions(path: str) -> List[Dict]:
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                questions.append({
+                    "question": item["question"],
+                    "answer": item.get("answer"),
+                    "relevant": set(item["relevant_sources"]),
+                })
+    return questions
+
+
+def synthetic_dataset(n_docs: int, n_questions: int) -> Tuple[List[Tuple[str, str]], List[Dict]]:
+    """
+    用合成语料构造数据集：同一出处的条目拼成一部「书」，问题的来源为对应的书
+    """
+    docs = generate_corpus(n_docs)
+    books: Dict[str, List[str]] = {}
+    doc_book = {}
+    for doc in docs:
+        books.setdefault(doc["source"], []).append(doc["content"])
+        doc_book[doc["doc_id"]] = doc["source"]
+    corpus = [(source, "\n\n".join(entries)) for source, entries in books.items()]
+    questions = [
+        {
+            "question": q["question"],
+            "answer": q["answer"],
+            "relevant": {doc_book[doc_id] for doc_id in q["relevant_doc_ids"]},
+        }
+        for q in generate_questions(docs, n_questions)
+    ]
+    return corpus, questions
+
+
+def make_splitter(name: str, chunk_size: int, chunk_overlap: int):
+    if name == "character":
+        from langchain.text_splitter import CharacterTextSplitter
+        return CharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if name == "recursive":
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if name == "chinese":
+        from rag_service.splitter import ChineseTextSplitter
+        return ChineseTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    raise ValueError(f"Unknown splitter: {name}")
+
+
+def parse_embedding_spec(spec: str) -> Tuple[str, str]:
+    """engine:model，如 hash: 或 huggingface:shibing624/text2vec-base-chinese"""
+    engine, _, model = spec.partition(":")
+    return engine, model
+
+
+def evaluate(corpus, questions, splitter_name, chunk_size, chunk_overlap, embeddings, ks, parent_size=None) -> Dict:
+    from rag_service.parent_retrieval import merge_hits, section_text, split_parent_child
+    from rag_service.splitter import ChineseTextSplitter
+    from rag_service.vectorstore import LocalVectorStore
+
+    splitter = make_splitter(splitter_name, chunk_size, chunk_overlap)
+    texts, metadatas, sections = [], [], []
+    start = time.perf_counter()
+    for file_index, (source, text) in enumerate(corpus):
+        if parent_size:
+            spans, chunks, chunk_sections = split_parent_child(
+                text, ChineseTextSplitter(parent_size, 0), splitter
+            )
+            sections.append(spans)
+            metadatas.extend({"source": source, "file": file_index, "section": i} for i in chunk_sections)
+        else:
+            chunks = splitter.split_text(text)
+            metadatas.extend({"source": source} for _ in chunks)
+        texts.extend(chunks)
+    split_seconds = time.perf_counter() - start
+
+    store = LocalVectorStore(embeddings)
+    start = time.perf_counter()
+    store.add_texts(texts, metadatas=metadatas)
+    embed_seconds = time.perf_counter() - start
+
+    max_k = max(ks)
+    latencies, first_hit_ranks, prompt_chars = [], [], {k: [] for k in ks}
+    for q in questions:
+        start = time.perf_counter()
+        hits = store.similarity_search(q["question"], k=max_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        if parent_size:
+            # top-k 个子分块换成合并后的章节；排名按合并后的上下文计
+            contexts = {}
+            for k in ks:
+                runs = merge_hits([(doc.metadata["file"], doc.metadata["section"], 0.0) for doc in hits[:k]])
+                contexts[k] = [
+                    (corpus[run["doc_id"]][0],
+                     section_text(corpus[run["doc_id"]][1], sections[run["doc_id"]],
+                                  run["first_section"], run["last_section"]))
+                    for run in runs
+                ]
+            ranked = contexts[max_k]
+        else:
+            contexts = {k: [(doc.metadata["source"], doc.page_content) for doc in hits[:k]] for k in ks}
+            ranked = contexts[max_k]
+
+        rank = None
+        for i, (source, content) in enumerate(ranked, start=1):
+            relevant = source in q["relevant"]
+            if relevant and (not q["answer"] or q["answer"] in content):
+                rank = i
+                break
+        first_hit_ranks.append(rank)
+        for k in ks:
+            prompt_chars[k].append(sum(len(content) for _, content in contexts[k]))
+
+    n = len(questions)
+    vector_bytes = store.nbytes
+    text_bytes = sum(len(text.encode("utf-8")) for text in texts)
+    return {
+        "splitter": splitter_name,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "parent_size": parent_size,
+        "chunks": len(texts),
+        "index_bytes": vector_bytes + text_bytes,
+        "vector_bytes": vector_bytes,
+        "ingest_seconds": split_seconds + embed_seconds,
+        "split_seconds": split_seconds,
+        "query_latency_ms": summarize(latencies),
+        "mrr": sum(1.0 / rank for rank in first_hit_ranks if rank) / n,
+        "recall": {
+            str(k): sum(1 for rank in first_hit_ranks if rank and rank <= k) / n for k in ks
+        },
+        "mean_prompt_chars": {str(k): sum(prompt_chars[k]) / n for k in ks},
+    }
+
+
+def recommend(configs: Dict[str, Dict], ks: List[int], tolerance: float) -> Dict[str, str]:
+    recommendations = {}
+    for k in map(str, ks):
+        best_recall = max(result["recall"][k] for result in configs.values())
+        candidates = [
+            (result["mean_prompt_chars"][k], name) for name, result in configs.items()
+            if result["recall"][k] >= best_recall - tolerance
+        ]
+        recommendations[k] = min(candidates)[1]
+    return recommendations
+
+
+def print_report(results: Dict, ks: List[int]):
+    header = f"{'config':<48}{'chunks':>8}{'index KB':>10}{'ingest s':>10}{'q p50 ms':>10}{'MRR':>7}"
+    header += "".join(f"{'R@' + str(k):>7}{'chars@' + str(k):>10}" for k in ks)
+    print(header)
+    for name, r in results["configs"].items():
+        line = (f"{name:<48}{r['chunks']:>8}{r['index_bytes'] / 1024:>10.1f}{r['ingest_seconds']:>10.2f}"
+                f"{r['query_latency_ms']['p50']:>10.2f}{r['mrr']:>7.3f}")
+        line += "".join(f"{r['recall'][str(k)]:>7.3f}{r['mean_prompt_chars'][str(k)]:>10.0f}" for k in ks)
+        print(line)
+    print("\n推荐配置（recall 持平时 prompt 最短）:")
+    for k, name in results["recommendations"].items():
+        print(f"  k={k}: {name}")
+
+
+def parse_int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="检索分块基准")
+    parser.add_argument("--corpus", help="语料目录")
+    parser.add_argument("--glob", default="**/*.txt", help="语料文件匹配模式")
+    parser.add_argument("--questions", help="带标注的问题集 JSONL")
+    parser.add_argument("--synthetic", action="store_true", help="使用合成中医语料和问题集")
+    parser.add_argument("--synthetic-docs", type=int, default=300)
+    parser.add_argument("--synthetic-questions", type=int, default=200)
+    parser.add_argument("--splitters", default="character,recursive,chinese")
+    parser.add_argument("--chunk-sizes", type=parse_int_list, default=[200, 500, 1000])
+    parser.add_argument("--overlaps", type=parse_int_list, default=[0, 50, 200])
+    parser.add_argument("--parent-sizes", type=parse_int_list, default=[],
+                        help="父文档检索的父章节大小（大于 chunk_size 时评估，chunk_size 为子分块大小）")
+    parser.add_argument("--embeddings", default="hash:", help="逗号分隔的 engine:model 列表")
+    parser.add_argument("--k", type=parse_int_list, default=[1, 3, 5])
+    parser.add_argument("--tolerance", type=float, default=0.01, help="推荐时允许的 recall 差距")
+    parser.add_argument("--output", help="结果 JSON 路径")
+    parser.add_argument("--compare", help="与之前保存的结果 JSON 对比")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    setup_paths()
+    from rag_service.embeddings import create_embeddings
+
+    if args.synthetic:
+        corpus, questions = synthetic_dataset(args.synthetic_docs, args.synthetic_questions)
+    elif args.corpus and args.questions:
+        corpus, questions = load_corpus(args.corpus, args.glob), load_questions(args.questions)
+    else:
+        raise SystemExit("需要 --corpus 和 --questions，或使用 --synthetic")
+    print(f"语料 {len(corpus)} 个文件，问题 {len(questions)} 条")
+
+    configs = {}
+    for spec in filter(None, args.embeddings.split(",")):
+        engine, model = parse_embedding_spec(spec)
+        embeddings = create_embeddings(model, engine=engine)
+        grid = itertools.product(args.splitters.split(","), args.chunk_sizes, args.overlaps, [None] + args.parent_sizes)
+        for splitter_name, chunk_size, chunk_overlap, parent_size in grid:
+            if chunk_overlap >= chunk_size or (parent_size and parent_size <= chunk_size):
+                continue
+            name = f"{engine}:{model or '-'}/{splitter_name}/{chunk_size}/{chunk_overlap}"
+            if parent_size:
+                name += f"/parent{parent_size}"
+            result = evaluate(
+                corpus, questions, splitter_name, chunk_size, chunk_overlap, embeddings, args.k, parent_size
+            )
+            configs[name] = {"embedding": spec, **result}
+            print(f"完成 {name}: recall@{args.k[-1]}={result['recall'][str(args.k[-1])]:.3f}")
+
+    results = {
+        "meta": run_metadata(args),
+        "configs": configs,
+        "recommendations": recommend(configs, args.k, args.tolerance),
+    }
+    print_report(results, args.k)
+    save_results(results, args.output)
+    if args.compare:
+        compare_results(
+            args.compare, results,
+            ["mrr", f"recall.{args.k[-1]}", f"mean_prompt_chars.{args.k[-1]}", "query_latency_ms.p50"],
+            group_key="configs"
+        )
+
+
+if __name__ == "__main__":
+    main()
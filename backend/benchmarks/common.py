@@ -0,0 +1,98 @@
+"""
+基准测试公共工具：分位数统计、结果元信息、JSON 保存与对比
+"""
+
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_paths():
+    """把 backend/ 和 backend/legacy/ 加入 sys.path，使 rag_service 与 legacy 的 app 包可导入"""
+    for path in (BACKEND_DIR, BACKEND_DIR / "legacy"):
+        if str(path) not in sys.path:
+            sys.path.insert(0, str(path))
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    """返回样本的 mean / p50 / p95 / p99 / max（单位与输入相同）"""
+    if not samples:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    values = np.asarray(samples, dtype=np.float64)
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata(args) -> Dict:
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": vars(args),
+    }
+
+
+def save_results(results: Dict, output: Optional[str]):
+    if not output:
+        return
+    path = Path(output)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"结果已保存到 {path}")
+
+
+def compare_results(baseline_path: str, current: Dict, fields: List[str], group_key: str):
+    """
+    打印当前结果与基线结果的差异
+
+    Args:
+        baseline_path: 基线结果 JSON 文件
+        current: 当前结果
+        fields: 需要对比的指标（点号路径，如 latency_ms.p99）
+        group_key: 结果分组所在的顶层键，如 endpoints
+    """
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    print(f"\n对比基线 {baseline_path}（commit {baseline['meta'].get('commit')}）")
+    for name, result in current[group_key].items():
+        base = baseline.get(group_key, {}).get(name)
+        if base is None:
+            continue
+        for field in fields:
+            new_value, old_value = _lookup(result, field), _lookup(base, field)
+            if new_value is None or old_value is None:
+                continue
+            change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            print(f"  {name:<24} {field:<20} {old_value:>12.2f} -> {new_value:>12.2f} ({change:+.1f}%)")
+
+
+def _lookup(data: Dict, dotted: str):
+    for part in dotted.split("."):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
@@ -0,0 +1,118 @@
+"""
+合成中医语料
+
+按固定随机种子生成中药材条目和带标注的问题集，保证每次运行（以及不同提交之间）
+得到完全相同的语料，基准测试结果才可以互相比较。
+"""
+
+import random
+from typing import Dict, List
+
+# (药名, 性味, 归经, 功效, 主治)
+HERBS = [
+    ("人参", "甘、微苦，微温", "脾、肺、心、肾经", "大补元气，复脉固脱，补脾益肺，生津养血，安神益智", "体虚欲脱，肢冷脉微，脾虚食少，肺虚喘咳"),
+    ("黄芪", "甘，微温", "脾、肺经", "补气升阳，固表止汗，利水消肿，生津养血", "气虚乏力，食少便溏，中气下陷，表虚自汗"),
+    ("当归", "甘、辛，温", "肝、心、脾经", "补血活血，调经止痛，润肠通便", "血虚萎黄，眩晕心悸，月经不调，经闭痛经"),
+    ("白术", "苦、甘，温", "脾、胃经", "健脾益气，燥湿利水，止汗，安胎", "脾虚食少，腹胀泄泻，痰饮眩悸，水肿"),
+    ("茯苓", "甘、淡，平", "心、肺、脾、肾经", "利水渗湿，健脾，宁心", "水肿尿少，痰饮眩悸，脾虚食少，心神不安"),
+    ("甘草", "甘，平", "心、肺、脾、胃经", "补脾益气，清热解毒，祛痰止咳，缓急止痛，调和诸药", "脾胃虚弱，倦怠乏力，心悸气短，咳嗽痰多"),
+    ("川芎", "辛，温", "肝、胆、心包经", "活血行气，祛风止痛", "胸痹心痛，胸胁刺痛，跌扑肿痛，头痛"),
+    ("白芍", "苦、酸，微寒", "肝、脾经", "养血调经，敛阴止汗，柔肝止痛，平抑肝阳", "血虚萎黄，月经不调，自汗盗汗，胁痛腹痛"),
+    ("熟地黄", "甘，微温", "肝、肾经", "补血滋阴，益精填髓", "血虚萎黄，心悸怔忡，肝肾阴虚，腰膝酸软"),
+    ("柴胡", "辛、苦，微寒", "肝、胆、肺经", "疏散退热，疏肝解郁，升举阳气", "感冒发热，寒热往来，胸胁胀痛，月经不调"),
+    ("黄连", "苦，寒", "心、脾、胃、肝、胆、大肠经", "清热燥湿，泻火解毒", "湿热痞满，呕吐吞酸，泻痢，高热神昏"),
+    ("黄芩", "苦，寒", "肺、胆、脾、大肠、小肠经", "清热燥湿，泻火解毒，止血，安胎", "湿温暑湿，胸闷呕恶，肺热咳嗽，高热烦渴"),
+    ("金银花", "甘，寒", "肺、心、胃经", "清热解毒，疏散风热", "痈肿疔疮，喉痹，丹毒，热毒血痢，风热感冒"),
+    ("连翘", "苦，微寒", "肺、心、小肠经", "清热解毒，消肿散结，疏散风热", "痈疽，瘰疬，乳痈，丹毒，风热感冒"),
+    ("麻黄", "辛、微苦，温", "肺、膀胱经", "发汗散寒，宣肺平喘，利水消肿", "风寒感冒，胸闷喘咳，风水浮肿"),
+    ("桂枝", "辛、甘，温", "心、肺、膀胱经", "发汗解肌，温通经脉，助阳化气，平冲降逆", "风寒感冒，脘腹冷痛，血寒经闭，关节痹痛"),
+    ("半夏", "辛，温；有毒", "脾、胃、肺经", "燥湿化痰，降逆止呕，消痞散结", "湿痰寒痰，咳喘痰多，痰饮眩悸，呕吐反胃"),
+    ("陈皮", "苦、辛，温", "肺、脾经", "理气健脾，燥湿化痰", "脘腹胀满，食少吐泻，咳嗽痰多"),
+    ("枸杞子", "甘，平", "肝、肾经", "滋补肝肾，益精明目", "虚劳精亏，腰膝酸痛，眩晕耳鸣，目昏不明"),
+    ("山药", "甘，平", "脾、肺、肾经", "补脾养胃，生津益肺，补肾涩精", "脾虚食少，久泻不止，肺虚喘咳，肾虚遗精"),
+    ("丹参", "苦，微寒", "心、肝经", "活血祛瘀，通经止痛，清心除烦，凉血消痈", "胸痹心痛，脘腹胁痛，癥瘕积聚，心烦不眠"),
+    ("大黄", "苦，寒", "脾、胃、大肠、肝、心包经", "泻下攻积，清热泻火，凉血解毒，逐瘀通经", "实热积滞便秘，血热吐衄，目赤咽肿"),
+    ("附子", "辛、甘，大热；有毒", "心、肾、脾经", "回阳救逆，补火助阳，散寒止痛", "亡阳虚脱，肢冷脉微，心阳不足，胸痹心痛"),
+    ("干姜", "辛，热", "脾、胃、肾、心、肺经", "温中散寒，回阳通脉，温肺化饮", "脘腹冷痛，呕吐泄泻，肢冷脉微，寒饮喘咳"),
+    ("薄荷", "辛，凉", "肺、肝经", "疏散风热，清利头目，利咽，透疹，疏肝行气", "风热感冒，头痛，目赤，喉痹，口疮"),
+    ("菊花", "甘、苦，微寒", "肺、肝经", "散风清热，平肝明目，清热解毒", "风热感冒，头痛眩晕，目赤肿痛，眼目昏花"),
+    ("葛根", "甘、辛，凉", "脾、胃、肺经", "解肌退热，生津止渴，透疹，升阳止泻", "外感发热头痛，项背强痛，口渴，消渴"),
+    ("杜仲", "甘，温", "肝、肾经", "补肝肾，强筋骨，安胎", "肝肾不足，腰膝酸痛，筋骨无力，头晕目眩"),
+    ("酸枣仁", "甘、酸，平", "肝、胆、心经", "养心补肝，宁心安神，敛汗，生津", "虚烦不眠，惊悸多梦，体虚多汗，津伤口渴"),
+    ("五味子", "酸、甘，温", "肺、心、肾经", "收敛固涩，益气生津，补肾宁心", "久嗽虚喘，梦遗滑精，久泻不止，自汗盗汗"),
+]
+
+SOURCES = ["《神农本草经》", "《本草纲目》", "《中华人民共和国药典》", "《中药学》教材", "《本草备要》"]
+DOC_TYPES = ["herb", "theory", "prescription", "case"]
+
+FILLERS = [
+    "临床应用时需辨证施治，根据患者体质调整剂量。",
+    "本品宜置阴凉干燥处保存，防霉防蛀。",
+    "古代医家多有论述，后世沿用至今。",
+    "现代药理研究表明其成分复杂，作用广泛。",
+    "孕妇及体质特殊者应在医师指导下使用。",
+    "常与其他药物配伍以增强疗效。",
+]
+
+
+def generate_corpus(n_docs: int = 200, seed: int = 42) -> List[Dict]:
+    """
+    生成合成语料
+
+    Returns:
+        List[Dict]: 每项包含 doc_id / herb / title / content / category / tags / source
+    """
+    rng = random.Random(seed)
+    docs = []
+    for i in range(n_docs):
+        name, nature, meridian, effect, indication = HERBS[i % len(HERBS)]
+        source = SOURCES[(i // len(HERBS)) % len(SOURCES)]
+        paragraphs = [
+            f"{name}，出自{source}。",
+            f"【性味】{nature}。【归经】归{meridian}。",
+            f"【功效】{effect}。",
+            f"【主治】用于{indication}。",
+        ]
+        paragraphs.extend(rng.sample(FILLERS, k=rng.randint(2, len(FILLERS))))
+        docs.append({
+            "doc_id": f"doc-{i:05d}",
+            "herb": name,
+            "title": f"{name}（{source}）",
+            "content": "".join(paragraphs),
+            "category": DOC_TYPES[i % len(DOC_TYPES)],
+            "tags": [name, source.strip("《》")],
+            "source": source,
+        })
+    return docs
+
+
+def generate_questions(docs: List[Dict], n_questions: int = 100, seed: int = 7) -> List[Dict]:
+    """
+    生成带标注的问题集
+
+    Returns:
+        List[Dict]: 每项包含 question / answer（应出现在命中分块中的原文）/ relevant_doc_ids
+    """
+    rng = random.Random(seed)
+    by_herb: Dict[str, List[str]] = {}
+    for doc in docs:
+        by_herb.setdefault(doc["herb"], []).append(doc["doc_id"])
+
+    herb_info = {herb[0]: herb for herb in HERBS}
+    templates = [
+        ("{name}的功效是什么？", 3),
+        ("{name}主治哪些病症？", 4),
+        ("{name}归哪些经？", 2),
+        ("{name}的性味如何？", 1),
+    ]
+    questions = []
+    herbs = sorted(by_herb)
+    for _ in range(n_questions):
+        name = rng.choice(herbs)
+        template, field_index = rng.choice(templates)
+        questions.append({
+            "question": template.format(name=name),
+            "answer": herb_info[name][field_index].split("，")[0],
+            "relevant_doc_ids": by_herb[name],
+        })
+    return questions
@@ -0,0 +1,114 @@
+"""
+Embedding 引擎吞吐基准
+
+比较 PyTorch（huggingface）与 ONNX Runtime（FP32 / int8 量化）引擎：
+- 单条查询（embed_query）延迟 p50/p99
+- 不同 batch 大小下 embed_documents 的吞吐（条/秒）
+- 与第一个引擎输出的一致性（逐条余弦相似度）
+
+引擎用 name=engine:model[:option=value,...] 描述，例如:
+    torch=huggingface:shibing624/text2vec-base-chinese
+    onnx=onnx:/models/text2vec-onnx
+    onnx-int8=onnx:/models/text2vec-onnx:quantized=1,intra_op_threads=4
+
+用法（在 backend 目录下）:
+    python -m benchmarks.embedding_engines \\
+        --engine torch=huggingface:shibing624/text2vec-base-chinese \\
+        --engine onnx-int8=onnx:/models/text2vec-onnx:quantized=1 \\
+        --output results/embedding_engines.json
+"""
+
+import argparse
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks.common import compare_results, run_metadata, save_results, setup_paths, summarize
+from benchmarks.corpus import generate_corpus, generate_questions
+
+
+def parse_engine(spec: str) -> Tuple[str, str, str, Dict]:
+    name, _, rest = spec.partition("=")
+    engine, _, rest = rest.partition(":")
+    model, options = rest, {}
+    if ":" in rest:
+        head, _, tail = rest.rpartition(":")
+        if "=" in tail:
+            model = head
+            for item in tail.split(","):
+                key, _, value = item.partition("=")
+                options[key] = int(value) if value.isdigit() else value
+    if "quantized" in options:
+        options["quantized"] = bool(options["quantized"])
+    return name, engine, model, options
+
+
+def measure(embeddings, queries: List[str], documents: List[str], batch_sizes: List[int]) -> Dict:
+    embeddings.embed_query(queries[0])  # 预热
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        embeddings.embed_query(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    batched = {}
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        for i in range(0, len(documents), batch_size):
+            embeddings.embed_documents(documents[i:i + batch_size])
+        seconds = time.perf_counter() - start
+        batched[str(batch_size)] = {
+            "seconds": seconds,
+            "texts_per_s": len(documents) / seconds if seconds else 0.0,
+        }
+    return {"single_ms": summarize(latencies), "batched": batched}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Embedding 引擎吞吐基准")
+    parser.add_argument("--engine", action="append", required=True,
+                        help="name=engine:model[:key=value,...]，可重复；第一个为一致性检查的基准")
+    parser.add_argument("--queries", type=int, default=200, help="单条延迟测试的查询数")
+    parser.add_argument("--documents", type=int, default=512, help="批量吞吐测试的文本数")
+    parser.add_argument("--batch-sizes", default="1,8,32,64")
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    parser.add_argument("--output", help="结果 JSON 路径")
+    parser.add_argument("--compare", help="与之前保存的结果 JSON 对比")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    setup_paths()
+    from rag_service.embeddings import check_parity, create_embeddings
+
+    documents = [doc["content"] for doc in generate_corpus(args.documents)]
+    queries = [q["question"] for q in generate_questions(generate_corpus(200), args.queries)]
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",") if size]
+
+    engines, reference = {}, None
+    for spec in args.engine:
+        name, engine, model, options = parse_engine(spec)
+        embeddings = create_embeddings(model, engine=engine, **options)
+        result = measure(embeddings, queries, documents, batch_sizes)
+        if reference is None:
+            reference = embeddings
+        else:
+            result["parity"] = check_parity(reference, embeddings, documents[:64], args.min_cosine)
+        engines[name] = result
+
+    header = "".join(f"{'b=' + str(size) + ' /s':>12}" for size in batch_sizes)
+    print(f"\n{'engine':<16}{'p50 ms':>10}{'p99 ms':>10}{header}{'min cos':>10}")
+    for name, r in engines.items():
+        row = "".join(f"{r['batched'][str(size)]['texts_per_s']:>12.1f}" for size in batch_sizes)
+        parity = r.get("parity", {}).get("min_cosine")
+        parity = f"{parity:.4f}" if parity is not None else "-"
+        print(f"{name:<16}{r['single_ms']['p50']:>10.2f}{r['single_ms']['p99']:>10.2f}{row}{parity:>10}")
+
+    results = {"meta": run_metadata(args), "engines": engines}
+    save_results(results, args.output)
+    if args.compare:
+        compare_results(args.compare, results, ["single_ms.p50", "single_ms.p99"], group_key="engines")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+基准测试用的假服务
+
+- FakeDouBaoService 与 DouBaoService.chat 的接口和返回结构一致，
+  按配置的首 token 延迟和生成速度等待后返回固定长度的回答，不访问网络
+- use_mongomock() 把 RAGService 的 MongoDB 客户端换成内存实现（mongomock），
+  离线压测不需要 MongoDB，预热的 mongodb 步骤也不会等待连接超时
+"""
+
+import asyncio
+import time
+from typing import Any, Dict
+
+from rag_service.metrics import observe_stage
+
+
+def use_mongomock():
+    """
+    之后创建的 RAGService 使用 mongomock 客户端（需在服务容器创建服务之前调用，即应用启动之前）
+    """
+    import mongomock
+    from app.services import rag
+
+    rag.MongoClient = mongomock.MongoClient
+
+
+class FakeDouBaoService:
+    def __init__(
+        self,
+        first_token_latency: float = 0.2,
+        tokens_per_second: float = 50.0,
+        answer_tokens: int = 100,
+        blocking: bool = False
+    ):
+        """
+        Args:
+            first_token_latency: 首 token 延迟（秒）
+            tokens_per_second: 生成速度（token/秒），<=0 表示瞬时生成
+            answer_tokens: 回答长度（token 数，按一个汉字一个 token 计）
+            blocking: 为 True 时用 time.sleep 等待，模拟 DouBaoService 在事件循环中
+                      同步调用 requests.post 的行为；默认用 asyncio.sleep
+        """
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.blocking = blocking
+
+    @property
+    def generation_time(self) -> float:
+        if self.tokens_per_second <= 0:
+            return self.first_token_latency
+        return self.first_token_latency + self.answer_tokens / self.tokens_per_second
+
+    async def chat(self, messages: list, temperature: float = 0.7) -> Dict[str, Any]:
+        with observe_stage("llm"):
+            if self.blocking:
+                time.sleep(self.generation_time)
+            else:
+                await asyncio.sleep(self.generation_time)
+
+        prompt_tokens = sum(len(message["content"]) for message in messages)
+        return {
+            "choices": [{"message": {"role": "assistant", "content": "中" * self.answer_tokens}}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": self.answer_tokens,
+                "total_tokens": prompt_tokens + self.answer_tokens
+            }
+        }
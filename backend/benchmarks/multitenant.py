@@ -0,0 +1,136 @@
+"""
+多租户 collection 布局基准
+
+比较两种知识库布局在不同知识库数量下的内存和检索延迟：
+- per_kb: 每个知识库一个向量库（对应每个知识库一个 Milvus collection）
+- shared: 所有知识库共用一个向量库，检索时按 kb_id 过滤（KB_COLLECTION_LAYOUT=shared）
+
+向量库用 LocalVectorStore 代替 Milvus，向量为随机单位向量（不计算 embedding），分块文本取自合成语料。
+内存为建库后 tracemalloc 统计的 Python/numpy 分配（LocalVectorStore 每个库至少预留 1024 行，
+类似 Milvus 每个 collection 固定的段和索引开销）；同时检查两种布局对同一查询返回的 top-k 是否一致。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.multitenant --kb-counts 10,100,1000 --output results/multitenant.json
+    python -m benchmarks.multitenant --chunks-per-kb 500 --compare results/multitenant.json
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.common import compare_results, run_metadata, save_results, setup_paths, summarize
+from benchmarks.corpus import generate_corpus
+
+
+def make_kbs(n_kbs: int, chunks_per_kb: int, dim: int, texts: List[str], seed: int = 42) -> List[Dict]:
+    rng = np.random.default_rng(seed)
+    kbs = []
+    for i in range(n_kbs):
+        vectors = rng.standard_normal((chunks_per_kb, dim), dtype=np.float32)
+        kbs.append({
+            "kb_id": f"kb{i:05d}",
+            "vectors": vectors / np.linalg.norm(vectors, axis=1, keepdims=True),
+            "texts": [texts[(i * chunks_per_kb + j) % len(texts)] for j in range(chunks_per_kb)],
+        })
+    return kbs
+
+
+def build(layout: str, kbs: List[Dict]):
+    """建库，返回 (向量库, 耗时秒数, 内存 MB)"""
+    from rag_service.filters import chunk_fields
+    from rag_service.vectorstore import LocalVectorStore
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    if layout == "per_kb":
+        stores = {}
+        for kb in kbs:
+            store = stores[kb["kb_id"]] = LocalVectorStore(None, collection_name=f"kb_{kb['kb_id']}")
+            store.add_embeddings(kb["texts"], kb["vectors"], metadatas=[chunk_fields({"kb_id": kb["kb_id"]})] * len(kb["texts"]))
+    else:
+        stores = LocalVectorStore(None, collection_name="kb_shared")
+        for kb in kbs:
+            stores.add_embeddings(kb["texts"], kb["vectors"], metadatas=[chunk_fields({"kb_id": kb["kb_id"]})] * len(kb["texts"]))
+    seconds = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return stores, seconds, memory / 1024 / 1024
+
+
+def search(layout: str, stores, kb_id: str, query: np.ndarray, k: int):
+    if layout == "per_kb":
+        return stores[kb_id].similarity_search_with_score_by_vector(query, k=k)
+    return stores.similarity_search_with_score_by_vector(query, k=k, filter={"kb_id": kb_id})
+
+
+def measure(n_kbs: int, args, texts: List[str]) -> Dict:
+    kbs = make_kbs(n_kbs, args.chunks_per_kb, args.dim, texts)
+    rng = np.random.default_rng(7)
+    targets = rng.integers(0, n_kbs, size=args.queries)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    results, top_ids = {}, {}
+    for layout in ("per_kb", "shared"):
+        stores, build_seconds, memory_mb = build(layout, kbs)
+        latencies, ids = [], []
+        for target, query in zip(targets, queries):
+            kb_id = kbs[target]["kb_id"]
+            start = time.perf_counter()
+            hits = search(layout, stores, kb_id, query, args.k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert all(doc.metadata["kb_id"] == kb_id for doc, _ in hits), "检索结果包含其他知识库的分块"
+            ids.append([doc.page_content for doc, _ in hits])
+        top_ids[layout] = ids
+        results[layout] = {
+            "memory_mb": memory_mb,
+            "build_seconds": build_seconds,
+            "latency_ms": summarize(latencies),
+        }
+        del stores
+    same = sum(a == b for a, b in zip(top_ids["per_kb"], top_ids["shared"]))
+    results["topk_agreement"] = same / max(args.queries, 1)
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="多租户 collection 布局基准")
+    parser.add_argument("--kb-counts", default="10,100,1000", help="逗号分隔的知识库数量")
+    parser.add_argument("--chunks-per-kb", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=256, help="向量维度")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--output", help="结果 JSON 路径")
+    parser.add_argument("--compare", help="与之前保存的结果 JSON 对比")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    setup_paths()
+    texts = [doc["content"] for doc in generate_corpus(500)]
+
+    layouts = {}
+    for n_kbs in (int(value) for value in args.kb_counts.split(",") if value):
+        measured = measure(n_kbs, args, texts)
+        for layout in ("per_kb", "shared"):
+            layouts[f"{n_kbs}/{layout}"] = measured[layout]
+        layouts[f"{n_kbs}/shared"]["topk_agreement"] = measured["topk_agreement"]
+
+    print(f"\n{'layout':<16}{'memory MB':>12}{'build s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, r in layouts.items():
+        print(f"{name:<16}{r['memory_mb']:>12.1f}{r['build_seconds']:>10.2f}"
+              f"{r['latency_ms']['p50']:>10.3f}{r['latency_ms']['p99']:>10.3f}")
+
+    results = {"meta": run_metadata(args), "layouts": layouts}
+    save_results(results, args.output)
+    if args.compare:
+        compare_results(args.compare, results, ["memory_mb", "latency_ms.p50", "latency_ms.p99"], group_key="layouts")
+
+
+if __name__ == "__main__":
+    main()
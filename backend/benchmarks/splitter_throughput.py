@@ -0,0 +1,115 @@
+"""
+分块器吞吐基准
+
+对同一份语料比较 CharacterTextSplitter、RecursiveCharacterTextSplitter 与 ChineseTextSplitter：
+- 吞吐（MB/s，按 UTF-8 字节计）和切分耗时
+- 分块数、平均/最大分块长度
+- 在句末标点处结束的分块比例（越高说明越少把一句话截断）
+ChineseTextSplitter 另外测一次流式输入（按 --block-size 个字符逐段喂入）。
+
+语料分两种排版各测一次：paragraph 为原样（条目间有空行），
+continuous 去掉所有换行，模拟整卷不分段的古籍扫描文本。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.splitter_throughput --synthetic-mb 20 --output results/splitter.json
+    python -m benchmarks.splitter_throughput --corpus /data/tcm_docs --compare results/splitter.json
+"""
+
+import argparse
+import time
+from typing import Dict, List
+
+from benchmarks.chunking import load_corpus, make_splitter
+from benchmarks.common import compare_results, run_metadata, save_results, setup_paths
+from benchmarks.corpus import generate_corpus
+
+SENTENCE_ENDINGS = tuple("。！？；!?;…”’」』）)】")
+
+
+def synthetic_texts(target_mb: float, seed: int = 42) -> List[str]:
+    """合成语料按出处拼成若干部「书」，重复到目标大小"""
+    books: Dict[str, List[str]] = {}
+    for doc in generate_corpus(500, seed=seed):
+        books.setdefault(doc["source"], []).append(doc["content"])
+    base = ["\n\n".join(entries) for entries in books.values()]
+    base_bytes = sum(len(text.encode("utf-8")) for text in base)
+    repeat = max(1, int(target_mb * 1024 * 1024 / base_bytes))
+    return [text * repeat for text in base]
+
+
+def measure(splitter, texts: List[str], streaming_block: int = 0) -> Dict:
+    start = time.perf_counter()
+    chunks = []
+    for text in texts:
+        if streaming_block:
+            blocks = (text[i:i + streaming_block] for i in range(0, len(text), streaming_block))
+            chunks.extend(splitter.iter_split(blocks))
+        else:
+            chunks.extend(splitter.split_text(text))
+    seconds = time.perf_counter() - start
+
+    total_bytes = sum(len(text.encode("utf-8")) for text in texts)
+    lengths = [len(chunk) for chunk in chunks] or [0]
+    return {
+        "seconds": seconds,
+        "throughput_mb_s": total_bytes / 1024 / 1024 / seconds if seconds else 0.0,
+        "chunks": len(chunks),
+        "mean_chunk_chars": sum(lengths) / len(lengths),
+        "max_chunk_chars": max(lengths),
+        "sentence_end_ratio": sum(1 for chunk in chunks if chunk.endswith(SENTENCE_ENDINGS)) / max(len(chunks), 1),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="分块器吞吐基准")
+    parser.add_argument("--corpus", help="语料目录（默认使用合成语料）")
+    parser.add_argument("--glob", default="**/*.txt")
+    parser.add_argument("--synthetic-mb", type=float, default=10.0, help="合成语料大小（MB）")
+    parser.add_argument("--splitters", default="character,recursive,chinese")
+    parser.add_argument("--layouts", default="paragraph,continuous", help="逗号分隔: paragraph,continuous")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--chunk-overlap", type=int, default=50)
+    parser.add_argument("--block-size", type=int, default=64 * 1024, help="流式输入每段字符数，0 表示不测流式")
+    parser.add_argument("--output", help="结果 JSON 路径")
+    parser.add_argument("--compare", help="与之前保存的结果 JSON 对比")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    setup_paths()
+
+    if args.corpus:
+        texts = [text for _, text in load_corpus(args.corpus, args.glob)]
+    else:
+        texts = synthetic_texts(args.synthetic_mb)
+    total_mb = sum(len(text.encode("utf-8")) for text in texts) / 1024 / 1024
+    print(f"语料 {len(texts)} 个文本，共 {total_mb:.1f} MB")
+
+    layouts = {
+        "paragraph": texts,
+        "continuous": [text.replace("\n", "") for text in texts],
+    }
+    splitters = {}
+    for layout in filter(None, args.layouts.split(",")):
+        for name in filter(None, args.splitters.split(",")):
+            splitter = make_splitter(name, args.chunk_size, args.chunk_overlap)
+            splitters[f"{layout}/{name}"] = measure(splitter, layouts[layout])
+            if name == "chinese" and args.block_size:
+                splitters[f"{layout}/chinese-stream"] = measure(
+                    splitter, layouts[layout], streaming_block=args.block_size
+                )
+
+    print(f"\n{'splitter':<28}{'MB/s':>10}{'seconds':>10}{'chunks':>10}{'mean len':>10}{'max len':>10}{'sent end':>10}")
+    for name, r in splitters.items():
+        print(f"{name:<28}{r['throughput_mb_s']:>10.2f}{r['seconds']:>10.2f}{r['chunks']:>10}"
+              f"{r['mean_chunk_chars']:>10.0f}{r['max_chunk_chars']:>10}{r['sentence_end_ratio']:>10.2f}")
+
+    results = {"meta": run_metadata(args), "splitters": splitters}
+    save_results(results, args.output)
+    if args.compare:
+        compare_results(args.compare, results, ["throughput_mb_s", "sentence_end_ratio"], group_key="splitters")
+
+
+if __name__ == "__main__":
+    main()
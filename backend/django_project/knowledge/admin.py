@@ -1,17 +1,29 @@
 from django.contrib import admin  
-from .models import TCMDocument  
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.db.models import F, OuterRef, Subquery
+from . import fts
+from .uploads import save_chunks
+from .models import DocumentIndexState, IndexOutbox, TCMDocument  
+
+class RankedChangeList(ChangeList):
+    """全文检索时按相关度排序（bm25 越小越相关），点击列头排序时仍以列头为准"""
+
+    def get_ordering(self, request, queryset):
+        if 'fts_rank' in queryset.query.annotations and ORDER_VAR not in self.params:
+            return ['fts_rank', '-pk']
+        return super().get_ordering(request, queryset)
 
 class TCMDocumentAdmin(admin.ModelAdmin):  
     list_display = ('title', 'doc_type', 'upload_time', 'is_verified')  
     list_filter = ('doc_type', 'is_verified')  
     search_fields = ('title', 'content')  
-    readonly_fields = ('upload_time',)  
+    readonly_fields = ('upload_time', 'source_encoding')  
     fieldsets = (  
         (None, {  
             'fields': ('title', 'doc_type')  
         }),  
         ('内容管理', {  
-            'fields': ('content', 'source_file'),  
+            'fields': ('content', 'source_file', 'source_encoding'),  
             'classes': ('wide',)  
         }),  
         ('状态管理', {  
@@ -20,4 +32,74 @@ class TCMDocumentAdmin(admin.ModelAdmin):
         }),  
     )  
 
-admin.site.register(TCMDocument, TCMDocumentAdmin)  
\ No newline at end of file
+    def _fts_terms(self, search_term):
+        """返回可走全文索引的检索词和短词；FTS 不可用或没有足够长的词时返回 None"""
+        indexed, short = fts.split_terms(search_term or '')
+        if not indexed or not fts.is_installed():
+            return None
+        return indexed, short
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        检索词中至少有一个 >= 3 个字时走 FTS5 索引，短词在命中结果上再用 LIKE 过滤；
+        否则退回默认的 LIKE 全表扫描
+        """
+        terms = self._fts_terms(search_term)
+        if terms is None:
+            return super().get_search_results(request, queryset, search_term)
+
+        indexed, short = terms
+        queryset = fts.search(queryset, indexed)
+        if short:
+            queryset, may_have_duplicates = super().get_search_results(request, queryset, ' '.join(short))
+            return queryset, may_have_duplicates
+        return queryset, False
+
+    def get_changelist(self, request, **kwargs):
+        return RankedChangeList
+
+    def save_model(self, request, obj, form, change):
+        # 文本源文件已在上传时流式分块（knowledge.uploads），这里只把分块落库
+        spool = getattr(request, 'upload_chunk_spools', {}).get('source_file')
+        if spool is None or 'source_file' not in form.changed_data:
+            return super().save_model(request, obj, form, change)
+        obj.source_encoding = spool.encoding or ''
+        if not obj.content:
+            obj.excerpt = spool.excerpt
+        super().save_model(request, obj, form, change)
+        save_chunks(obj, spool)
+
+admin.site.register(TCMDocument, TCMDocumentAdmin)  
+
+
+@admin.register(IndexOutbox)
+class IndexOutboxAdmin(admin.ModelAdmin):
+    list_display = ('document_id', 'operation', 'version', 'created_at', 'processed_at', 'attempts')
+    list_filter = ('operation', ('processed_at', admin.EmptyFieldListFilter))
+    readonly_fields = ('document_id', 'operation', 'version', 'created_at', 'processed_at', 'last_error')
+
+
+@admin.register(DocumentIndexState)
+class DocumentIndexStateAdmin(admin.ModelAdmin):
+    list_display = ('document_id', 'indexed_version', 'current_version', 'lag', 'chunk_count', 'indexed_at')
+    readonly_fields = ('document_id', 'indexed_version', 'chunk_ids', 'indexed_at')
+
+    def get_queryset(self, request):
+        # 文档当前版本用相关子查询在同一条 SQL 中取出，只查当前页的文档
+        current = TCMDocument.objects.filter(pk=OuterRef('document_id')).values('version')[:1]
+        return super().get_queryset(request).annotate(
+            current_version=Subquery(current),
+            lag=F('current_version') - F('indexed_version'),
+        )
+
+    @admin.display(description='文档版本', ordering='current_version')
+    def current_version(self, obj):
+        return obj.current_version
+
+    @admin.display(description='落后版本数', ordering='lag')
+    def lag(self, obj):
+        return obj.lag
+
+    @admin.display(description='分块数')
+    def chunk_count(self, obj):
+        return len(obj.chunk_ids)
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class KnowledgeConfig(AppConfig):  
     default_auto_field = 'django.db.models.BigAutoField'  
     name = 'knowledge'  
-    verbose_name = "中医知识库管理"  
\ No newline at end of file
+    verbose_name = "中医知识库管理"  
+
+    def ready(self):
+        from . import signals  # noqa: F401  注册向量索引同步信号
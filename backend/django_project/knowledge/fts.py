@@ -0,0 +1,195 @@
+"""
+TCMDocument 的 SQLite FTS5 全文索引
+
+- 外部内容表（content='knowledge_tcmdocument'）只保存倒排索引，不重复存储正文
+- 上传源文件的文档正文保存在 TCMDocumentChunk 中（content 为空），分块另建一个外部内容索引，
+  检索词出现在标题、正文或任一分块中即算命中（分块之间有重叠，跨分块边界的短语也能命中）
+- trigram 分词器按 3 字滑窗切分，适合不分词的中文；少于 3 个字的检索词无法走索引
+- 由数据库触发器保持与 knowledge_tcmdocument / knowledge_tcmdocumentchunk 同步
+  （包括 bulk_create / update() 等绕过信号的写入）
+
+SQLite 在修改表结构时会重建表，触发器随旧表一起删除，
+因此修改 TCMDocument / TCMDocumentChunk 表结构的迁移需要再调用一次 install()。
+"""
+
+import sqlite3
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+DOCUMENT_TABLE = "knowledge_tcmdocument"
+FTS_TABLE = "knowledge_tcmdocument_fts"
+CHUNK_TABLE = "knowledge_tcmdocumentchunk"
+CHUNK_FTS_TABLE = "knowledge_tcmdocumentchunk_fts"
+MIN_TERM_LENGTH = 3  # trigram 分词器能匹配的最短检索词
+
+# bm25 各列权重：标题命中的权重高于正文
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+
+INSTALL_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, content,
+        content='{DOCUMENT_TABLE}', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, content ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+]
+
+# 分块表（0005 迁移创建）存在时才安装
+CHUNK_INSTALL_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {CHUNK_FTS_TABLE} USING fts5(
+        text,
+        content='{CHUNK_TABLE}', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {CHUNK_FTS_TABLE}_ai AFTER INSERT ON {CHUNK_TABLE} BEGIN
+        INSERT INTO {CHUNK_FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {CHUNK_FTS_TABLE}_ad AFTER DELETE ON {CHUNK_TABLE} BEGIN
+        INSERT INTO {CHUNK_FTS_TABLE}({CHUNK_FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {CHUNK_FTS_TABLE}_au AFTER UPDATE OF text ON {CHUNK_TABLE} BEGIN
+        INSERT INTO {CHUNK_FTS_TABLE}({CHUNK_FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO {CHUNK_FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+]
+
+UNINSTALL_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+    f"DROP TRIGGER IF EXISTS {CHUNK_FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {CHUNK_FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {CHUNK_FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {CHUNK_FTS_TABLE}",
+]
+
+
+def is_supported(conn=connection) -> bool:
+    """数据库是否为 SQLite 且支持 trigram 分词器（SQLite >= 3.34）"""
+    return conn.vendor == "sqlite" and sqlite3.sqlite_version_info >= (3, 34, 0)
+
+
+def _table_exists(cursor, name) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [name])
+    return cursor.fetchone() is not None
+
+
+def is_installed(conn=connection) -> bool:
+    if not is_supported(conn):
+        return False
+    with conn.cursor() as cursor:
+        return _table_exists(cursor, FTS_TABLE) and _table_exists(cursor, CHUNK_FTS_TABLE)
+
+
+def install(conn=connection, rebuild: bool = True):
+    """创建 FTS 表和同步触发器（幂等），并按需从文档表和分块表重建索引"""
+    if not is_supported(conn):
+        return
+    with conn.cursor() as cursor:
+        statements = INSTALL_SQL + (CHUNK_INSTALL_SQL if _table_exists(cursor, CHUNK_TABLE) else [])
+        for statement in statements:
+            cursor.execute(statement)
+    if rebuild:
+        rebuild_index(conn)
+
+
+def uninstall(conn=connection):
+    if conn.vendor != "sqlite":
+        return
+    with conn.cursor() as cursor:
+        for statement in UNINSTALL_SQL:
+            cursor.execute(statement)
+
+
+def rebuild_index(conn=connection, optimize: bool = False):
+    """从文档表和分块表全量重建倒排索引，optimize=True 时再合并索引段"""
+    with conn.cursor() as cursor:
+        tables = [FTS_TABLE] + ([CHUNK_FTS_TABLE] if _table_exists(cursor, CHUNK_FTS_TABLE) else [])
+        for table in tables:
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+            if optimize:
+                cursor.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+
+
+def split_terms(search_term: str):
+    """
+    拆分检索词
+
+    Returns:
+        (indexed, short): 可走 FTS 索引的词（>= 3 个字）和需要退回 LIKE 过滤的短词
+    """
+    terms = search_term.split()
+    indexed = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+    short = [term for term in terms if len(term) < MIN_TERM_LENGTH]
+    return indexed, short
+
+
+def match_expression(terms) -> str:
+    """每个词作为短语加引号（转义内部引号），多个词之间为 AND"""
+    return " ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def search(queryset, terms):
+    """
+    用 FTS 索引过滤 queryset，并附加 fts_rank 注解（bm25，越小越相关）
+
+    每个检索词都要在标题、正文或该文档的某个分块中出现。排序取所有词同时命中标题/正文时的 bm25，
+    其次是所有词同时命中的分块中最好的 bm25；检索词分散在不同位置的文档排在最后（fts_rank 为 0）。
+
+    Args:
+        queryset: TCMDocument 查询集
+        terms: 长度 >= MIN_TERM_LENGTH 的检索词
+    """
+    for term in terms:
+        match = match_expression([term])
+        matched_ids = RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"UNION SELECT document_id FROM {CHUNK_TABLE} WHERE id IN "
+            f"(SELECT rowid FROM {CHUNK_FTS_TABLE} WHERE {CHUNK_FTS_TABLE} MATCH %s)",
+            (match, match)
+        )
+        queryset = queryset.filter(pk__in=matched_ids)
+
+    match = match_expression(terms)
+    rank = RawSQL(
+        f"SELECT COALESCE("
+        f"(SELECT bm25({FTS_TABLE}, {TITLE_WEIGHT}, {CONTENT_WEIGHT}) FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s AND rowid = {DOCUMENT_TABLE}.id), "
+        f"(SELECT bm25({CHUNK_FTS_TABLE}, {CONTENT_WEIGHT}) AS chunk_rank FROM {CHUNK_FTS_TABLE} "
+        f"WHERE {CHUNK_FTS_TABLE} MATCH %s AND rowid IN "
+        f"(SELECT id FROM {CHUNK_TABLE} WHERE document_id = {DOCUMENT_TABLE}.id) "
+        f"ORDER BY chunk_rank LIMIT 1), "
+        f"0)",
+        (match, match)
+    )
+    return queryset.annotate(fts_rank=rank)
@@ -0,0 +1,181 @@
+"""
+TCMDocument → 向量索引的增量同步
+
+消费 IndexOutbox 中未处理的变更：同一文档的多条变更合并为最新一条，
+只对受影响的文档切分和计算 embedding（整批一次写入），写入新分块后再删除旧分块，
+并在 DocumentIndexState 中记录已同步的版本。
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models import F, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import DocumentIndexState, IndexOutbox, TCMDocument
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5  # 超过重试次数的变更不再自动处理，需要排查后手动重置 attempts
+
+
+class VectorIndexer:
+    """
+    向量库写入适配：默认使用 rag_service 的 tcm_knowledge collection 和分块器
+
+    每次写入/删除后递增该 collection 在检索缓存中的代数（本进程内的缓存立即失效，其他进程按 TTL 过期）
+    """
+
+    def __init__(self, vector_store=None, text_splitter=None, cache_namespace=None):
+        if vector_store is None or text_splitter is None:
+            from rag_service.retriever import COLLECTION_NAME, get_text_splitter, get_vector_store
+            if vector_store is None:
+                cache_namespace = cache_namespace or COLLECTION_NAME
+            vector_store = vector_store or get_vector_store()
+            text_splitter = text_splitter or get_text_splitter()
+        self.vector_store = vector_store
+        self.text_splitter = text_splitter
+        self.cache_namespace = cache_namespace
+
+    def _invalidate(self):
+        if self.cache_namespace:
+            from rag_service.retrieval_cache import get_retrieval_cache
+            get_retrieval_cache().bump(self.cache_namespace)
+
+    def split(self, document):
+        if document.content:
+            return self.text_splitter.split_text(document.content)
+        # 只上传了源文件的文档，使用上传时流式切好的分块
+        return list(document.chunks.values_list('text', flat=True))
+
+    def add(self, texts, metadatas):
+        if not texts:
+            return []
+        ids = [str(pk) for pk in self.vector_store.add_texts(texts, metadatas=metadatas)]
+        self._invalidate()
+        return ids
+
+    def delete(self, ids):
+        if ids:
+            self.vector_store.delete(ids=list(ids))
+            self._invalidate()
+
+
+def document_source(document_id):
+    """分块元数据中的 source 字段，与 initialize_knowledge_base 写入的文件路径区分"""
+    return f"tcm_document:{document_id}"
+
+
+def sync_pending(indexer, batch_size=100):
+    """
+    处理一批待同步的变更
+
+    Args:
+        indexer: VectorIndexer
+        batch_size: 每批最多处理的变更条数
+
+    Returns:
+        dict: 本批处理的变更数、写入/删除的文档数、分块数
+    """
+    entries = list(
+        IndexOutbox.objects.filter(processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS)
+        .order_by('id')[:batch_size]
+    )
+    if not entries:
+        return {"entries": 0, "upserted": 0, "deleted": 0, "chunks": 0}
+
+    latest = {}
+    for entry in entries:
+        latest[entry.document_id] = entry
+    document_ids = list(latest)
+
+    documents = TCMDocument.objects.in_bulk(document_ids)
+    states = DocumentIndexState.objects.in_bulk(document_ids, field_name='document_id')
+
+    # 以文档当前状态为准：已删除或未审核的文档一律从索引中移除
+    to_index = [
+        documents[doc_id] for doc_id in document_ids
+        if doc_id in documents and documents[doc_id].is_verified
+    ]
+    to_remove = [doc_id for doc_id in document_ids if doc_id not in {doc.pk for doc in to_index}]
+
+    chunk_ids = {}
+    try:
+        from rag_service.retriever import chunk_metadata
+
+        texts, metadatas, owners = [], [], []
+        for document in to_index:
+            chunks = indexer.split(document)
+            texts.extend(chunks)
+            metadatas.extend(chunk_metadata(document_source(document.pk)) for _ in chunks)
+            owners.extend([document.pk] * len(chunks))
+
+        # 先写入新分块再删除旧分块，同步过程中检索不会出现空窗
+        new_ids = indexer.add(texts, metadatas)
+        for owner, chunk_id in zip(owners, new_ids):
+            chunk_ids.setdefault(owner, []).append(chunk_id)
+
+        stale_ids = [
+            chunk_id for doc_id in document_ids if doc_id in states
+            for chunk_id in states[doc_id].chunk_ids
+        ]
+        indexer.delete(stale_ids)
+    except Exception as exc:
+        logger.exception("向量索引同步失败")
+        with transaction.atomic():
+            # 新分块已写入但旧分块删除失败时，把新分块也记到文档名下（已索引版本不变），
+            # 重试时与旧分块一起删除，不会留下无人引用的向量
+            for doc_id, ids in chunk_ids.items():
+                state, _ = DocumentIndexState.objects.get_or_create(document_id=doc_id)
+                state.chunk_ids = list(dict.fromkeys([*state.chunk_ids, *ids]))
+                state.save(update_fields=['chunk_ids'])
+            IndexOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).update(
+                attempts=F('attempts') + 1, last_error=str(exc)
+            )
+        raise
+
+    now = timezone.now()
+    with transaction.atomic():
+        for document in to_index:
+            DocumentIndexState.objects.update_or_create(
+                document_id=document.pk,
+                defaults={
+                    "indexed_version": document.version,
+                    "chunk_ids": chunk_ids.get(document.pk, []),
+                    "indexed_at": now,
+                },
+            )
+        DocumentIndexState.objects.filter(document_id__in=to_remove).delete()
+        IndexOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).update(processed_at=now)
+
+    return {
+        "entries": len(entries),
+        "upserted": len(to_index),
+        "deleted": len(to_remove),
+        "chunks": len(texts),
+    }
+
+
+def sync_status():
+    """
+    同步延迟概况
+
+    Returns:
+        dict: 待处理变更数、最早一条待处理变更的等待秒数、索引版本落后的文档数
+    """
+    pending = IndexOutbox.objects.filter(processed_at__isnull=True)
+    oldest = pending.aggregate(oldest=Min('created_at'))['oldest']
+    indexed_version = DocumentIndexState.objects.filter(document_id=OuterRef('pk')).values('indexed_version')[:1]
+    behind = (
+        TCMDocument.objects.filter(is_verified=True)
+        .annotate(indexed_version=Coalesce(Subquery(indexed_version), 0))
+        .filter(indexed_version__lt=F('version'))
+        .count()
+    )
+    return {
+        "pending": pending.count(),
+        "failed": pending.filter(attempts__gte=MAX_ATTEMPTS).count(),
+        "oldest_pending_seconds": (timezone.now() - oldest).total_seconds() if oldest else 0.0,
+        "documents_behind": behind,
+    }
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from knowledge import fts
+
+
+class Command(BaseCommand):
+    help = "重建 TCMDocument 及其分块的 FTS5 全文索引（同时补建缺失的同步触发器）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--optimize",
+            action="store_true",
+            help="重建后合并索引段，减小索引体积、加快查询",
+        )
+
+    def handle(self, *args, **options):
+        if not fts.is_supported():
+            raise CommandError("全文索引需要 SQLite >= 3.34（trigram 分词器）")
+
+        fts.install(rebuild=False)
+        fts.rebuild_index(optimize=options["optimize"])
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {fts.FTS_TABLE}")
+            (count,) = cursor.fetchone()
+        self.stdout.write(self.style.SUCCESS(f"全文索引已重建，共 {count} 篇文档"))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from knowledge.indexing import VectorIndexer, sync_pending, sync_status
+
+
+class Command(BaseCommand):
+    help = "把 TCMDocument 的增量变更同步到向量索引（消费 IndexOutbox）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="每批处理的变更条数")
+        parser.add_argument("--loop", action="store_true", help="作为后台 worker 持续运行")
+        parser.add_argument("--interval", type=float, default=5.0, help="队列为空时的轮询间隔（秒）")
+        parser.add_argument("--status", action="store_true", help="只输出同步延迟概况")
+
+    def handle(self, *args, **options):
+        if options["status"]:
+            status = sync_status()
+            self.stdout.write(
+                f"待处理变更 {status['pending']} 条（失败 {status['failed']} 条），"
+                f"最早等待 {status['oldest_pending_seconds']:.0f} 秒，"
+                f"索引落后的文档 {status['documents_behind']} 篇"
+            )
+            return
+
+        indexer = VectorIndexer()
+        while True:
+            try:
+                result = sync_pending(indexer, batch_size=options["batch_size"])
+            except Exception as exc:
+                if not options["loop"]:
+                    raise
+                self.stderr.write(f"同步失败，稍后重试: {exc}")
+                time.sleep(options["interval"])
+                continue
+
+            if result["entries"]:
+                self.stdout.write(
+                    f"处理变更 {result['entries']} 条：写入 {result['upserted']} 篇"
+                    f"（{result['chunks']} 个分块），删除 {result['deleted']} 篇"
+                )
+            if not options["loop"]:
+                if result["entries"] < options["batch_size"]:
+                    return
+                continue
+            if result["entries"] < options["batch_size"]:
+                time.sleep(options["interval"])
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:14
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TCMDocument1',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('content', models.TextField()),
+                ('source', models.FileField(upload_to='docs/')),
+                ('upload_time', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TCMDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200, verbose_name='标题')),
+                ('content', models.TextField(verbose_name='内容')),
+                ('doc_type', models.CharField(choices=[('theory', '中医理论'), ('prescription', '方剂'), ('herb', '中药材'), ('case', '医案')], max_length=20, verbose_name='类型')),
+                ('source_file', models.FileField(upload_to='tcm_docs/', verbose_name='源文件')),
+                ('upload_time', models.DateTimeField(default=django.utils.timezone.now, verbose_name='上传时间')),
+                ('is_verified', models.BooleanField(default=False, verbose_name='已审核')),
+            ],
+            options={
+                'verbose_name': '中医文献',
+                'verbose_name_plural': '中医文献管理',
+                'indexes': [models.Index(fields=['title'], name='knowledge_t_title_d05325_idx'), models.Index(fields=['doc_type'], name='knowledge_t_doc_typ_7129e6_idx')],
+            },
+        ),
+    ]
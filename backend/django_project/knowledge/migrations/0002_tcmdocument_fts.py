@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from knowledge import fts
+
+
+def install_fts(apps, schema_editor):
+    fts.install(schema_editor.connection)
+
+
+def uninstall_fts(apps, schema_editor):
+    fts.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_fts, uninstall_fts),
+    ]
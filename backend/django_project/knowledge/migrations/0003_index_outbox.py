@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+from knowledge import fts
+
+
+def reinstall_fts_triggers(apps, schema_editor):
+    # SQLite 添加 NOT NULL 字段时会重建 knowledge_tcmdocument，全文索引的同步触发器需要重新创建
+    fts.install(schema_editor.connection, rebuild=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge', '0002_tcmdocument_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentIndexState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_id', models.BigIntegerField(unique=True, verbose_name='文档ID')),
+                ('indexed_version', models.PositiveIntegerField(default=0, verbose_name='已索引版本')),
+                ('chunk_ids', models.JSONField(default=list, verbose_name='分块向量ID')),
+                ('indexed_at', models.DateTimeField(blank=True, null=True, verbose_name='索引时间')),
+            ],
+            options={
+                'verbose_name': '索引状态',
+                'verbose_name_plural': '向量索引状态',
+            },
+        ),
+        migrations.AddField(
+            model_name='tcmdocument',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='版本'),
+        ),
+        migrations.CreateModel(
+            name='IndexOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_id', models.BigIntegerField(verbose_name='文档ID')),
+                ('operation', models.CharField(choices=[('upsert', '写入/更新'), ('delete', '删除')], max_length=10, verbose_name='操作')),
+                ('version', models.PositiveIntegerField(verbose_name='文档版本')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='创建时间')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='处理时间')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='尝试次数')),
+                ('last_error', models.TextField(blank=True, verbose_name='最近错误')),
+            ],
+            options={
+                'verbose_name': '索引变更',
+                'verbose_name_plural': '索引变更队列',
+                'indexes': [models.Index(fields=['processed_at', 'id'], name='knowledge_i_process_642e02_idx')],
+            },
+        ),
+        migrations.RunPython(reinstall_fts_triggers, migrations.RunPython.noop),
+    ]
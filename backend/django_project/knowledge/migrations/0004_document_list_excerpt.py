@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:16
+
+from django.db import migrations, models
+from django.db.models.functions import Substr
+
+from knowledge import fts
+
+
+def backfill_excerpt(apps, schema_editor):
+    TCMDocument = apps.get_model('knowledge', 'TCMDocument')
+    TCMDocument.objects.update(excerpt=Substr('content', 1, 200))
+
+
+def reinstall_fts_triggers(apps, schema_editor):
+    # SQLite 添加字段时会重建 knowledge_tcmdocument，全文索引的同步触发器需要重新创建
+    fts.install(schema_editor.connection, rebuild=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge', '0003_index_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tcmdocument',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='摘要'),
+        ),
+        migrations.AddIndex(
+            model_name='tcmdocument',
+            index=models.Index(fields=['is_verified', '-upload_time', '-id'], name='knowledge_verified_time_idx'),
+        ),
+        migrations.RunPython(reinstall_fts_triggers, migrations.RunPython.noop),
+        migrations.RunPython(backfill_excerpt, migrations.RunPython.noop),
+    ]
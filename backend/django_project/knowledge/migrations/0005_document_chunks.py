@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from knowledge import fts
+
+
+def reinstall_fts_triggers(apps, schema_editor):
+    # SQLite 修改字段时会重建 knowledge_tcmdocument，全文索引的同步触发器需要重新创建
+    fts.install(schema_editor.connection, rebuild=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge', '0004_document_list_excerpt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tcmdocument',
+            name='source_encoding',
+            field=models.CharField(blank=True, editable=False, max_length=20, verbose_name='源文件编码'),
+        ),
+        migrations.AlterField(
+            model_name='tcmdocument',
+            name='content',
+            field=models.TextField(blank=True, help_text='上传文本源文件时可留空，正文以分块形式保存', verbose_name='内容'),
+        ),
+        migrations.CreateModel(
+            name='TCMDocumentChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(verbose_name='序号')),
+                ('text', models.TextField(verbose_name='分块内容')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='knowledge.tcmdocument', verbose_name='文档')),
+            ],
+            options={
+                'verbose_name': '文献分块',
+                'verbose_name_plural': '文献分块',
+                'ordering': ['document', 'position'],
+                'constraints': [models.UniqueConstraint(fields=('document', 'position'), name='knowledge_chunk_position_uniq')],
+            },
+        ),
+        migrations.RunPython(reinstall_fts_triggers, migrations.RunPython.noop),
+    ]
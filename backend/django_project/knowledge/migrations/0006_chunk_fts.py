@@ -0,0 +1,28 @@
+from django.db import migrations
+
+from knowledge import fts
+
+
+def install_chunk_fts(apps, schema_editor):
+    # 创建分块的全文索引和同步触发器，并为已有分块建立索引
+    fts.install(schema_editor.connection)
+
+
+def uninstall_chunk_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in fts.UNINSTALL_SQL:
+            if fts.CHUNK_FTS_TABLE in statement:
+                cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge', '0005_document_chunks'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_chunk_fts, uninstall_chunk_fts),
+    ]
@@ -1,7 +1,12 @@
-from django.db import models  
-from django.contrib import admin  
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import F
 from django.utils import timezone 
 
+EXCERPT_LENGTH = 200
+VERIFIED_COUNT_CACHE_KEY = 'knowledge:tcmdocument:verified_count'
+VERIFIED_COUNT_TIMEOUT = 300  # 秒；本进程内的保存/删除会立即失效，其他进程最多延迟这么久
+
 class TCMDocument1(models.Model):  
     title = models.CharField(max_length=200)  
     content = models.TextField()  
@@ -13,6 +18,16 @@ class TCMDocument1(models.Model):
     
 
 
+class TCMDocumentManager(models.Manager):
+    def verified_count(self):
+        """已审核文档数（缓存，TCMDocument 保存/删除时失效）"""
+        return cache.get_or_set(
+            VERIFIED_COUNT_CACHE_KEY,
+            lambda: self.filter(is_verified=True).count(),
+            VERIFIED_COUNT_TIMEOUT,
+        )
+
+
 class TCMDocument(models.Model):  
     DOC_TYPE_CHOICES = [  
         ('theory', '中医理论'),  
@@ -22,11 +37,16 @@ class TCMDocument(models.Model):
     ]  
 
     title = models.CharField("标题", max_length=200)  
-    content = models.TextField("内容")  
+    content = models.TextField("内容", blank=True, help_text="上传文本源文件时可留空，正文以分块形式保存")  
     doc_type = models.CharField("类型", max_length=20, choices=DOC_TYPE_CHOICES)  
     source_file = models.FileField("源文件", upload_to='tcm_docs/')  
     upload_time = models.DateTimeField("上传时间", default=timezone.now)  
     is_verified = models.BooleanField("已审核", default=False)  
+    version = models.PositiveIntegerField("版本", default=1, editable=False)
+    excerpt = models.CharField("摘要", max_length=EXCERPT_LENGTH, blank=True, editable=False)
+    source_encoding = models.CharField("源文件编码", max_length=20, blank=True, editable=False)
+
+    objects = TCMDocumentManager()
 
     class Meta:  
         verbose_name = "中医文献"  
@@ -34,9 +54,78 @@ class TCMDocument(models.Model):
         indexes = [  
             models.Index(fields=['title']),  
             models.Index(fields=['doc_type']),  
+            # 文档列表按 (upload_time, id) 做 keyset 分页
+            models.Index(fields=['is_verified', '-upload_time', '-id'], name='knowledge_verified_time_idx'),
         ]  
 
-@admin.register(TCMDocument)  
-class TCMDocumentAdmin(admin.ModelAdmin):  
-    list_display = ("title", "upload_time")  
-    search_fields = ("title", "content")  
\ No newline at end of file
+    def __str__(self):
+        return self.title
+
+    def save(self, *args, **kwargs):
+        # 列表页只读取摘要，不加载完整正文
+        if self.content or not self.excerpt:
+            self.excerpt = self.content[:EXCERPT_LENGTH]
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        # 每次修改递增版本号，向量索引记录已同步的版本，两者之差即同步延迟。
+        # 在数据库中用 F('version') + 1 递增再读回：并发保存不会丢失递增，update_fields 不含 version 时也生效
+        with transaction.atomic(using=kwargs.get('using')):
+            queryset = type(self)._base_manager.using(kwargs.get('using')).filter(pk=self.pk)
+            if queryset.update(version=F('version') + 1):
+                self.version = queryset.values_list('version', flat=True).get()
+            super().save(*args, **kwargs)
+
+
+class TCMDocumentChunk(models.Model):
+    """上传源文件时流式切出的正文分块，按 position 顺序拼接即为全文"""
+    document = models.ForeignKey(TCMDocument, on_delete=models.CASCADE, related_name='chunks', verbose_name="文档")
+    position = models.PositiveIntegerField("序号")
+    text = models.TextField("分块内容")
+
+    class Meta:
+        verbose_name = "文献分块"
+        verbose_name_plural = "文献分块"
+        ordering = ['document', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'position'], name='knowledge_chunk_position_uniq'),
+        ]
+
+
+class IndexOutbox(models.Model):
+    """
+    向量索引变更队列（outbox），由 TCMDocument 的 post_save / post_delete 信号写入，
+    sync_vector_index 命令批量消费
+    """
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    OPERATION_CHOICES = [
+        (UPSERT, '写入/更新'),
+        (DELETE, '删除'),
+    ]
+
+    document_id = models.BigIntegerField("文档ID")
+    operation = models.CharField("操作", max_length=10, choices=OPERATION_CHOICES)
+    version = models.PositiveIntegerField("文档版本")
+    created_at = models.DateTimeField("创建时间", default=timezone.now)
+    processed_at = models.DateTimeField("处理时间", null=True, blank=True)
+    attempts = models.PositiveIntegerField("尝试次数", default=0)
+    last_error = models.TextField("最近错误", blank=True)
+
+    class Meta:
+        verbose_name = "索引变更"
+        verbose_name_plural = "索引变更队列"
+        indexes = [
+            models.Index(fields=['processed_at', 'id']),
+        ]
+
+
+class DocumentIndexState(models.Model):
+    """每篇文档在向量索引中的状态：已同步的版本和对应的分块向量ID"""
+    document_id = models.BigIntegerField("文档ID", unique=True)
+    indexed_version = models.PositiveIntegerField("已索引版本", default=0)
+    chunk_ids = models.JSONField("分块向量ID", default=list)
+    indexed_at = models.DateTimeField("索引时间", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "索引状态"
+        verbose_name_plural = "向量索引状态"
\ No newline at end of file
@@ -0,0 +1,23 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import VERIFIED_COUNT_CACHE_KEY, IndexOutbox, TCMDocument
+
+
+@receiver(post_save, sender=TCMDocument)
+def enqueue_document_upsert(sender, instance, **kwargs):
+    # 只有审核通过的文档进入向量索引，取消审核等同于从索引中删除
+    operation = IndexOutbox.UPSERT if instance.is_verified else IndexOutbox.DELETE
+    IndexOutbox.objects.create(document_id=instance.pk, operation=operation, version=instance.version)
+
+
+@receiver(post_delete, sender=TCMDocument)
+def enqueue_document_delete(sender, instance, **kwargs):
+    IndexOutbox.objects.create(document_id=instance.pk, operation=IndexOutbox.DELETE, version=instance.version)
+
+
+@receiver(post_save, sender=TCMDocument)
+@receiver(post_delete, sender=TCMDocument)
+def invalidate_verified_count(sender, **kwargs):
+    cache.delete(VERIFIED_COUNT_CACHE_KEY)
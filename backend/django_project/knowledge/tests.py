@@ -0,0 +1,58 @@
+from django.test import TestCase
+
+from . import fts
+from .models import TCMDocument, TCMDocumentChunk
+
+
+class FTSSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.title_hit = TCMDocument.objects.create(title="桂枝汤方解", content="调和营卫。", doc_type="formula")
+        cls.content_hit = TCMDocument.objects.create(
+            title="方剂", content="桂枝汤调和营卫，头项强痛者宜之。", doc_type="formula"
+        )
+        cls.chunked = TCMDocument.objects.create(title="伤寒论", content="", doc_type="classic")
+        TCMDocumentChunk.objects.bulk_create([
+            TCMDocumentChunk(document=cls.chunked, position=0, text="太阳之为病，脉浮，头项强痛而恶寒。"),
+            TCMDocumentChunk(document=cls.chunked, position=1, text="桂枝汤方：桂枝三两，芍药三两，甘草二两。"),
+        ])
+        TCMDocument.objects.create(title="人参", content="大补元气，复脉固脱。", doc_type="herb")
+
+    def search(self, *terms):
+        return [doc.title for doc in fts.search(TCMDocument.objects.all(), list(terms)).order_by("fts_rank", "pk")]
+
+    def test_title_match_ranks_first(self):
+        titles = self.search("桂枝汤")
+        self.assertEqual(titles[0], "桂枝汤方解")
+        # 正文为空的文档通过分块命中
+        self.assertEqual(sorted(titles[1:]), sorted(["方剂", "伤寒论"]))
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.search("桂枝汤", "头项强痛"), ["方剂", "伤寒论"])
+        self.assertEqual(self.search("桂枝汤", "大补元气"), [])
+
+    def test_terms_spread_over_chunks_rank_last(self):
+        # 伤寒论的两个词在不同分块中，没有单个位置同时命中，fts_rank 为 0
+        ranks = {doc.title: doc.fts_rank for doc in fts.search(TCMDocument.objects.all(), ["头项强痛", "桂枝汤"])}
+        self.assertLess(ranks["方剂"], 0)
+        self.assertEqual(ranks["伤寒论"], 0)
+
+    def test_index_follows_chunk_updates_and_deletes(self):
+        TCMDocumentChunk.objects.filter(document=self.chunked, position=0).update(text="改写后的分块")
+        self.assertEqual(self.search("脉浮，头"), [])
+        self.assertEqual(self.search("改写后"), ["伤寒论"])
+        self.chunked.delete()
+        self.assertEqual(self.search("改写后"), [])
+
+    def test_index_follows_document_updates(self):
+        self.content_hit.content = "改为四逆汤。"
+        self.content_hit.save()
+        self.assertEqual(self.search("四逆汤"), ["方剂"])
+        self.assertNotIn("方剂", self.search("头项强痛"))
+
+    def test_index_follows_document_deletes(self):
+        self.title_hit.delete()
+        self.assertNotIn("桂枝汤方解", self.search("桂枝汤"))
+
+    def test_match_expression_quotes_terms(self):
+        self.assertEqual(fts.match_expression(['桂枝"汤']), '"桂枝""汤"')
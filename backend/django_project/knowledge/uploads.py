@@ -0,0 +1,91 @@
+"""
+源文件流式上传
+
+StreamingChunkUploadHandler 排在默认上传处理器之前：每收到一段上传数据就增量解码、分块，
+分块追加写入磁盘上的临时文件（每行一个 JSON 字符串），原始数据继续交给后续处理器保存文件本身。
+分块在上传过程中即已完成，保存文档时再从临时文件分批写入 TCMDocumentChunk，
+整个过程内存占用与文件大小无关。
+"""
+
+import json
+import tempfile
+from itertools import islice
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+from rag_service.streaming import IncrementalChunker, StreamDecoder
+
+from .models import EXCERPT_LENGTH, TCMDocumentChunk
+
+STREAM_FIELDS = ('source_file',)
+TEXT_SUFFIXES = ('.txt', '.md', '.text')
+INSERT_BATCH_SIZE = 500
+
+
+class ChunkSpool:
+    """上传过程中切出的分块，暂存在临时文件中"""
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+        self.count = 0
+        self.encoding = None
+        self.excerpt = ''
+
+    def write(self, chunks):
+        for chunk in chunks:
+            if not self.excerpt:
+                self.excerpt = chunk[:EXCERPT_LENGTH]
+            self.file.write(json.dumps(chunk, ensure_ascii=False))
+            self.file.write('\n')
+            self.count += 1
+
+    def __iter__(self):
+        self.file.seek(0)
+        return (json.loads(line) for line in self.file)
+
+    def close(self):
+        self.file.close()
+
+
+class StreamingChunkUploadHandler(FileUploadHandler):
+    """对 STREAM_FIELDS 中的文本文件边上传边分块，结果放在 request.upload_chunk_spools[字段名]"""
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.active = field_name in STREAM_FIELDS and file_name.lower().endswith(TEXT_SUFFIXES)
+        if self.active:
+            self.decoder = StreamDecoder(charset)
+            self.chunker = IncrementalChunker()  # 默认参数与 rag_service.retriever 的分块设置一致
+            self.spool = ChunkSpool()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.active:
+            self.spool.write(self.chunker.feed(self.decoder.decode(raw_data)))
+        # 返回原始数据，交给后续处理器保存文件
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.active:
+            self.spool.write(self.chunker.feed(self.decoder.decode(b'', final=True)))
+            self.spool.write(self.chunker.finish())
+            self.spool.encoding = self.decoder.encoding
+            spools = getattr(self.request, 'upload_chunk_spools', {})
+            spools[self.field_name] = self.spool
+            self.request.upload_chunk_spools = spools
+            self.active = False
+        return None
+
+
+def save_chunks(document, spool):
+    """用上传时切好的分块替换文档已有的分块（分批 bulk_create）"""
+    TCMDocumentChunk.objects.filter(document=document).delete()
+    rows = (
+        TCMDocumentChunk(document=document, position=position, text=text)
+        for position, text in enumerate(spool)
+    )
+    while True:
+        batch = list(islice(rows, INSERT_BATCH_SIZE))
+        if not batch:
+            break
+        TCMDocumentChunk.objects.bulk_create(batch)
+    spool.close()
@@ -1,11 +1,65 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from django.http import Http404
 from django.views.generic import ListView  
 from .models import TCMDocument  
 
+LIST_FIELDS = ('id', 'title', 'doc_type', 'upload_time', 'excerpt')
+
+
+def encode_cursor(document):
+    raw = f"{document.upload_time.isoformat()}|{document.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        upload_time, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(upload_time), int(pk)
+    except ValueError:
+        raise Http404("无效的分页游标")
+
+
 class DocumentListView(ListView):  
+    """
+    已审核文档列表
+
+    - 只读取列表需要的字段（摘要列代替完整正文）
+    - 按 (upload_time, id) 倒序做 keyset 分页（?after=<游标>），翻页开销与页码无关，
+      由 (is_verified, -upload_time, -id) 联合索引支撑
+    - 总数来自缓存，不在每次翻页时执行 COUNT(*)
+    """
     model = TCMDocument  
     template_name = 'knowledge/doc_list.html'  
     context_object_name = 'documents'  
-    paginate_by = 20  
+    page_size = 20
 
     def get_queryset(self):  
-        return TCMDocument.objects.filter(is_verified=True)  
\ No newline at end of file
+        queryset = (
+            TCMDocument.objects.filter(is_verified=True)
+            .only(*LIST_FIELDS)
+            .order_by('-upload_time', '-id')
+        )
+        cursor = self.request.GET.get('after')
+        if cursor:
+            upload_time, pk = decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(upload_time__lt=upload_time) | Q(upload_time=upload_time, id__lt=pk)
+            )
+        # 多取一条用于判断是否还有下一页
+        return queryset[:self.page_size + 1]
+
+    def get_context_data(self, **kwargs):
+        documents = list(self.object_list)
+        has_next = len(documents) > self.page_size
+        documents = documents[:self.page_size]
+        context = super().get_context_data(object_list=documents, **kwargs)
+        context.update({
+            'has_next': has_next,
+            'next_cursor': encode_cursor(documents[-1]) if has_next else None,
+            'total_count': TCMDocument.objects.verified_count(),
+        })
+        return context
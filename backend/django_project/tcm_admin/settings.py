@@ -1,8 +1,13 @@
 import os  
+import sys
 from pathlib import Path  
 
 BASE_DIR = Path(__file__).resolve().parent.parent  
 
+# 向量索引同步复用 backend/rag_service 中的向量库与分块配置
+if str(BASE_DIR.parent) not in sys.path:
+    sys.path.append(str(BASE_DIR.parent))
+
 SECRET_KEY = os.getenv('DJANGO_SECRET', 'django-insecure-your-secret-key')  
 
 DEBUG = True  
@@ -81,4 +86,11 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'  
 MEDIA_ROOT = BASE_DIR / 'media'  
 
+# 文本源文件边上传边解码、分块（knowledge/uploads.py），其余处理器负责保存文件本身
+FILE_UPLOAD_HANDLERS = [
+    'knowledge.uploads.StreamingChunkUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'  
\ No newline at end of file
@@ -0,0 +1,21 @@
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi_app.routers import chat
+from rag_service.metrics import PROMETHEUS_CONTENT_TYPE, render_prometheus, server_timing_middleware
+
+app = FastAPI(title="TCM RAG API")
+
+# 记录各阶段耗时，写入 Server-Timing 响应头
+app.middleware("http")(server_timing_middleware)
+
+app.include_router(chat.router)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 指标（各阶段耗时直方图、p50/p95/p99、调用与异常计数）"""
+    return PlainTextResponse(render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+if __name__ == "__main__":
+    import uvicorn
+    # 在 backend 目录下运行: python -m fastapi_app.main
+    uvicorn.run(app, host="0.0.0.0", port=8001)
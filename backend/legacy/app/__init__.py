@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+# legacy 应用复用 backend/rag_service 中的公共模块（指标、embedding 等），
+# 保证无论从哪个入口启动（python main.py / uvicorn main:app），backend 目录都在 sys.path 中
+_BACKEND_DIR = str(Path(__file__).resolve().parents[2])
+if _BACKEND_DIR not in sys.path:
+    sys.path.append(_BACKEND_DIR)
@@ -1,24 +1,40 @@
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Optional
-from ..services.doubao import DouBaoService
-from ..services.rag import RAGService
+from rag_service.executors import ExecutorBusy
+from rag_service.responses import FastJSONResponse, excerpt
+from ..core.config import settings
+from ..core.ratelimit import TokenReservation, token_quota
+from ..services.container import get_doubao_service, get_rag_service
 
 router = APIRouter()
-doubao_service = DouBaoService()
-rag_service = RAGService()
 
 class ChatRequest(BaseModel):
     query: str
     history: Optional[List[Dict[str, str]]] = []
+    excerpts: bool = False  # 引用只返回分块ID、标题、出处和摘要，全文通过 /knowledge/chunks/{chunk_id} 获取
 
 class ChatResponse(BaseModel):
     response: str
     references: List[Dict]
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+def _reference_excerpt(doc: Dict) -> Dict:
+    metadata = doc.get("metadata") or {}
+    return {
+        "chunk_id": doc.get("chunk_id"),
+        "title": metadata.get("title"),
+        "source": metadata.get("source"),
+        "excerpt": excerpt(doc["content"], settings.REFERENCE_EXCERPT_LENGTH)
+    }
+
+@router.post("/chat", response_model=ChatResponse, response_class=FastJSONResponse)
+async def chat(
+    request: ChatRequest,
+    rag_service = Depends(get_rag_service),
+    doubao_service = Depends(get_doubao_service),
+    quota: TokenReservation = Depends(token_quota)
+):
     try:
         # 1. 通过RAG检索相关文档
         relevant_docs = await rag_service.search_similar(request.query)
@@ -34,11 +50,16 @@ async def chat(request: ChatRequest):
         # 3. 调用豆包API
         response = await doubao_service.chat(messages)
         
+        # 按实际用量结算准入时预留的每日 token 配额
+        quota.settle((response.get("usage") or {}).get("total_tokens", 0))
+        
         return ChatResponse(
             response=response["choices"][0]["message"]["content"],
-            references=relevant_docs
+            references=[_reference_excerpt(doc) for doc in relevant_docs] if request.excerpts else relevant_docs
         )
         
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
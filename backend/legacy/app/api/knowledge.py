@@ -1,28 +1,81 @@
 
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from pydantic import ValidationError
 from typing import List, Optional
+from rag_service.executors import ExecutorBusy
+from rag_service.filters import build_filters
+from rag_service.ndjson import NDJSONStreamingResponse, iter_ndjson
+from rag_service.responses import FastJSONResponse, excerpt
 from ..models.schemas import (
     KnowledgeCreate,
     KnowledgeUpdate,
     KnowledgeResponse,
     KnowledgeListResponse,
+    IngestJobResponse,
     SearchQuery
 )
-from ..services.rag import RAGService
+from ..services.container import get_rag_service, get_services
+from ..core.config import settings
 from ..core.security import get_current_user
 from bson import ObjectId
 from datetime import datetime
 
 router = APIRouter(prefix="/knowledge", tags=["knowledge"])
-rag_service = RAGService()
 
-@router.post("/create", response_model=KnowledgeResponse)
+def _hit_to_knowledge(hit: dict, excerpt_only: bool = False) -> dict:
+    """
+    把向量检索结果（content + 分块元数据）转换为 KnowledgeBase 结构
+    
+    excerpt_only 为 True 时 content 只保留开头的摘要，全文通过 GET /knowledge/chunks/{chunk_id} 获取
+    """
+    metadata = {**(hit.get("metadata") or {}), "chunk_id": hit.get("chunk_id")}
+    content = hit["content"]
+    if excerpt_only:
+        content = excerpt(content, settings.REFERENCE_EXCERPT_LENGTH)
+        metadata["excerpt"] = True
+    return {
+        "_id": metadata.get("doc_id"),
+        "title": metadata.get("title", ""),
+        "content": content,
+        "category": metadata.get("category", ""),
+        "tags": metadata.get("tags") or [],
+        "metadata": metadata
+    }
+
+def _job_to_dict(job: dict) -> dict:
+    progress = job.get("progress") or {}
+    return {
+        "id": str(job["_id"]),
+        "kind": job["kind"],
+        "status": job["status"],
+        "embedded": progress.get("embedded", 0),
+        "total": progress.get("total"),
+        "attempts": job.get("attempts", 0),
+        "error": job.get("error"),
+        "result": job.get("result"),
+        "created_at": job["created_at"],
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at")
+    }
+
+def _accepted(services, job_id: str, message: str) -> IngestJobResponse:
+    return IngestJobResponse(
+        success=True,
+        message=message,
+        data=_job_to_dict(services.rag.ingest_jobs.get(job_id))
+    )
+
+@router.post("/create", response_model=IngestJobResponse, status_code=202)
 async def create_knowledge(
     knowledge: KnowledgeCreate,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user),
+    services = Depends(get_services)
 ):
     """
     创建新的知识文档
+    
+    切分、embedding 和写入由后台入库任务执行，立即返回 202 和任务，
+    通过 GET /knowledge/jobs/{job_id} 查询进度，完成后结果中包含 doc_id
     """
     try:
         # 添加创建时间和更新时间
@@ -33,36 +86,74 @@ async def create_knowledge(
             "updated_at": datetime.utcnow()
         }
         
-        # 保存到知识库
-        doc_id = await rag_service.add_knowledge(
-            content=knowledge.content,
-            metadata={
-                "title": knowledge.title,
-                "category": knowledge.category,
-                "tags": knowledge.tags,
-                **metadata
-            }
+        # 提交入库任务
+        job_id = services.submit_ingest_job(
+            "knowledge.create",
+            {
+                "content": knowledge.content,
+                "metadata": {
+                    "title": knowledge.title,
+                    "category": knowledge.category,
+                    "tags": knowledge.tags,
+                    **metadata
+                }
+            },
+            owner=current_user
         )
         
-        # 获取创建的文档
-        doc = await rag_service.get_document(doc_id)
-        
-        return KnowledgeResponse(
-            success=True,
-            message="知识文档创建成功",
-            data=doc
-        )
+        return _accepted(services, job_id, "知识文档入库任务已提交")
         
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/bulk", response_class=NDJSONStreamingResponse)
+async def bulk_create_knowledge(
+    request: Request,
+    current_user: str = Depends(get_current_user),
+    rag_service = Depends(get_rag_service)
+):
+    """
+    批量创建知识文档
+    
+    请求体为 NDJSON（application/x-ndjson），每行一个与 /knowledge/create 相同的 JSON 对象，可以流式上传；
+    服务端边读边解析，按批计算 embedding 并批量写入。响应也是 NDJSON，逐行返回
+    {"line", "ok", "doc_id", "chunks"} 或 {"line", "ok": false, "error"}，最后一行为汇总 {"done": true, ...}
+    """
+    async def documents():
+        async for line, record, error in iter_ndjson(request.stream(), settings.BULK_MAX_LINE_BYTES):
+            if error is not None:
+                yield line, None, None, error
+                continue
+            try:
+                knowledge = KnowledgeCreate(**record)
+            except ValidationError as e:
+                yield line, None, None, "字段校验失败: " + "; ".join(
+                    f"{'.'.join(map(str, item['loc']))} {item['msg']}" for item in e.errors()
+                )
+                continue
+            now = datetime.utcnow()
+            yield line, knowledge.content, {
+                "title": knowledge.title,
+                "category": knowledge.category,
+                "tags": knowledge.tags,
+                **knowledge.metadata,
+                "created_by": current_user,
+                "created_at": now,
+                "updated_at": now
+            }, None
+    
+    return NDJSONStreamingResponse(rag_service.bulk_add_knowledge(documents()))
+
 @router.get("/list", response_model=KnowledgeListResponse)
 async def list_knowledge(
     category: Optional[str] = None,
     tag: Optional[str] = None,
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=50),
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user),
+    rag_service = Depends(get_rag_service)
 ):
     """
     获取知识文档列表
@@ -89,13 +180,16 @@ async def list_knowledge(
             data=docs
         )
         
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{doc_id}", response_model=KnowledgeResponse)
 async def get_knowledge(
     doc_id: str,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user),
+    rag_service = Depends(get_rag_service)
 ):
     """
     获取单个知识文档
@@ -111,18 +205,26 @@ async def get_knowledge(
             data=doc
         )
         
+    except HTTPException:
+        raise
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.put("/{doc_id}", response_model=KnowledgeResponse)
+@router.put("/{doc_id}", response_model=IngestJobResponse, status_code=202)
 async def update_knowledge(
     doc_id: str,
     update_data: KnowledgeUpdate,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user),
+    services = Depends(get_services)
 ):
     """
     更新知识文档
+    
+    更新（包括内容变化后重新生成向量）由后台入库任务执行，立即返回 202 和任务
     """
+    rag_service = services.rag
     try:
         # 检查文档是否存在
         doc = await rag_service.get_document(doc_id)
@@ -134,25 +236,44 @@ async def update_knowledge(
         update_dict["metadata.updated_at"] = datetime.utcnow()
         update_dict["metadata.updated_by"] = current_user
         
-        updated_doc = await rag_service.update_document(doc_id, update_dict)
-        
-        # 如果内容更新了，需要更新向量存储
-        if "content" in update_dict:
-            await rag_service.update_vectors(doc_id, update_dict["content"])
-        
-        return KnowledgeResponse(
-            success=True,
-            message="知识文档更新成功",
-            data=updated_doc
+        # 提交更新任务（内容更新了时任务中同时更新向量存储）
+        job_id = services.submit_ingest_job(
+            "knowledge.update", {"doc_id": doc_id, "update": update_dict}, owner=current_user
         )
         
+        return _accepted(services, job_id, "知识文档更新任务已提交")
+        
+    except HTTPException:
+        raise
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/jobs/{job_id}", response_model=IngestJobResponse)
+async def get_ingest_job(
+    job_id: str,
+    current_user: str = Depends(get_current_user),
+    rag_service = Depends(get_rag_service)
+):
+    """
+    查询入库任务的状态、进度（已写入分块数 / 分块总数）和错误信息
+    """
+    job = rag_service.ingest_jobs.get(job_id)
+    if not job or job.get("owner") != current_user:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    
+    return IngestJobResponse(
+        success=True,
+        message="获取任务状态成功",
+        data=_job_to_dict(job)
+    )
+
 @router.delete("/{doc_id}", response_model=KnowledgeResponse)
 async def delete_knowledge(
     doc_id: str,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user),
+    rag_service = Depends(get_rag_service)
 ):
     """
     删除知识文档
@@ -172,39 +293,70 @@ async def delete_knowledge(
             data=None
         )
         
+    except HTTPException:
+        raise
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/search", response_model=KnowledgeListResponse)
+@router.get("/chunks/{chunk_id}", response_model=KnowledgeResponse, response_class=FastJSONResponse)
+async def get_chunk(
+    chunk_id: str,
+    current_user: str = Depends(get_current_user),
+    rag_service = Depends(get_rag_service)
+):
+    """
+    获取检索结果中某个分块的全文（搜索/聊天接口只返回摘要时使用）
+    """
+    chunks = await rag_service.get_chunks([chunk_id])
+    if not chunks:
+        raise HTTPException(status_code=404, detail="分块不存在")
+    
+    return KnowledgeResponse(
+        success=True,
+        message="获取分块成功",
+        data=_hit_to_knowledge(chunks[0])
+    )
+
+@router.post("/search", response_model=KnowledgeListResponse, response_class=FastJSONResponse)
 async def search_knowledge(
     query: SearchQuery,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user),
+    rag_service = Depends(get_rag_service)
 ):
     """
     搜索知识文档
     """
     try:
-        # 构建搜索条件
-        filter_dict = {}
-        if query.category:
-            filter_dict["metadata.category"] = query.category
-        if query.tags:
-            filter_dict["metadata.tags"] = {"$all": query.tags}
+        # 构建搜索条件（下推到向量库，过滤后仍返回 limit 条）
+        filters = build_filters(
+            category=query.category,
+            tags=query.tags,
+            doc_type=query.doc_type,
+            kb_id=query.kb_id
+        )
             
         # 执行向量搜索
         results = await rag_service.search_similar(
             query=query.query,
             k=query.limit,
-            filter_dict=filter_dict
+            filters=filters,
+            mmr=query.mmr,
+            mmr_lambda=query.mmr_lambda,
+            fetch_k=query.fetch_k,
+            score_threshold=query.score_threshold
         )
         
         return KnowledgeListResponse(
             success=True,
             message="搜索成功",
             total=len(results),
-            data=results
+            data=[_hit_to_knowledge(hit, query.excerpts) for hit in results]
         )
         
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -14,6 +14,92 @@ class Settings(BaseSettings):
     MILVUS_HOST: str = "localhost"
     MILVUS_PORT: int = 19530
     
+    # 向量库后端: milvus，或 local（进程内存向量库，用于离线基准测试/本地开发）
+    VECTOR_STORE_BACKEND: str = "milvus"
+    
+    # 知识库的 collection 布局（rag2）: per_kb 为每个知识库一个 collection（kb_<知识库ID>），
+    # shared 为所有知识库共用 SHARED_KB_COLLECTION，按分块的 kb_id 字段过滤；
+    # 已有知识库切换前先用 kb_migrate.py 迁移到共享 collection
+    KB_COLLECTION_LAYOUT: str = "per_kb"
+    SHARED_KB_COLLECTION: str = "kb_shared"
+    
+    # Embedding配置: 引擎为 huggingface、onnx（ONNX Runtime，EMBEDDING_MODEL 为 rag_service.onnx_export 的导出目录），
+    # hash（确定性哈希向量，无需下载模型），或 remote（请求 EMBEDDING_SERVER_SOCKET 上的共享 embedding 服务，
+    # 多个 worker 共用一份模型，见 rag_service.embedding_server）
+    EMBEDDING_MODEL: str = "shibing624/text2vec-base-chinese"
+    EMBEDDING_ENGINE: str = "huggingface"
+    EMBEDDING_ONNX_QUANTIZED: bool = False  # onnx 引擎使用 int8 动态量化模型
+    EMBEDDING_THREADS: int = 0  # onnx 引擎单个算子的线程数，0 表示物理核数
+    EMBEDDING_SERVER_SOCKET: str = "/tmp/rag_embedding.sock"
+    
+    # 入库近似去重（MinHash + LSH）：估计 Jaccard 相似度不低于阈值的分块共用一个向量
+    DEDUP_ENABLED: bool = True
+    DEDUP_THRESHOLD: float = 0.85
+    
+    # 父文档（small-to-big）检索：文档按 chunk_size（默认 PARENT_CHUNK_SIZE）切成父章节，
+    # 章节内的子分块写入向量库；检索命中子分块后返回所在章节，同一文档中相邻章节合并
+    PARENT_RETRIEVAL_ENABLED: bool = False
+    PARENT_CHUNK_SIZE: int = 1000
+    CHILD_CHUNK_SIZE: int = 200
+    CHILD_CHUNK_OVERLAP: int = 20
+    
+    # 文档版本（写时复制，见 rag_service.versioning）：更新内容时归档旧版本，新旧版本相同的分块共用向量；
+    # 每个文档保留最近 VERSION_RETENTION_COUNT 个旧版本、归档不超过 VERSION_RETENTION_DAYS 天（0 表示不限）；
+    # 默认检索只返回当前版本的分块：知识库有旧版本时向量库多召回 VERSION_SEARCH_OVERFETCH 倍再过滤，没有旧版本时不额外查询
+    DOCUMENT_VERSIONING: bool = True
+    VERSION_RETENTION_COUNT: int = 5
+    VERSION_RETENTION_DAYS: float = 90
+    VERSION_SEARCH_OVERFETCH: int = 2
+    
+    # 阻塞调用线程池（见 rag_service.executors）：embedding 线程数 0 表示 CPU 核数的一半；
+    # 入库任务最多占用每个线程池的 INGEST_SHARE，排队超过上限时接口返回 503
+    EMBEDDING_WORKERS: int = 0
+    VECTOR_STORE_WORKERS: int = 16
+    INGEST_SHARE: float = 0.5
+    EXECUTOR_MAX_QUEUE: int = 256
+    INGEST_MAX_QUEUE: int = 32
+    
+    # 异步入库任务（见 rag_service.ingest_jobs）：worker 数、每次认领的任务数、空闲时轮询间隔（秒）；
+    # 心跳超过 LEASE 秒的任务重新执行，最多 MAX_ATTEMPTS 次；结束的任务保留 RETENTION 秒；
+    # 每写入 INGEST_EMBED_BATCH 个分块上报一次进度
+    INGEST_JOB_WORKERS: int = 2
+    INGEST_JOB_BATCH_SIZE: int = 4
+    INGEST_JOB_POLL_INTERVAL: float = 1.0
+    INGEST_JOB_LEASE: float = 300.0
+    INGEST_JOB_MAX_ATTEMPTS: int = 3
+    INGEST_JOB_RETENTION: float = 7 * 86400
+    INGEST_EMBED_BATCH: int = 64
+    
+    # 批量上传（/knowledge/bulk，NDJSON）：攒够 BULK_EMBED_BATCH 个分块或 BULK_MAX_DOCS 篇文档写入一批；单行最大字节数
+    BULK_EMBED_BATCH: int = 512
+    BULK_MAX_DOCS: int = 200
+    BULK_MAX_LINE_BYTES: int = 16 * 1024 * 1024
+    
+    # 知识库权限缓存：条目有效期（秒）和最大条目数；其他进程修改权限后最多延迟 TTL 生效
+    KB_ACL_CACHE_TTL: float = 30.0
+    KB_ACL_CACHE_SIZE: int = 10000
+    
+    # 检索结果缓存（见 rag_service.retrieval_cache）：按估计字节数限制容量；
+    # 本进程内写入立即失效，其他进程写入后最多延迟 TTL 生效
+    RETRIEVAL_CACHE_ENABLED: bool = True
+    RETRIEVAL_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RETRIEVAL_CACHE_TTL: float = 300.0
+    
+    # 按 API 密钥限流（令牌桶）和每日大模型 token 配额（0 表示不限，只用于 /chat）；
+    # 每次 /chat 准入时预留 CHAT_TOKEN_RESERVATION 个 token，结束后按实际用量结算；
+    # 后端为 memory（每个 worker 各自计数）或 sqlite（同机 worker 共享 RATE_LIMIT_SQLITE_PATH）
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_PER_SECOND: float = 2.0
+    RATE_LIMIT_BURST: int = 10
+    DAILY_TOKEN_QUOTA: int = 200000
+    CHAT_TOKEN_RESERVATION: int = 4000
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_SQLITE_PATH: str = "/tmp/chatbot_ratelimit.sqlite3"
+    
+    # 响应：超过该字节数时按客户端支持压缩（brotli / gzip），引用摘要的字数
+    RESPONSE_COMPRESSION_MIN_SIZE: int = 1024
+    REFERENCE_EXCERPT_LENGTH: int = 120
+    
     # FastAPI配置
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "ChatBot API"
@@ -0,0 +1,342 @@
+"""
+按 API 密钥限流和每日 token 配额
+
+- 令牌桶（rate_limit）：每个密钥每秒补充 RATE_LIMIT_PER_SECOND 个令牌，最多积累 RATE_LIMIT_BURST 个，每个请求消耗一个
+- 每日配额（token_quota，只用于调用大模型的接口）：统计每个密钥当天（UTC）消耗的大模型 token 数，上限 DAILY_TOKEN_QUOTA。
+  准入时原子地预留 CHAT_TOKEN_RESERVATION 个 token（剩余配额不足时拒绝直到次日），调用结束后按实际用量结算，
+  并发或很长的调用不会让用量超出配额太多
+- 超限返回 429，Retry-After 为需要等待的秒数
+
+每个密钥的状态只有几个数，检查和更新都是 O(1)。状态默认保存在进程内存中（每个 uvicorn worker 各自计数）；
+RATE_LIMIT_BACKEND=sqlite 时保存在本机 SQLite 文件中，同一台机器上的所有 worker 共享。
+
+只有通过验证的 API 密钥单独计数；没有携带密钥或密钥无效的请求按客户端 IP 计数，
+每次换一个随机密钥不会得到新的令牌桶和配额。内存后端在日期变化后清理前一天的配额记录。
+"""
+
+import math
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, Security
+from rag_service.metrics import counter
+from .config import settings
+from .security import api_key_header, is_valid_api_key
+
+RATE_LIMIT_REQUESTS = counter("rate_limit_requests_total", "限流检查次数", ["result"])
+RATE_LIMIT_TOKENS = counter("rate_limit_llm_tokens_total", "计入每日配额的大模型 token 数")
+
+MAX_MEMORY_KEYS = 100000  # 内存后端超过该数量的密钥时清理已回满的令牌桶
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _seconds_until_tomorrow() -> int:
+    now = datetime.now(timezone.utc)
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(1, math.ceil((tomorrow - now).total_seconds()))
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + (now - updated) * rate)
+
+
+class MemoryBackend:
+    """进程内状态：{密钥: [令牌数, 更新时间]} 和 {密钥: [日期, 已用 token]}"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, list] = {}
+        self._usage: Dict[str, list] = {}
+        self._usage_day: Optional[str] = None
+
+    def consume(self, key: str, rate: float, burst: float, now: float) -> float:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= MAX_MEMORY_KEYS:
+                    self._purge(rate, burst, now)
+                bucket = self._buckets[key] = [burst, now]
+            tokens = _refill(bucket[0], bucket[1], now, rate, burst)
+            if tokens >= 1:
+                bucket[0], bucket[1] = tokens - 1, now
+                return 0.0
+            bucket[0], bucket[1] = tokens, now
+            return (1 - tokens) / rate
+
+    def _purge(self, rate: float, burst: float, now: float):
+        """删除已经回满的令牌桶（等价于从未访问过）"""
+        idle = [key for key, (tokens, updated) in self._buckets.items()
+                if _refill(tokens, updated, now, rate, burst) >= burst]
+        for key in idle:
+            del self._buckets[key]
+
+    def usage(self, key: str, day: str) -> int:
+        with self._lock:
+            return self._get_usage(key, day)
+
+    def add_usage(self, key: str, day: str, tokens: int):
+        with self._lock:
+            self._add_usage(key, day, tokens)
+
+    def reserve_usage(self, key: str, day: str, tokens: int, limit: int) -> bool:
+        """用量加上 tokens 不超过 limit 时计入并返回 True"""
+        with self._lock:
+            if self._get_usage(key, day) + tokens > limit:
+                return False
+            self._add_usage(key, day, tokens)
+            return True
+
+    def _get_usage(self, key: str, day: str) -> int:
+        entry = self._usage.get(key)
+        return entry[1] if entry and entry[0] == day else 0
+
+    def _add_usage(self, key: str, day: str, tokens: int):
+        entry = self._usage.get(key)
+        if entry and entry[0] == day:
+            entry[1] += tokens
+            return
+        if self._usage_day != day:
+            # 日期变化后前一天的记录不再使用，清理掉避免无限增长
+            self._usage = {k: v for k, v in self._usage.items() if v[0] == day}
+            self._usage_day = day
+        self._usage[key] = [day, tokens]
+
+
+class SQLiteBackend:
+    """本机 SQLite 文件中的共享状态（WAL 模式，每个线程一个连接，令牌桶更新在 IMMEDIATE 事务中完成）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._usage_day: Optional[str] = None
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS token_usage (
+                key TEXT NOT NULL, day TEXT NOT NULL, tokens INTEGER NOT NULL,
+                PRIMARY KEY (key, day)
+            );
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def consume(self, key: str, rate: float, burst: float, now: float) -> float:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens = _refill(row[0], row[1], now, rate, burst) if row else burst
+            allowed = tokens >= 1
+            conn.execute(
+                "INSERT INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens - 1 if allowed else tokens, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return 0.0 if allowed else (1 - tokens) / rate
+
+    def usage(self, key: str, day: str) -> int:
+        row = self._connect().execute(
+            "SELECT tokens FROM token_usage WHERE key = ? AND day = ?", (key, day)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def add_usage(self, key: str, day: str, tokens: int):
+        self._add_usage(self._connect(), key, day, tokens)
+
+    def reserve_usage(self, key: str, day: str, tokens: int, limit: int) -> bool:
+        """用量加上 tokens 不超过 limit 时计入并返回 True（读取和写入在同一个 IMMEDIATE 事务中）"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens FROM token_usage WHERE key = ? AND day = ?", (key, day)
+            ).fetchone()
+            allowed = (row[0] if row else 0) + tokens <= limit
+            if allowed:
+                self._add_usage(conn, key, day, tokens)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed
+
+    def _add_usage(self, conn: sqlite3.Connection, key: str, day: str, tokens: int):
+        if self._usage_day != day:
+            conn.execute("DELETE FROM token_usage WHERE day < ?", (day,))
+            self._usage_day = day
+        conn.execute(
+            "INSERT INTO token_usage (key, day, tokens) VALUES (?, ?, ?) "
+            "ON CONFLICT(key, day) DO UPDATE SET tokens = tokens + excluded.tokens",
+            (key, day, tokens)
+        )
+
+
+class TokenReservation:
+    """一次大模型调用预留的每日配额，调用结束后用 settle() 按实际用量结算"""
+
+    def __init__(self, backend, key: str, day: str, reserved: int):
+        self.backend = backend
+        self.key = key
+        self.day = day
+        self.reserved = reserved
+        self.settled = False
+
+    def settle(self, used: int):
+        """
+        按实际用量结算：多退少补（跨过 UTC 零点时前一天的用量不再影响配额，不再结算）
+
+        Args:
+            used: 实际消耗的 token 数，调用失败时为 0（退回预留）
+        """
+        if self.settled:
+            return
+        self.settled = True
+        if used > 0:
+            RATE_LIMIT_TOKENS.inc(used)
+        if used != self.reserved and self.day == _today():
+            self.backend.add_usage(self.key, self.day, used - self.reserved)
+
+
+class RateLimiter:
+    def __init__(self, backend, rate: float, burst: int, daily_tokens: int = 0):
+        """
+        Args:
+            backend: MemoryBackend 或 SQLiteBackend
+            rate: 每秒补充的请求数
+            burst: 令牌桶容量（允许的突发请求数）
+            daily_tokens: 每日大模型 token 配额，0 表示不限
+        """
+        self.backend = backend
+        self.rate = rate
+        self.burst = burst
+        self.daily_tokens = daily_tokens
+
+    def check(self, key: str) -> Tuple[bool, int]:
+        """
+        令牌桶检查（不检查每日配额）
+
+        Returns:
+            (allowed, retry_after): 是否放行；拒绝时需要等待的秒数
+        """
+        wait = self.backend.consume(key, self.rate, self.burst, time.time())
+        if wait > 0:
+            RATE_LIMIT_REQUESTS.labels(result="throttled").inc()
+            return False, max(1, math.ceil(wait))
+        RATE_LIMIT_REQUESTS.labels(result="allowed").inc()
+        return True, 0
+
+    def reserve(self, key: str, tokens: int) -> Tuple[Optional[TokenReservation], int]:
+        """
+        预留每日配额（不限配额时只用于结算时统计用量）
+
+        Returns:
+            (reservation, retry_after): 剩余配额不足时 reservation 为 None，retry_after 为距次日的秒数
+        """
+        day = _today()
+        if not self.daily_tokens:
+            return TokenReservation(self.backend, key, day, 0), 0
+        tokens = min(tokens, self.daily_tokens)
+        if not self.backend.reserve_usage(key, day, tokens, self.daily_tokens):
+            RATE_LIMIT_REQUESTS.labels(result="quota_exceeded").inc()
+            return None, _seconds_until_tomorrow()
+        return TokenReservation(self.backend, key, day, tokens), 0
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                if settings.RATE_LIMIT_BACKEND == "sqlite":
+                    backend = SQLiteBackend(settings.RATE_LIMIT_SQLITE_PATH)
+                else:
+                    backend = MemoryBackend()
+                _limiter = RateLimiter(
+                    backend,
+                    rate=settings.RATE_LIMIT_PER_SECOND,
+                    burst=settings.RATE_LIMIT_BURST,
+                    daily_tokens=settings.DAILY_TOKEN_QUOTA
+                )
+    return _limiter
+
+
+def rate_limit(request: Request, api_key: Optional[str] = Security(api_key_header)) -> str:
+    """
+    令牌桶限流依赖项（同步函数，SQLite 后端的读写在线程池中执行）
+
+    有效的 API 密钥按密钥计数，缺失或无效的密钥按客户端 IP 计数。同一个请求只计数一次：
+    路由的 dependencies 和接口参数都依赖它时，第二次直接返回第一次的结果。
+
+    Returns:
+        str: 计数使用的键（API 密钥或客户端 IP），每日配额也按这个键计数
+
+    Raises:
+        HTTPException: 429，附带 Retry-After
+    """
+    key = getattr(request.state, "rate_limit_key", None)
+    if key is not None:
+        return key
+    if is_valid_api_key(api_key):
+        key = api_key
+    else:
+        key = f"ip:{request.client.host if request.client else 'unknown'}"
+    request.state.rate_limit_key = key
+    if not settings.RATE_LIMIT_ENABLED:
+        return key
+    allowed, retry_after = get_rate_limiter().check(key)
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail="请求过于频繁",
+            headers={"Retry-After": str(retry_after)}
+        )
+    return key
+
+
+def token_quota(key: str = Depends(rate_limit)) -> Iterator[TokenReservation]:
+    """
+    每日 token 配额依赖项，只用于调用大模型的接口（/chat）
+
+    准入时预留 CHAT_TOKEN_RESERVATION 个 token，接口拿到实际用量后调用 settle()；
+    没有结算（调用失败）的预留在请求结束时退回。
+
+    Raises:
+        HTTPException: 429，Retry-After 为距次日（UTC）的秒数
+    """
+    if settings.RATE_LIMIT_ENABLED:
+        reservation, retry_after = get_rate_limiter().reserve(key, settings.CHAT_TOKEN_RESERVATION)
+    else:
+        reservation, retry_after = TokenReservation(get_rate_limiter().backend, key, _today(), 0), 0
+    if reservation is None:
+        raise HTTPException(
+            status_code=429,
+            detail="今日 token 配额已用完",
+            headers={"Retry-After": str(retry_after)}
+        )
+    try:
+        yield reservation
+    finally:
+        reservation.settle(0)
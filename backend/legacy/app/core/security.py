@@ -14,6 +14,25 @@ api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 # 用于生成临时令牌的密钥
 TOKEN_SECRET = secrets.token_urlsafe(32)
 
+# 访问码哈希的 PBKDF2 迭代次数
+PASSWORD_HASH_ITERATIONS = 100000
+
+def is_valid_api_key(api_key: Optional[str]) -> bool:
+    """
+    判断API密钥是否有效（不抛异常，供限流等需要区分有效密钥的地方使用）
+    
+    Args:
+        api_key: 请求头中的API密钥，可以为空
+        
+    Returns:
+        bool: 密钥非空且在有效密钥列表中
+    """
+    if not api_key:
+        return False
+    # 在实际应用中，这里应该从数据库或配置中获取有效的API密钥列表
+    valid_api_keys = [settings.DOUBAO_AK]  # 示例：使用豆包API密钥作为有效密钥
+    return api_key in valid_api_keys
+
 def verify_api_key(api_key: Optional[str] = Security(api_key_header)) -> bool:
     """
     验证API密钥
@@ -33,10 +52,7 @@ def verify_api_key(api_key: Optional[str] = Security(api_key_header)) -> bool:
             detail="未提供API密钥"
         )
     
-    # 在实际应用中，这里应该从数据库或配置中获取有效的API密钥列表
-    valid_api_keys = [settings.DOUBAO_AK]  # 示例：使用豆包API密钥作为有效密钥
-    
-    if api_key not in valid_api_keys:
+    if not is_valid_api_key(api_key):
         raise HTTPException(
             status_code=HTTP_403_FORBIDDEN,
             detail="无效的API密钥"
@@ -88,6 +104,38 @@ def verify_access_token(token: str, timestamp: int) -> bool:
     
     return token == expected_token
 
+def get_password_hash(password: str) -> str:
+    """
+    计算访问码的哈希（PBKDF2-SHA256，随机盐）
+    
+    Args:
+        password: 明文访问码
+        
+    Returns:
+        str: "pbkdf2_sha256$迭代次数$盐$哈希"
+    """
+    salt = secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), PASSWORD_HASH_ITERATIONS)
+    return f"pbkdf2_sha256${PASSWORD_HASH_ITERATIONS}${salt}${digest.hex()}"
+
+def verify_password(password: str, hashed: str) -> bool:
+    """
+    校验访问码与 get_password_hash 的结果是否匹配
+    
+    Args:
+        password: 明文访问码
+        hashed: 保存的哈希
+        
+    Returns:
+        bool: 是否匹配
+    """
+    try:
+        _, iterations, salt, expected = hashed.split("$")
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), int(iterations))
+    except (AttributeError, ValueError):
+        return False
+    return secrets.compare_digest(digest.hex(), expected)
+
 def get_current_user(api_key: str = Security(verify_api_key)):
     """
     获取当前用户（依赖项）
@@ -12,7 +12,8 @@ class PyObjectId(str):
         yield cls.validate
 
     @classmethod
-    def validate(cls, v):
+    def validate(cls, v, *args):
+        # pydantic v2 兼容模式下额外传入校验上下文
         if not ObjectId.is_valid(str(v)):
             raise ValueError("Invalid ObjectId")
         return str(v)
@@ -68,6 +69,92 @@ class SearchQuery(BaseModel):
     """搜索请求模型"""
     query: str = Field(..., description="搜索关键词")
     category: Optional[str] = Field(None, description="按类别筛选")
-    tags: Optional[List[str]] = Field(None, description="按标签筛选")
+    tags: Optional[List[str]] = Field(None, description="按标签筛选（同时包含所有标签）")
+    doc_type: Optional[str] = Field(None, description="按文档类型筛选")
+    kb_id: Optional[str] = Field(None, description="按知识库筛选")
     limit: int = Field(default=10, ge=1, le=50, description="返回结果数量")
+    score_threshold: Optional[float] = Field(None, description="与查询的最低相似度，低于该值的结果被剔除")
+    mmr: bool = Field(default=False, description="是否用最大边际相关性（MMR）去除内容重叠的结果")
+    mmr_lambda: float = Field(default=0.5, ge=0.0, le=1.0, description="MMR 相关性权重，1 为纯相似度排序")
+    fetch_k: Optional[int] = Field(None, ge=1, le=200, description="MMR 候选数量，默认为 4 * limit")
+    excerpts: bool = Field(default=False, description="只返回分块ID和摘要，全文通过 /knowledge/chunks/{chunk_id} 获取")
+    parent_context: Optional[bool] = Field(
+        None, description="返回命中分块所在的父章节（相邻章节合并），默认取 PARENT_RETRIEVAL_ENABLED"
+    )
 
+
+class IngestJob(BaseModel):
+    """异步入库任务状态"""
+    id: str = Field(..., description="任务ID")
+    kind: str = Field(..., description="任务类型")
+    status: str = Field(..., description="queued / running / succeeded / failed")
+    embedded: int = Field(default=0, description="已写入向量库的分块数")
+    total: Optional[int] = Field(None, description="分块总数，切分完成前为空")
+    attempts: int = Field(default=0, description="已执行次数")
+    error: Optional[str] = Field(None, description="失败原因")
+    result: Optional[Dict] = Field(None, description="执行结果（如 doc_id）")
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class IngestJobResponse(BaseModel):
+    """入库任务响应模型"""
+    success: bool
+    message: str
+    data: Optional[IngestJob] = None
+
+
+# 多知识库服务（services/rag2.py）使用的模型
+
+class KnowledgeBaseCreate(BaseModel):
+    """创建知识库的请求模型"""
+    name: str = Field(..., description="知识库名称")
+    description: Optional[str] = Field(None, description="知识库描述")
+    owner_id: Optional[str] = Field(None, description="所有者")
+    is_public: bool = Field(default=False, description="是否公开")
+    access_code: Optional[str] = Field(None, description="访问码，保存其哈希")
+
+class DocumentCreate(BaseModel):
+    """向知识库添加文档的请求模型"""
+    title: str = Field(..., description="文档标题")
+    content: str = Field(..., description="文档内容")
+    source: Optional[str] = Field(None, description="出处")
+    author: Optional[str] = Field(None, description="作者")
+    tags: List[str] = Field(default=[], description="标签列表")
+    category: Optional[str] = Field(None, description="类别")
+    doc_type: Optional[str] = Field(None, description="文档类型")
+    chunk_size: Optional[int] = Field(None, ge=1, description="分块大小，默认 1000（父文档检索时为章节大小）")
+    chunk_overlap: Optional[int] = Field(None, ge=0, description="分块重叠，默认 200")
+
+class DocumentUpdate(BaseModel):
+    """更新文档的请求模型，未给出的字段保持不变；内容变化时重新分块"""
+    title: Optional[str] = None
+    content: Optional[str] = None
+    source: Optional[str] = None
+    author: Optional[str] = None
+    tags: Optional[List[str]] = None
+    category: Optional[str] = None
+    doc_type: Optional[str] = None
+    chunk_size: Optional[int] = Field(None, ge=1)
+    chunk_overlap: Optional[int] = Field(None, ge=0)
+
+class DocumentSearchQuery(BaseModel):
+    """知识库检索请求模型"""
+    text: str = Field(..., description="查询文本")
+    limit: int = Field(default=3, ge=1, le=50, description="返回结果数量")
+    score_threshold: Optional[float] = Field(None, description="与查询的最低相似度，默认 0.5")
+    category: Optional[str] = Field(None, description="按类别筛选")
+    tags: Optional[List[str]] = Field(None, description="按标签筛选（同时包含所有标签）")
+    doc_type: Optional[str] = Field(None, description="按文档类型筛选")
+    mmr: bool = Field(default=False, description="是否用最大边际相关性（MMR）去除内容重叠的结果")
+    mmr_lambda: float = Field(default=0.5, ge=0.0, le=1.0, description="MMR 相关性权重，1 为纯相似度排序")
+    fetch_k: Optional[int] = Field(None, ge=1, le=200, description="MMR 候选数量，默认为 4 * limit")
+    parent_context: Optional[bool] = Field(
+        None, description="返回命中分块所在的父章节（相邻章节合并），默认取 PARENT_RETRIEVAL_ENABLED"
+    )
+
+class VectorSearchResult(BaseModel):
+    """知识库检索结果"""
+    content: str
+    score: float
+    metadata: Dict = Field(default={})
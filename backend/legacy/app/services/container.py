@@ -0,0 +1,177 @@
+"""
+应用级服务容器
+
+整个进程只创建一份 RAGService（embedding 模型、Mongo 客户端、向量库连接）和 DouBaoService，
+由 main.py 的 lifespan 创建并挂到 app.state.services，路由通过 Depends(get_rag_service) 等获取。
+
+服务在第一次使用时才导入和创建（langchain / torch 等依赖较重），
+warm_up() 在启动后于后台线程中加载模型、连接各存储并各做一次最小请求，
+完成后 /readyz 才返回 200；各步骤耗时记录在 startup_report 中。
+预热成功后启动异步入库任务的 worker（见 rag_service.ingest_jobs）。
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from fastapi import Request
+from rag_service import executors, retrieval_cache
+from rag_service.ingest_jobs import IngestWorkerPool
+from rag_service.metrics import gauge
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PING_TIMEOUT = 5  # 预热时检查存储连通性的超时（秒）
+
+STARTUP_SECONDS = gauge("app_startup_seconds", "启动预热各步骤耗时（秒）", ["step"])
+SERVICE_READY = gauge("app_ready", "服务是否已完成预热（1 为就绪）")
+
+
+class ServiceContainer:
+    def __init__(self):
+        executors.configure(
+            embedding_workers=settings.EMBEDDING_WORKERS or None,
+            vector_store_workers=settings.VECTOR_STORE_WORKERS,
+            ingest_share=settings.INGEST_SHARE,
+            max_queue=settings.EXECUTOR_MAX_QUEUE,
+            ingest_max_queue=settings.INGEST_MAX_QUEUE
+        )
+        retrieval_cache.configure(
+            enabled=settings.RETRIEVAL_CACHE_ENABLED,
+            maxbytes=settings.RETRIEVAL_CACHE_MAX_BYTES,
+            ttl=settings.RETRIEVAL_CACHE_TTL
+        )
+        self._lock = threading.Lock()
+        self._rag = None
+        self._doubao = None
+        self.ingest_pool: Optional[IngestWorkerPool] = None
+        self.ready = False
+        self.warmed_up = threading.Event()  # 预热结束（无论成功与否）
+        self.error: Optional[str] = None
+        self.startup_report: Dict[str, float] = {}
+
+    @property
+    def rag(self):
+        if self._rag is None:
+            with self._lock:
+                if self._rag is None:
+                    from .rag import RAGService
+                    self._rag = RAGService()
+        return self._rag
+
+    @rag.setter
+    def rag(self, service):
+        # 与 getter 的创建互斥：后台预热正在创建服务时，等它完成后再替换，注入的服务不会被覆盖
+        with self._lock:
+            self._rag = service
+
+    @property
+    def doubao(self):
+        if self._doubao is None:
+            with self._lock:
+                if self._doubao is None:
+                    from .doubao import DouBaoService
+                    self._doubao = DouBaoService()
+        return self._doubao
+
+    @doubao.setter
+    def doubao(self, service):
+        with self._lock:
+            self._doubao = service
+
+    def _step(self, name: str, func):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        self.startup_report[name] = elapsed
+        STARTUP_SECONDS.labels(step=name).set(elapsed)
+        return result
+
+    @staticmethod
+    def _ping_mongo(client):
+        import pymongo
+
+        with pymongo.timeout(PING_TIMEOUT):
+            client.admin.command("ping")
+
+    def warm_up(self):
+        """
+        创建服务并预热：加载 embedding 模型并计算一次向量、ping MongoDB、对向量库做一次检索
+
+        失败时记录错误，/readyz 保持 503，进程本身不退出（liveness 不受影响）。
+        服务通过 rag / doubao 属性获取，已经创建或注入的服务不会被替换；结束后设置 warmed_up。
+        """
+        started = time.perf_counter()
+        try:
+            rag = self._step("create_services", lambda: (self.rag, self.doubao)[0])
+            embedding = self._step("embedding_model", lambda: rag.embeddings.embed_query("预热"))
+            self._step("mongodb", lambda: self._ping_mongo(rag.mongo_client))
+            self._step("vector_store", lambda: rag.vector_store.similarity_search_by_vector(embedding, k=1))
+            self.ready = True
+            SERVICE_READY.set(1)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            logger.warning("服务预热失败: %s", self.error)
+        self.startup_report["total"] = time.perf_counter() - started
+        logger.info("启动预热%s，各步骤耗时(秒): %s", "完成" if self.ready else "失败", {
+            name: round(seconds, 3) for name, seconds in self.startup_report.items()
+        })
+        self.warmed_up.set()
+
+    async def start_ingest_workers(self, warm_up: asyncio.Future):
+        """预热完成后启动入库 worker（预热失败时不启动，任务留在队列中）"""
+        await warm_up
+        if not self.ready:
+            return
+        self.ingest_pool = IngestWorkerPool(
+            self.rag.ingest_jobs,
+            self.rag.ingest_handlers(),
+            workers=settings.INGEST_JOB_WORKERS,
+            batch_size=settings.INGEST_JOB_BATCH_SIZE,
+            poll_interval=settings.INGEST_JOB_POLL_INTERVAL
+        )
+        self.ingest_pool.start()
+
+    async def stop_ingest_workers(self):
+        if self.ingest_pool is not None:
+            await self.ingest_pool.stop()
+
+    def submit_ingest_job(self, kind: str, payload: Dict, owner: Optional[str] = None) -> str:
+        """提交入库任务并唤醒本进程的 worker，返回任务ID"""
+        job_id = self.rag.ingest_jobs.create(kind, payload, owner=owner)
+        if self.ingest_pool is not None:
+            self.ingest_pool.notify()
+        return job_id
+
+    def close(self):
+        executors.shutdown(wait=False)
+        if self._rag is not None:
+            self._rag.mongo_client.close()
+
+    def status(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "startup_seconds": self.startup_report,
+            "executors": {
+                name: executors.get_executor(name).stats()
+                for name in (executors.EMBEDDING_POOL, executors.VECTOR_STORE_POOL)
+            },
+            "retrieval_cache": retrieval_cache.get_retrieval_cache().stats(),
+            "ingest_jobs": self.ingest_pool.stats() if self.ingest_pool is not None else None,
+        }
+
+
+def get_services(request: Request) -> ServiceContainer:
+    return request.app.state.services
+
+
+def get_rag_service(request: Request):
+    return get_services(request).rag
+
+
+def get_doubao_service(request: Request):
+    return get_services(request).doubao
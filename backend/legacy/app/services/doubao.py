@@ -1,8 +1,11 @@
 import json
 import requests
 from typing import Dict, Any
+from rag_service.metrics import counter, observe_stage
 from ..core.config import settings
 
+LLM_TOKENS = counter("llm_tokens_total", "大模型调用消耗的 token 数", ["model", "kind"])
+
 class DouBaoService:    
     def __init__(self):
         self.api_url = "https://maas-api.ml-platform-cn-beijing.volces.com/v1/chat"
@@ -30,16 +33,21 @@ class DouBaoService:
                 "top_p": 0.8,
                 "stream": False
             }
-            response = requests.post(  
-                self.api_url,  
-                headers=self.headers,  
-                json=payload  
-            )  
+            with observe_stage("llm"):
+                response = requests.post(  
+                    self.api_url,  
+                    headers=self.headers,  
+                    json=payload  
+                )  
 
-            if response.status_code!=200:
-                raise Exception(f"API调用失败:{response.text}")
+                if response.status_code!=200:
+                    raise Exception(f"API调用失败:{response.text}")
             
-            return response.json()
+            result = response.json()
+            usage = result.get("usage") or {}
+            LLM_TOKENS.labels(model=payload["model"], kind="prompt").inc(usage.get("prompt_tokens", 0))
+            LLM_TOKENS.labels(model=payload["model"], kind="completion").inc(usage.get("completion_tokens", 0))
+            return result
 
             
         except Exception as e:
@@ -1,11 +1,21 @@
 
-from typing import List, Dict
-from langchain.vectorstores import Milvus
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.document_loaders import TextLoader
+import time
+import uuid
+from typing import AsyncIterator, Callable, List, Dict, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
 from pymongo import MongoClient
+from rag_service.executors import INGEST, QUERY, run_embedding, run_vector_store
+from rag_service.filters import chunk_fields, restore_fields
+from rag_service.ingest_jobs import IngestJobStore
+from rag_service.mmr import mmr_search, scored_search
+from rag_service.metrics import observe_stage
+from rag_service.retrieval_cache import get_retrieval_cache
+from rag_service.splitter import ChineseTextSplitter
 from ..core.config import settings
+from rag_service.vectorstore import get_chunks, write_vectors
+from .vector_store import create_embedding_model, create_vector_store, filter_kwargs, missing_filter_fields
 
 class RAGService:
     def __init__(self):
@@ -14,64 +24,459 @@ class RAGService:
         self.db = self.mongo_client[settings.MONGODB_DB]
         
         # 初始化向量数据库
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="shibing624/text2vec-base-chinese"
-        )
-        self.vector_store = Milvus(
-            embedding_function=self.embeddings,
-            connection_args={
-                "host": settings.MILVUS_HOST,
-                "port": settings.MILVUS_PORT
-            },
-            collection_name="knowledge_base"
+        self.embeddings = create_embedding_model()
+        self.collection_name = "knowledge_base"
+        self.vector_store = create_vector_store(self.embeddings, self.collection_name)
+        
+        # 检索结果缓存，写入后按 collection 名递增代数使旧结果失效
+        self.retrieval_cache = get_retrieval_cache()
+        
+        # 异步入库任务（/knowledge/create、/knowledge/{doc_id} 更新内容时提交，由后台 worker 执行）
+        self.ingest_jobs = IngestJobStore(
+            self.db.ingest_jobs,
+            lease=settings.INGEST_JOB_LEASE,
+            max_attempts=settings.INGEST_JOB_MAX_ATTEMPTS,
+            retention=settings.INGEST_JOB_RETENTION
         )
         
-    async def add_knowledge(self, content: str, metadata: Dict) -> str:
+    def ingest_handlers(self) -> Dict:
+        """入库任务类型 → 处理函数（见 rag_service.ingest_jobs.IngestWorkerPool）"""
+        return {
+            "knowledge.create": self._run_create_job,
+            "knowledge.update": self._run_update_job,
+        }
+    
+    async def _run_create_job(self, payload: Dict, progress: Callable[[int, int], None]) -> Dict:
+        doc_id = await self.add_knowledge(payload["content"], payload["metadata"], progress=progress)
+        return {"doc_id": doc_id}
+    
+    async def _run_update_job(self, payload: Dict, progress: Callable[[int, int], None]) -> Dict:
+        doc_id = payload["doc_id"]
+        if not await self.update_document(doc_id, payload["update"]):
+            raise ValueError(f"文档 {doc_id} 不存在")
+        # 分块元数据中带有标题/类别/标签等过滤字段，只改元数据也要重写分块
+        await self.update_vectors(doc_id, progress=progress)
+        return {"doc_id": doc_id}
+        
+    async def add_knowledge(
+        self,
+        content: str,
+        metadata: Dict,
+        progress: Optional[Callable[[int, int], None]] = None
+    ) -> str:
         """
         添加新的知识到知识库
         
         Args:
             content: 知识内容
             metadata: 元数据
+            progress: 进度回调 (已写入分块数, 分块总数)，每写入 INGEST_EMBED_BATCH 个分块调用一次
         
         Returns:
             str: 文档ID
         """
         # 分割文本
-        text_splitter = CharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
-        texts = text_splitter.split_text(content)
+        with observe_stage("split"):
+            texts = self._split(content)
         
-        # 存储到向量数据库
-        self.vector_store.add_texts(texts, metadatas=[metadata] * len(texts))
+        # 存储到向量数据库（embed_documents 与 milvus_insert 分别统计）
+        # 每个分块带上 category / tags / doc_type / kb_id 标量字段，检索时过滤条件下推到向量库
+        doc_id = ObjectId()
+        vector_ids = await self._write_chunks(texts, self._chunk_metadata(doc_id, metadata), progress)
+        self.retrieval_cache.bump(self.collection_name)
         
-        # 存储原始文档到MongoDB
-        doc_id = self.db.documents.insert_one({
-            "content": content,
-            "metadata": metadata
-        }).inserted_id
+        # 存储原始文档到MongoDB（vector_ids 用于更新/删除时找到文档的分块）
+        with observe_stage("mongo_insert"):
+            self.db.documents.insert_one({
+                "_id": doc_id,
+                "content": content,
+                "metadata": metadata,
+                "vector_ids": vector_ids
+            })
         
         return str(doc_id)
     
-    async def search_similar(self, query: str, k: int = 3) -> List[Dict]:
+    @staticmethod
+    def _chunk_metadata(doc_id: ObjectId, metadata: Dict) -> Dict:
+        return {**metadata, **chunk_fields(metadata), "doc_id": str(doc_id)}
+    
+    async def _write_chunks(
+        self,
+        texts: List[str],
+        metadata: Dict,
+        progress: Optional[Callable[[int, int], None]] = None
+    ) -> List:
+        """
+        按 INGEST_EMBED_BATCH 个分块一批在 embedding 线程池中计算向量，每批之后上报进度（入库任务的 embedded / total），
+        全部计算完后作为一个任务提交到向量库线程池写入，返回分块的向量ID
+        
+        写入在所有 embedding 完成之后：排队已满（ExecutorBusy）只会发生在写入任何分块之前，
+        入库任务放回队列重试时不会重复写入分块。
+        """
+        if progress:
+            progress(0, len(texts))
+        vectors = []
+        batch_size = settings.INGEST_EMBED_BATCH
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            vectors.extend(await run_embedding(INGEST, self.embeddings.embed_documents, batch))
+            if progress:
+                progress(start + len(batch), len(texts))
+        if not texts:
+            return []
+        with observe_stage("milvus_insert"):
+            return await run_vector_store(INGEST, self._write_vectors, texts, vectors, metadata)
+    
+    def _write_vectors(self, texts: List[str], vectors: List[List[float]], metadata: Dict) -> List:
+        """在向量库线程池中执行：按 INGEST_EMBED_BATCH 个分块一批写入已计算好的向量"""
+        vector_ids = []
+        batch_size = settings.INGEST_EMBED_BATCH
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            vector_ids.extend(write_vectors(
+                self.vector_store,
+                [uuid.uuid4().hex for _ in batch],
+                np.asarray(vectors[start:start + batch_size], dtype=np.float32),
+                batch,
+                [metadata] * len(batch)
+            ))
+        return vector_ids
+    
+    async def _replace_chunks(
+        self,
+        texts: List[str],
+        metadata: Dict,
+        old_ids: List,
+        progress: Optional[Callable[[int, int], None]] = None
+    ) -> List:
+        """先写入新分块再删除旧分块（更新期间检索不会查不到该文档），返回新分块的向量ID"""
+        vector_ids = await self._write_chunks(texts, metadata, progress)
+        if old_ids:
+            with observe_stage("milvus_delete"):
+                await run_vector_store(INGEST, self.vector_store.delete, list(old_ids))
+        return vector_ids
+    
+    @staticmethod
+    def _split(content: str) -> List[str]:
+        return ChineseTextSplitter(chunk_size=1000, chunk_overlap=200).split_text(content)
+    
+    async def bulk_add_knowledge(
+        self,
+        documents: AsyncIterator[Tuple[int, Optional[str], Optional[Dict], Optional[str]]]
+    ) -> AsyncIterator[Dict]:
+        """
+        批量添加知识（/knowledge/bulk），边读边写
+        
+        文档切分后攒到 BULK_EMBED_BATCH 个分块（或 BULK_MAX_DOCS 篇文档）为一批：
+        一次 embed_documents 计算整批向量，一次批量写入向量库，一次 insert_many 写入 MongoDB，
+        而不是每篇文档各一次 embedding 调用、向量库写入和 Mongo 写入。
+        
+        Args:
+            documents: 异步迭代 (行号, 内容, 元数据, 错误)，错误不为空的行不写入，直接返回错误
+        
+        Yields:
+            Dict: 每行的结果 {"line", "ok": True, "doc_id", "chunks"} 或 {"line", "ok": False, "error"}，
+            错误行立即返回、写入的行在所在批次完成后返回（不保证按行号顺序）；
+            最后一条为汇总 {"done": True, "documents", "failed", "chunks", "seconds"}
+        """
+        started = time.perf_counter()
+        totals = {"documents": 0, "failed": 0, "chunks": 0}
+        batch, batch_chunks = [], 0
+        
+        async def flush():
+            results = await self._add_knowledge_batch(batch)
+            for result in results:
+                if result["ok"]:
+                    totals["documents"] += 1
+                    totals["chunks"] += result["chunks"]
+                else:
+                    totals["failed"] += 1
+            return results
+        
+        async for line, content, metadata, error in documents:
+            if error is not None:
+                totals["failed"] += 1
+                yield {"line": line, "ok": False, "error": error}
+                continue
+            with observe_stage("split"):
+                texts = self._split(content)
+            batch.append((line, content, metadata, texts))
+            batch_chunks += len(texts)
+            if batch_chunks >= settings.BULK_EMBED_BATCH or len(batch) >= settings.BULK_MAX_DOCS:
+                for result in await flush():
+                    yield result
+                batch, batch_chunks = [], 0
+        if batch:
+            for result in await flush():
+                yield result
+        yield {"done": True, **totals, "seconds": round(time.perf_counter() - started, 3)}
+    
+    async def _add_knowledge_batch(self, batch: List[Tuple[int, str, Dict, List[str]]]) -> List[Dict]:
+        """写入一批已切分的文档，整批成功或整批失败（失败时每行返回同一个错误）"""
+        texts, metadatas = [], []
+        doc_ids = [ObjectId() for _ in batch]
+        for doc_id, (_, _, metadata, chunks) in zip(doc_ids, batch):
+            texts.extend(chunks)
+            metadatas.extend([self._chunk_metadata(doc_id, metadata)] * len(chunks))
+        
+        try:
+            vector_ids = []
+            if texts:
+                vectors = await run_embedding(INGEST, self.embeddings.embed_documents, texts)
+                with observe_stage("milvus_insert"):
+                    vector_ids = await run_vector_store(
+                        INGEST, write_vectors, self.vector_store,
+                        [uuid.uuid4().hex for _ in texts], np.asarray(vectors, dtype=np.float32), texts, metadatas
+                    )
+                self.retrieval_cache.bump(self.collection_name)
+            records, start = [], 0
+            for doc_id, (_, content, metadata, chunks) in zip(doc_ids, batch):
+                records.append({
+                    "_id": doc_id, "content": content, "metadata": metadata,
+                    "vector_ids": list(vector_ids[start:start + len(chunks)])
+                })
+                start += len(chunks)
+            with observe_stage("mongo_insert"):
+                self.db.documents.insert_many(records)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            return [{"line": line, "ok": False, "error": error} for line, _, _, _ in batch]
+        
+        return [
+            {"line": line, "ok": True, "doc_id": str(doc_id), "chunks": len(chunks)}
+            for doc_id, (line, _, _, chunks) in zip(doc_ids, batch)
+        ]
+    
+    @staticmethod
+    def _object_id(doc_id: str) -> Optional[ObjectId]:
+        return ObjectId(doc_id) if ObjectId.is_valid(doc_id) else None
+    
+    @staticmethod
+    def _document_to_dict(doc: Dict) -> Dict:
+        """Mongo 文档记录 → KnowledgeBase 结构（标题、类别、标签保存在 metadata 中）"""
+        metadata = doc.get("metadata") or {}
+        result = {
+            "_id": str(doc["_id"]),
+            "title": metadata.get("title", ""),
+            "content": doc.get("content", ""),
+            "category": metadata.get("category", ""),
+            "tags": metadata.get("tags") or [],
+            "metadata": metadata
+        }
+        for name in ("created_at", "updated_at"):
+            if metadata.get(name):
+                result[name] = metadata[name]
+        return result
+    
+    async def get_document(self, doc_id: str) -> Optional[Dict]:
+        """
+        获取文档
+        
+        Returns:
+            Optional[Dict]: KnowledgeBase 结构，文档不存在（或ID无效）时为 None
+        """
+        oid = self._object_id(doc_id)
+        if oid is None:
+            return None
+        with observe_stage("mongo_find_doc"):
+            doc = self.db.documents.find_one({"_id": oid}, {"vector_ids": 0})
+        return self._document_to_dict(doc) if doc else None
+    
+    async def list_documents(self, query: Dict, skip: int = 0, limit: int = 10) -> Tuple[List[Dict], int]:
+        """
+        按条件分页列出文档（新的在前）
+        
+        Returns:
+            (docs, total): 当前页的文档和满足条件的总数
+        """
+        with observe_stage("mongo_find_doc"):
+            docs = self.db.documents.find(query, {"vector_ids": 0}).sort("_id", -1).skip(skip).limit(limit)
+            results = [self._document_to_dict(doc) for doc in docs]
+            total = self.db.documents.count_documents(query)
+        return results, total
+    
+    async def update_document(self, doc_id: str, update: Dict) -> bool:
+        """
+        更新文档记录（不改动向量，分块由 update_vectors 重写）
+        
+        Args:
+            doc_id: 文档ID
+            update: KnowledgeUpdate 中给出的字段（content / title / category / tags / metadata），
+                以及 "metadata.<字段>" 形式的附加元数据；除 content 外都写入文档的 metadata
+        
+        Returns:
+            bool: 文档是否存在
+        """
+        oid = self._object_id(doc_id)
+        if oid is None:
+            return False
+        fields = {}
+        for key, value in update.items():
+            if value is None:
+                continue
+            if key == "content":
+                fields["content"] = value
+            elif key == "metadata":
+                fields.update({f"metadata.{name}": item for name, item in value.items()})
+            elif key.startswith("metadata."):
+                fields[key] = value
+            else:
+                fields[f"metadata.{key}"] = value
+        with observe_stage("mongo_update"):
+            if not fields:
+                return self.db.documents.count_documents({"_id": oid}, limit=1) > 0
+            return self.db.documents.update_one({"_id": oid}, {"$set": fields}).matched_count > 0
+    
+    async def update_vectors(self, doc_id: str, progress: Optional[Callable[[int, int], None]] = None) -> bool:
+        """
+        按文档记录当前的内容和元数据重写它的分块：写入新分块后删除旧分块（文档记录中的 vector_ids）
+        
+        Args:
+            doc_id: 文档ID
+            progress: 进度回调 (已写入分块数, 分块总数)
+        
+        Returns:
+            bool: 文档是否存在
+        """
+        oid = self._object_id(doc_id)
+        if oid is None:
+            return False
+        with observe_stage("mongo_find_doc"):
+            doc = self.db.documents.find_one({"_id": oid})
+        if not doc:
+            return False
+        
+        with observe_stage("split"):
+            texts = self._split(doc["content"])
+        vector_ids = await self._replace_chunks(
+            texts, self._chunk_metadata(oid, doc.get("metadata") or {}), doc.get("vector_ids") or [], progress
+        )
+        with observe_stage("mongo_update"):
+            self.db.documents.update_one({"_id": oid}, {"$set": {"vector_ids": vector_ids}})
+        self.retrieval_cache.bump(self.collection_name)
+        return True
+    
+    async def delete_document(self, doc_id: str) -> bool:
+        """
+        删除文档及其分块
+        
+        Returns:
+            bool: 文档是否存在
+        """
+        oid = self._object_id(doc_id)
+        if oid is None:
+            return False
+        with observe_stage("mongo_find_doc"):
+            doc = self.db.documents.find_one({"_id": oid}, {"vector_ids": 1})
+        if not doc:
+            return False
+        if doc.get("vector_ids"):
+            with observe_stage("milvus_delete"):
+                await run_vector_store(INGEST, self.vector_store.delete, list(doc["vector_ids"]))
+            self.retrieval_cache.bump(self.collection_name)
+        with observe_stage("mongo_delete"):
+            self.db.documents.delete_one({"_id": oid})
+        return True
+    
+    async def search_similar(
+        self,
+        query: str,
+        k: int = 3,
+        filters: Optional[Dict] = None,
+        mmr: bool = False,
+        mmr_lambda: float = 0.5,
+        fetch_k: Optional[int] = None,
+        score_threshold: Optional[float] = None
+    ) -> List[Dict]:
         """
         搜索相似文档
         
         Args:
             query: 查询文本
             k: 返回结果数量
+            filters: 过滤条件（rag_service.filters.build_filters），下推到向量库，只在满足条件的分块中检索
+            mmr: 是否用 MMR 从 fetch_k 个候选中选出互不重复的 k 个结果
+            mmr_lambda: MMR 相关性权重
+            fetch_k: MMR 候选数量，默认 4 * k
+            score_threshold: 剔除与查询余弦相似度低于该值的结果（是否使用 MMR 含义相同）
             
         Returns:
-            List[Dict]: 相似文档列表
+            List[Dict]: 相似文档列表（可能来自检索缓存，不要原地修改）
         """
-        docs = self.vector_store.similarity_search(query, k=k)
-        return [
-            {
-                "content": doc.page_content,
-                "metadata": doc.metadata
-            }
-            for doc in docs
-        ]
+        # 相同的查询和参数在知识库没有写入时直接返回缓存的结果，省掉 embedding 和向量检索
+        cache_key = self.retrieval_cache.key(
+            self.collection_name, query,
+            k=k, filters=filters, mmr=mmr, mmr_lambda=mmr_lambda, fetch_k=fetch_k, score_threshold=score_threshold
+        )
+        cached = self.retrieval_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+        
+        # 旧 collection 没有过滤条件用到的字段，其中没有满足条件的分块
+        if missing_filter_fields(self.vector_store, filters):
+            return []
+        
+        # 先单独计算查询向量，便于区分 embedding 和 Milvus 检索的耗时
+        # 两者都是阻塞调用，分别放到 embedding / 向量库线程池中执行
+        embedding = await run_embedding(QUERY, self.embeddings.embed_query, query)
+        with observe_stage("milvus_search"):
+            if mmr:
+                hits = await run_vector_store(
+                    QUERY,
+                    mmr_search,
+                    self.vector_store,
+                    embedding,
+                    k=k,
+                    fetch_k=fetch_k or 4 * k,
+                    lambda_mult=mmr_lambda,
+                    score_threshold=score_threshold,
+                    **filter_kwargs(self.vector_store, filters)
+                )
+                docs = [doc for doc, _ in hits]
+            elif score_threshold is not None:
+                # 向量库返回的分数随后端而变（Milvus 默认为 L2 距离），换算成余弦相似度后剔除
+                hits = await run_vector_store(
+                    QUERY,
+                    scored_search,
+                    self.vector_store,
+                    embedding,
+                    k=k,
+                    score_threshold=score_threshold,
+                    **filter_kwargs(self.vector_store, filters)
+                )
+                docs = [doc for doc, _ in hits]
+            else:
+                docs = await run_vector_store(
+                    QUERY,
+                    self.vector_store.similarity_search_by_vector,
+                    embedding,
+                    k=k,
+                    **filter_kwargs(self.vector_store, filters)
+                )
+        results = [self._chunk_to_dict(doc) for doc in docs]
+        self.retrieval_cache.set(cache_key, results)
+        return list(results)
+    
+    async def get_chunks(self, chunk_ids: List[str]) -> List[Dict]:
+        """
+        按分块ID（检索结果中的 chunk_id）取分块全文
+        
+        Args:
+            chunk_ids: 分块ID列表
+            
+        Returns:
+            List[Dict]: 找到的分块，结构与 search_similar 的结果相同
+        """
+        with observe_stage("milvus_query"):
+            docs = await run_vector_store(QUERY, get_chunks, self.vector_store, chunk_ids)
+        return [self._chunk_to_dict(doc) for doc in docs]
+    
+    @staticmethod
+    def _chunk_to_dict(doc) -> Dict:
+        metadata = restore_fields(doc.metadata)
+        return {
+            "chunk_id": str(metadata.get("pk")),
+            "content": doc.page_content,
+            "metadata": metadata
+        }
 
@@ -1,24 +1,43 @@
 
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 from datetime import datetime
-from uuid import UUID
-from langchain.vectorstores import Milvus
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.document_loaders import TextLoader
-from pymongo import MongoClient
-from bson import ObjectId
+from uuid import UUID, uuid4
+import logging
+import threading
 
+import numpy as np
+from pymongo import MongoClient, UpdateOne
+from bson import Binary, ObjectId
+
+from rag_service.cache import TTLCache
+from rag_service.dedup import Deduplicator
+from rag_service.executors import INGEST, QUERY, call_embedding, run_embedding, run_vector_store
+from rag_service.filters import build_filters, chunk_fields
+from rag_service.mmr import mmr_search, scored_search
+from rag_service.parent_retrieval import merge_hits, section_text, split_parent_child
+from rag_service.metrics import observe_stage
+from rag_service.retrieval_cache import get_retrieval_cache
+from rag_service.snapshot import (
+    Snapshot, SnapshotError, export_snapshot, insert_records, iter_vectors, restore_vectors
+)
+from rag_service.splitter import ChineseTextSplitter
+from rag_service.vectorstore import write_vectors
+from rag_service.versioning import chunk_hash, expired_versions, is_current_hit
 from ..core.config import settings
 from ..core.security import get_password_hash
 from ..models.schemas import (
-    KnowledgeBase,
-    KnowledgeDocument,
+    KnowledgeBaseCreate,
     DocumentCreate,
     DocumentUpdate,
-    SearchQuery,
+    DocumentSearchQuery,
     VectorSearchResult
 )
+from .vector_store import create_embedding_model, create_vector_store, filter_kwargs, missing_filter_fields
+
+logger = logging.getLogger(__name__)
+
+# 权限检查只需要这几个字段；archived_versions（旧版本数）一并缓存，没有旧版本的知识库检索时不必过滤旧版本的分块
+KB_ACL_FIELDS = {"is_public": 1, "owner_id": 1, "access_code": 1, "archived_versions": 1}
 
 '''
 知识库管理：
@@ -32,7 +51,7 @@ from ..models.schemas import (
 创建文档（支持自定义分块大小）
 更新文档（包括内容和元数据）
 删除文档
-文档版本控制
+文档版本控制（写时复制，旧版本与当前版本共用未改动的分块）
 增强的搜索功能：
 
 支持相似度阈值过滤
@@ -61,14 +80,27 @@ class RAGService:
         self.db = self.mongo_client[settings.MONGODB_DB]
         
         # 初始化向量数据库
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="shibing624/text2vec-base-chinese"
-        )
+        self.embeddings = create_embedding_model()
         
-        # 为每个知识库创建独立的collection
+        # 每个知识库的向量存储：per_kb 布局为各自的 collection，
+        # shared 布局（KB_COLLECTION_LAYOUT）下都指向同一个共享 collection，检索时按 kb_id 过滤
         self.vector_stores = {}
+        self._shared_store = None
+        
+        # 每个知识库的近似去重索引，首次使用时从 vector_refs 中的签名重建
+        self.dedup_indexes = {}
+        self._refs_indexed = False
+        
+        # 写入/释放分块在线程池中执行，同一知识库串行（去重索引不是线程安全的）
+        self.kb_locks = {}
+        
+        # 知识库访问控制字段的缓存，省去每次检索前查询 knowledge_bases 的往返
+        self.kb_acl_cache = TTLCache("kb_acl", settings.KB_ACL_CACHE_SIZE, settings.KB_ACL_CACHE_TTL)
         
-    async def init_knowledge_base(self, knowledge_base: KnowledgeBase) -> str:
+        # 检索结果缓存：文档写入/更新/删除后递增知识库的代数，旧结果立即失效
+        self.retrieval_cache = get_retrieval_cache()
+        
+    async def init_knowledge_base(self, knowledge_base: KnowledgeBaseCreate) -> str:
         """
         初始化新的知识库
         
@@ -86,87 +118,592 @@ class RAGService:
             "updated_at": datetime.utcnow(),
             "owner_id": knowledge_base.owner_id,
             "is_public": knowledge_base.is_public,
-            "access_code": get_password_hash(knowledge_base.access_code) if knowledge_base.access_code else None
+            "access_code": get_password_hash(knowledge_base.access_code) if knowledge_base.access_code else None,
+            "collection_layout": settings.KB_COLLECTION_LAYOUT,
+            "archived_versions": 0
         }
         
-        kb_id = str(self.db.knowledge_bases.insert_one(kb_data).inserted_id)
+        with observe_stage("mongo_insert"):
+            kb_id = str(self.db.knowledge_bases.insert_one(kb_data).inserted_id)
+        self.kb_acl_cache.set(kb_id, {key: kb_data[key] for key in KB_ACL_FIELDS})
         
         # 初始化向量存储
-        self.vector_stores[kb_id] = Milvus(
-            embedding_function=self.embeddings,
-            connection_args={
-                "host": settings.MILVUS_HOST,
-                "port": settings.MILVUS_PORT
-            },
-            collection_name=f"kb_{kb_id}"
-        )
+        self.vector_stores[kb_id] = self.open_vector_store(kb_id)
         
         return kb_id
     
-    async def add_document(self, kb_id: str, document: DocumentCreate) -> str:
+    @property
+    def shared_layout(self) -> bool:
+        return settings.KB_COLLECTION_LAYOUT == "shared"
+    
+    def _get_shared_store(self):
+        if self._shared_store is None:
+            self._shared_store = create_vector_store(self.embeddings, settings.SHARED_KB_COLLECTION)
+        return self._shared_store
+    
+    def _get_vector_store(self, kb_id: str):
+        """知识库的向量存储；共享布局下为共享 collection（所有知识库的分块都在其中，读写时按 kb_id 区分）"""
+        if self.shared_layout:
+            return self._get_shared_store()
+        return self.vector_stores.get(kb_id)
+    
+    def open_vector_store(self, kb_id: str):
+        """
+        取知识库的向量存储，本进程还没有打开时按当前布局连接（如命令行工具访问已有的知识库）
+        """
+        if self.shared_layout:
+            return self._get_shared_store()
+        if kb_id not in self.vector_stores:
+            self.vector_stores[kb_id] = create_vector_store(self.embeddings, f"kb_{kb_id}")
+        return self.vector_stores[kb_id]
+    
+    def _tenant_filters(self, kb_id: str, filters: Optional[Dict] = None) -> Dict:
+        """共享布局下在过滤条件中加上 kb_id，只检索/导出该知识库的分块"""
+        if self.shared_layout:
+            return {**(filters or {}), "kb_id": kb_id}
+        return filters or {}
+    
+    def _get_kb_acl(self, kb_id: str) -> Optional[Dict]:
+        """
+        知识库的访问控制字段（is_public / owner_id / access_code），带 TTL 缓存
+        
+        Returns:
+            Optional[Dict]: 知识库不存在时为 None（不缓存）
+        """
+        def load():
+            with observe_stage("mongo_find_kb"):
+                return self.db.knowledge_bases.find_one({"_id": ObjectId(kb_id)}, KB_ACL_FIELDS)
+        
+        return self.kb_acl_cache.get_or_load(kb_id, load)
+    
+    def invalidate_kb_acl(self, kb_id: str):
+        """知识库的可见性/所有者/访问码在别处被修改后调用"""
+        self.kb_acl_cache.invalidate(kb_id)
+    
+    async def update_knowledge_base_access(
+        self,
+        kb_id: str,
+        user_id: str,
+        is_public: Optional[bool] = None,
+        owner_id: Optional[str] = None,
+        access_code: Optional[str] = None
+    ) -> bool:
+        """
+        修改知识库的可见性、所有者或访问码（仅所有者可操作），并使权限缓存失效
+        
+        Args:
+            kb_id: 知识库ID
+            user_id: 操作用户ID
+            is_public: 是否公开
+            owner_id: 新的所有者
+            access_code: 新的访问码
+            
+        Returns:
+            bool: 是否更新成功
+        """
+        # 写操作不走缓存，按数据库中的当前所有者校验
+        with observe_stage("mongo_find_kb"):
+            kb = self.db.knowledge_bases.find_one({"_id": ObjectId(kb_id)}, KB_ACL_FIELDS)
+        if not kb or kb["owner_id"] != user_id:
+            raise ValueError("Access denied")
+        
+        update_fields = {"updated_at": datetime.utcnow()}
+        if is_public is not None:
+            update_fields["is_public"] = is_public
+        if owner_id:
+            update_fields["owner_id"] = owner_id
+        if access_code is not None:
+            update_fields["access_code"] = get_password_hash(access_code) if access_code else None
+        
+        with observe_stage("mongo_update"):
+            result = self.db.knowledge_bases.update_one({"_id": ObjectId(kb_id)}, {"$set": update_fields})
+        self.invalidate_kb_acl(kb_id)
+        return result.modified_count > 0
+    
+    async def add_document(
+        self,
+        kb_id: str,
+        document: DocumentCreate,
+        progress: Optional[Callable[[int, int], None]] = None
+    ) -> str:
         """
         向知识库添加新文档
         
         Args:
             kb_id: 知识库ID
             document: 文档创建信息
+            progress: 进度回调 (已写入分块数, 分块总数)，见 _store_chunks
         
         Returns:
             str: 文档ID
         """
         # 验证知识库存在
-        kb = self.db.knowledge_bases.find_one({"_id": ObjectId(kb_id)})
+        kb = self._get_kb_acl(kb_id)
         if not kb:
             raise ValueError("Knowledge base not found")
         
         # 分割文本
-        text_splitter = CharacterTextSplitter(
-            chunk_size=document.chunk_size or 1000,
-            chunk_overlap=document.chunk_overlap or 200
-        )
-        texts = text_splitter.split_text(document.content)
+        with observe_stage("split"):
+            texts, layout = self._split(document.content, document.chunk_size, document.chunk_overlap)
         
-        # 准备元数据
+        # 准备元数据（category / tags / doc_type / kb_id 同时作为标量过滤字段写入每个分块）
         metadata = {
             "title": document.title,
             "source": document.source,
             "author": document.author,
             "tags": document.tags,
+            "category": getattr(document, "category", None),
+            "doc_type": getattr(document, "doc_type", None),
             "created_at": datetime.utcnow(),
             "kb_id": kb_id
         }
+        metadata.update(chunk_fields(metadata))
         
-        # 存储到向量数据库
-        vector_store = self.vector_stores.get(kb_id)
+        # 存储到向量数据库（近似重复的分块复用已有向量）
+        vector_store = self._get_vector_store(kb_id)
         if not vector_store:
             raise ValueError("Vector store not initialized")
-            
-        vector_ids = vector_store.add_texts(
-            texts=texts,
-            metadatas=[{**metadata, "chunk_index": i} for i in range(len(texts))]
+        
+        doc_oid = ObjectId()
+        vector_rev = str(ObjectId())
+        vector_ids, duplicates = await run_vector_store(
+            INGEST, self._with_kb_lock, kb_id, self._store_chunks,
+            kb_id, str(doc_oid), vector_rev, vector_store, texts, metadata, progress
         )
         
         # 存储原始文档到MongoDB
         doc_data = {
+            "_id": doc_oid,
             "kb_id": kb_id,
             "title": document.title,
             "content": document.content,
             "source": document.source,
             "author": document.author,
             "tags": document.tags,
+            "category": metadata["category"],
+            "doc_type": metadata["doc_type"],
             "vector_ids": vector_ids,
+            "vector_rev": vector_rev,
+            "dedup": {"chunks": len(texts), "duplicates": duplicates},
+            **layout,
+            "version": 1,
             "created_at": metadata["created_at"],
             "updated_at": metadata["created_at"],
             "status": "active"
         }
         
-        doc_id = str(self.db.documents.insert_one(doc_data).inserted_id)
+        with observe_stage("mongo_insert"):
+            doc_id = str(self.db.documents.insert_one(doc_data).inserted_id)
+        self.retrieval_cache.bump(kb_id)
         return doc_id
     
+    @staticmethod
+    def _split(content: str, chunk_size: Optional[int], chunk_overlap: Optional[int]):
+        """
+        切分文档内容
+        
+        PARENT_RETRIEVAL_ENABLED 时 chunk_size 为父章节大小，只有章节内的子分块（CHILD_CHUNK_SIZE）写入向量库，
+        检索时再换成命中分块所在的章节（见 rag_service.parent_retrieval）
+        
+        Returns:
+            (texts, layout): 写入向量库的分块，以及保存到文档记录中的章节边界和分块所属章节（未启用时为 None）
+        """
+        if not settings.PARENT_RETRIEVAL_ENABLED:
+            text_splitter = ChineseTextSplitter(chunk_size=chunk_size or 1000, chunk_overlap=chunk_overlap or 200)
+            return text_splitter.split_text(content), {"sections": None, "chunk_sections": None}
+        sections, texts, chunk_sections = split_parent_child(
+            content,
+            ChineseTextSplitter(chunk_size=chunk_size or settings.PARENT_CHUNK_SIZE, chunk_overlap=0),
+            ChineseTextSplitter(chunk_size=settings.CHILD_CHUNK_SIZE, chunk_overlap=settings.CHILD_CHUNK_OVERLAP)
+        )
+        return texts, {"sections": [list(section) for section in sections], "chunk_sections": chunk_sections}
+    
+    def _with_kb_lock(self, kb_id: str, fn, *args, **kwargs):
+        with self.kb_locks.setdefault(kb_id, threading.Lock()):
+            return fn(*args, **kwargs)
+    
+    def _dedup_index(self, kb_id: str) -> Deduplicator:
+        """知识库的去重索引（懒加载：用 vector_refs 中保存的签名重建）"""
+        dedup = self.dedup_indexes.get(kb_id)
+        if dedup is None:
+            dedup = Deduplicator(settings.DEDUP_THRESHOLD)
+            with observe_stage("mongo_find_refs"):
+                for ref in self.db.vector_refs.find({"kb_id": kb_id, "signature": {"$exists": True}}, {"signature": 1}):
+                    dedup.add(ref["_id"], np.frombuffer(ref["signature"], dtype=np.uint32))
+            self.dedup_indexes[kb_id] = dedup
+        return dedup
+    
+    def _find_by_hash(self, kb_id: str, hashes: List[str]) -> Dict[str, object]:
+        """内容哈希 → 已有向量ID（按内容寻址复用分块）"""
+        if not self._refs_indexed:
+            self.db.vector_refs.create_index([("kb_id", 1), ("hash", 1)])
+            self._refs_indexed = True
+        with observe_stage("mongo_find_refs"):
+            return {
+                ref["hash"]: ref["_id"]
+                for ref in self.db.vector_refs.find({"kb_id": kb_id, "hash": {"$in": list(set(hashes))}}, {"hash": 1})
+            }
+    
+    def _store_chunks(
+        self,
+        kb_id: str,
+        doc_id: str,
+        vector_rev: str,
+        vector_store,
+        texts: List[str],
+        metadata: Dict,
+        progress: Optional[Callable[[int, int], None]] = None
+    ):
+        """
+        写入文档分块，内容相同或近似重复的分块（包括同一文档内的重复）只保留一个规范向量
+        
+        分块先按内容哈希查找已有向量（同一文档的旧版本或其他文档中完全相同的分块，见 rag_service.versioning），
+        未命中且开启近似去重时再按 MinHash 查找近似重复，都没有时才计算 embedding 写入。
+        每个规范向量在 vector_refs 中有一条记录：内容哈希、签名和引用它的 (文档, 本次写入的版本, 分块序号) 列表，
+        删除/更新文档、清理旧版本时按引用计数释放向量（见 _release_vectors）。
+        
+        新分块按 INGEST_EMBED_BATCH 个一批计算 embedding 并写入，每批之后调用 progress(已写入, 总数)；
+        复用已有向量的重复分块不需要计算，直接计入已写入。
+        
+        Returns:
+            (vector_ids, duplicates): 每个分块对应的向量ID（重复分块为规范向量的ID），重复分块数
+        """
+        hashes = [chunk_hash(text) for text in texts]
+        existing = self._find_by_hash(kb_id, hashes)
+        dedup = self._dedup_index(kb_id) if settings.DEDUP_ENABLED else None
+        keys, new_chunks, signatures, new_keys = [], [], {}, {}
+        with observe_stage("dedup"):
+            for i, (text, content_hash) in enumerate(zip(texts, hashes)):
+                canonical = existing.get(content_hash)
+                if canonical is None and dedup is not None:
+                    canonical, signature = dedup.check(text)
+                if canonical is None:
+                    canonical = ("pending", doc_id, i)
+                    existing[content_hash] = canonical
+                    new_keys[canonical] = content_hash
+                    if dedup is not None:
+                        dedup.add(canonical, signature)
+                        signatures[canonical] = signature
+                    new_chunks.append(i)
+                keys.append(canonical)
+        
+        try:
+            new_ids = self._add_chunk_batches(
+                vector_store, texts, new_chunks, metadata, doc_id, progress, len(texts) - len(new_chunks), len(texts)
+            )
+        except Exception:
+            for key in signatures:
+                dedup.remove(key)
+            raise
+        
+        resolved = {}
+        for i, vector_id in zip(new_chunks, new_ids):
+            resolved[("pending", doc_id, i)] = vector_id
+            if dedup is not None:
+                dedup.rename(("pending", doc_id, i), vector_id)
+        vector_ids = [resolved.get(key, key) for key in keys]
+        
+        # 登记引用：新向量插入内容哈希和签名，已有向量追加引用
+        refs = {}
+        for i, (key, vector_id) in enumerate(zip(keys, vector_ids)):
+            refs.setdefault((key, vector_id), []).append({"doc_id": doc_id, "rev": vector_rev, "chunk_index": i})
+        operations = []
+        for (key, vector_id), entries in refs.items():
+            update = {"$push": {"refs": {"$each": entries}}}
+            if key in new_keys:
+                update["$setOnInsert"] = {"kb_id": kb_id, "hash": new_keys[key]}
+                if key in signatures:
+                    update["$setOnInsert"]["signature"] = Binary(signatures[key].tobytes())
+            operations.append(UpdateOne({"_id": vector_id}, update, upsert=key in new_keys))
+        if operations:
+            with observe_stage("mongo_update_refs"):
+                self.db.vector_refs.bulk_write(operations, ordered=False)
+        
+        duplicates = len(texts) - len(new_chunks)
+        logger.info("文档 %s 分块 %d 个，其中复用已有向量 %d 个", doc_id, len(texts), duplicates)
+        return vector_ids, duplicates
+    
+    def _add_chunk_batches(
+        self,
+        vector_store,
+        texts: List[str],
+        indexes: List[int],
+        metadata: Dict,
+        doc_id: str,
+        progress: Optional[Callable[[int, int], None]],
+        done: int,
+        total: int
+    ) -> List:
+        """
+        按 INGEST_EMBED_BATCH 个一批写入 texts 中序号为 indexes 的分块，返回向量ID
+        
+        在向量库线程池中执行（持有知识库写入锁）：每批先在 embedding 线程池中计算向量，再写入已计算好的向量。
+        """
+        if progress:
+            progress(done, total)
+        vector_ids = []
+        batch_size = settings.INGEST_EMBED_BATCH
+        for start in range(0, len(indexes), batch_size):
+            batch = indexes[start:start + batch_size]
+            batch_texts = [texts[i] for i in batch]
+            vectors = call_embedding(INGEST, self.embeddings.embed_documents, batch_texts)
+            with observe_stage("milvus_insert"):
+                vector_ids.extend(write_vectors(
+                    vector_store,
+                    [uuid4().hex for _ in batch],
+                    np.asarray(vectors, dtype=np.float32),
+                    batch_texts,
+                    [{**metadata, "doc_id": doc_id, "chunk_index": i} for i in batch]
+                ))
+            if progress:
+                progress(done + start + len(batch), total)
+        return vector_ids
+    
+    def _release_vectors(self, kb_id: str, doc_id: str, vector_ids: List, vector_rev: Optional[str], vector_store):
+        """
+        释放文档某次写入的分块引用，删除已无引用的向量
+        
+        没有 vector_refs 记录的向量（去重功能上线前写入的）视为该文档独占，直接删除。
+        """
+        ids = list(dict.fromkeys(vector_ids))
+        if not ids:
+            return
+        ref_filter = {"doc_id": doc_id, "rev": vector_rev} if vector_rev else {"doc_id": doc_id}
+        with observe_stage("mongo_update_refs"):
+            self.db.vector_refs.update_many({"_id": {"$in": ids}}, {"$pull": {"refs": ref_filter}})
+            shared = {
+                ref["_id"] for ref in self.db.vector_refs.find(
+                    {"_id": {"$in": ids}, "refs.0": {"$exists": True}}, {"_id": 1}
+                )
+            }
+        orphans = [vector_id for vector_id in ids if vector_id not in shared]
+        if not orphans:
+            return
+        if vector_store:
+            with observe_stage("milvus_delete"):
+                vector_store.delete(orphans)
+        with observe_stage("mongo_delete"):
+            self.db.vector_refs.delete_many({"_id": {"$in": orphans}})
+        dedup = self.dedup_indexes.get(kb_id)
+        if dedup is not None:
+            for vector_id in orphans:
+                dedup.remove(vector_id)
+    
+    def dedup_stats(self, kb_id: str) -> Dict:
+        """知识库累计的分块数、近似重复分块数和去重比例"""
+        with observe_stage("mongo_aggregate"):
+            totals = list(self.db.documents.aggregate([
+                {"$match": {"kb_id": kb_id, "dedup": {"$exists": True}}},
+                {"$group": {
+                    "_id": None,
+                    "chunks": {"$sum": "$dedup.chunks"},
+                    "duplicates": {"$sum": "$dedup.duplicates"},
+                }},
+            ]))
+        chunks = totals[0]["chunks"] if totals else 0
+        duplicates = totals[0]["duplicates"] if totals else 0
+        return {
+            "chunks": chunks,
+            "duplicates": duplicates,
+            "dedup_ratio": duplicates / chunks if chunks else 0.0,
+        }
+    
+    async def export_knowledge_base(self, kb_id: str, directory: str, float16: bool = False) -> Dict:
+        """
+        导出知识库快照（向量、分块、知识库/文档/向量引用记录），见 rag_service.snapshot
+        
+        导出期间持有知识库的写入锁，快照与 Mongo 记录一致。
+        
+        Args:
+            kb_id: 知识库ID
+            directory: 快照目录（不能已存在）
+            float16: 向量以 float16 保存
+            
+        Returns:
+            Dict: 快照的 manifest
+        """
+        kb = self.db.knowledge_bases.find_one({"_id": ObjectId(kb_id)})
+        if not kb:
+            raise ValueError("Knowledge base not found")
+        vector_store = self._get_vector_store(kb_id)
+        if not vector_store:
+            raise ValueError("Vector store not initialized")
+        
+        records = {
+            "knowledge_base": [kb],
+            "documents": self.db.documents.find({"kb_id": kb_id}),
+            "document_versions": self.db.document_versions.find({"kb_id": kb_id}),
+            "vector_refs": self.db.vector_refs.find({"kb_id": kb_id}),
+        }
+        info = {
+            "kb_id": kb_id,
+            "name": kb.get("name"),
+            "embedding_engine": settings.EMBEDDING_ENGINE,
+            "embedding_model": settings.EMBEDDING_MODEL,
+        }
+        with observe_stage("snapshot_export"):
+            return await run_vector_store(
+                INGEST, self._with_kb_lock, kb_id, export_snapshot,
+                directory, vector_store, records, info, float16, filters=self._tenant_filters(kb_id) or None
+            )
+    
+    async def import_knowledge_base(self, directory: str) -> str:
+        """
+        从快照恢复知识库（保留原知识库ID），不重新计算 embedding
+        
+        先校验快照文件，再按批写入向量和 Mongo 记录，最后写入知识库记录（此前知识库不可见）。
+        向量库重新分配主键时（Milvus 自增主键），同步改写文档和旧版本的 vector_ids、vector_refs 的 _id。
+        
+        Args:
+            directory: 快照目录
+            
+        Returns:
+            str: 知识库ID
+            
+        Raises:
+            SnapshotError: 快照格式不支持、校验失败或 embedding 模型与当前配置不同
+            ValueError: 知识库已存在
+        """
+        snapshot = Snapshot(directory)
+        with observe_stage("snapshot_verify"):
+            await run_vector_store(INGEST, snapshot.verify)
+        model = snapshot.info.get("embedding_model")
+        if model != settings.EMBEDDING_MODEL:
+            raise SnapshotError(f"快照的 embedding 模型 {model} 与当前配置 {settings.EMBEDDING_MODEL} 不同")
+        
+        kb = next(snapshot.iter_records("knowledge_base"), None)
+        if kb is None:
+            raise SnapshotError("快照中没有知识库记录")
+        kb_id = str(kb["_id"])
+        if self.db.knowledge_bases.find_one({"_id": kb["_id"]}, {"_id": 1}):
+            raise ValueError("Knowledge base already exists")
+        
+        vector_store = self._get_shared_store() if self.shared_layout else create_vector_store(
+            self.embeddings, f"kb_{kb_id}"
+        )
+        with observe_stage("snapshot_import"):
+            id_map = await run_vector_store(
+                INGEST, self._with_kb_lock, kb_id, self._restore_snapshot, snapshot, vector_store
+            )
+        
+        self.vector_stores[kb_id] = vector_store
+        self.dedup_indexes.pop(kb_id, None)
+        kb["collection_layout"] = settings.KB_COLLECTION_LAYOUT
+        kb["archived_versions"] = self.db.document_versions.count_documents({"kb_id": kb_id})
+        with observe_stage("mongo_insert"):
+            self.db.knowledge_bases.insert_one(kb)
+        self.invalidate_kb_acl(kb_id)
+        self.retrieval_cache.bump(kb_id)
+        logger.info("知识库 %s 从快照恢复，分块 %d 个", kb_id, len(id_map))
+        return kb_id
+    
+    def _restore_snapshot(self, snapshot: Snapshot, vector_store) -> Dict:
+        """写入快照中的向量、文档和向量引用记录，返回旧向量ID → 新向量ID"""
+        id_map = restore_vectors(vector_store, snapshot)
+        remap = any(old != new for old, new in id_map.items())
+        
+        def documents(name: str):
+            for doc in snapshot.iter_records(name):
+                if remap:
+                    doc["vector_ids"] = [id_map.get(vector_id, vector_id) for vector_id in doc.get("vector_ids", [])]
+                yield doc
+        
+        def vector_refs():
+            for ref in snapshot.iter_records("vector_refs"):
+                if remap:
+                    ref["_id"] = id_map.get(ref["_id"], ref["_id"])
+                yield ref
+        
+        with observe_stage("mongo_insert"):
+            insert_records(self.db.documents, documents("documents"))
+            insert_records(self.db.document_versions, documents("document_versions"))
+            insert_records(self.db.vector_refs, vector_refs())
+        return id_map
+    
+    async def migrate_to_shared(self, kb_id: str, drop_source: bool = False) -> Dict:
+        """
+        把知识库的分块从独立 collection（kb_<知识库ID>）复制到共享 collection（SHARED_KB_COLLECTION），
+        不重新计算 embedding（见 kb_migrate.py）
+        
+        共享 collection 重新分配主键时（Milvus 自增主键），同步改写文档和旧版本的 vector_ids、vector_refs 的 _id。
+        完成后在知识库记录上标记 collection_layout，已迁移的知识库再次执行时跳过复制（drop_source 时仍删除原 collection）；
+        复制向量的阶段中断后重新执行即可（先删除共享 collection 中该知识库已写入的分块），
+        改写 Mongo 记录不是事务性的，迁移前先用 kb_snapshot.py 导出快照。
+        迁移期间持有的知识库写入锁只在本进程内有效，应先停止其他进程对该知识库的写入。
+        
+        Args:
+            kb_id: 知识库ID
+            drop_source: 迁移完成后删除原 collection（默认保留，确认无误后再带该参数执行一次）
+            
+        Returns:
+            Dict: {"kb_id", "chunks": 复制的分块数, "remapped": 是否改写了向量ID, "skipped": 是否已迁移过}
+        """
+        kb = self.db.knowledge_bases.find_one({"_id": ObjectId(kb_id)}, {"collection_layout": 1})
+        if not kb:
+            raise ValueError("Knowledge base not found")
+        skipped = kb.get("collection_layout") == "shared"
+        
+        source = self.vector_stores.get(kb_id)
+        if source is None or source is self._shared_store:
+            source = create_vector_store(self.embeddings, f"kb_{kb_id}")
+        id_map = {}
+        if not skipped:
+            target = self._get_shared_store()
+            with observe_stage("collection_migrate"):
+                id_map = await run_vector_store(
+                    INGEST, self._with_kb_lock, kb_id, self._copy_to_shared, kb_id, source, target
+                )
+            self.db.knowledge_bases.update_one({"_id": ObjectId(kb_id)}, {"$set": {"collection_layout": "shared"}})
+            self.dedup_indexes.pop(kb_id, None)
+            self.retrieval_cache.bump(kb_id)
+            logger.info("知识库 %s 迁移到共享 collection，分块 %d 个", kb_id, len(id_map))
+        if drop_source:
+            if getattr(source, "col", None) is not None:
+                source.col.drop()
+            self.vector_stores.pop(kb_id, None)
+        remapped = any(old != new for old, new in id_map.items())
+        return {"kb_id": kb_id, "chunks": len(id_map), "remapped": remapped, "skipped": skipped}
+    
+    def _copy_to_shared(self, kb_id: str, source, target) -> Dict:
+        """复制分块并改写 Mongo 中引用的向量ID，返回旧向量ID → 新向量ID"""
+        stale = [pk for ids, _, _, _ in iter_vectors(target, filters={"kb_id": kb_id}) for pk in ids]
+        if stale:
+            with observe_stage("milvus_delete"):
+                target.delete(stale)
+        
+        id_map = {}
+        with observe_stage("milvus_insert"):
+            for ids, vectors, texts, metadatas in iter_vectors(source):
+                # 早期写入的分块可能缺少过滤字段，共享 collection 中每个分块都必须有 kb_id
+                for metadata in metadatas:
+                    metadata.update(chunk_fields({**metadata, "kb_id": kb_id}))
+                id_map.update(zip(ids, write_vectors(target, ids, vectors, texts, metadatas)))
+        
+        changed = {old: new for old, new in id_map.items() if old != new}
+        if not changed:
+            return id_map
+        with observe_stage("mongo_update"):
+            for collection in (self.db.documents, self.db.document_versions):
+                operations = [
+                    UpdateOne(
+                        {"_id": record["_id"]},
+                        {"$set": {"vector_ids": [changed.get(vector_id, vector_id) for vector_id in record["vector_ids"]]}}
+                    )
+                    for record in collection.find({"kb_id": kb_id, "vector_ids.0": {"$exists": True}}, {"vector_ids": 1})
+                ]
+                if operations:
+                    collection.bulk_write(operations, ordered=False)
+            refs = list(self.db.vector_refs.find({"kb_id": kb_id, "_id": {"$in": list(changed)}}))
+            for ref in refs:
+                ref["_id"] = changed[ref["_id"]]
+            insert_records(self.db.vector_refs, refs)
+            self.db.vector_refs.delete_many({"_id": {"$in": list(changed)}})
+        return id_map
+    
     async def search_similar(
         self,
         kb_id: str,
-        query: SearchQuery,
+        query: DocumentSearchQuery,
         user_id: Optional[str] = None
     ) -> List[VectorSearchResult]:
         """
@@ -178,10 +715,10 @@ class RAGService:
             user_id: 用户ID（用于权限验证）
             
         Returns:
-            List[VectorSearchResult]: 搜索结果列表
+            List[VectorSearchResult]: 搜索结果列表（可能来自检索缓存，不要原地修改）
         """
         # 验证访问权限
-        kb = self.db.knowledge_bases.find_one({"_id": ObjectId(kb_id)})
+        kb = self._get_kb_acl(kb_id)
         if not kb:
             raise ValueError("Knowledge base not found")
             
@@ -189,25 +726,88 @@ class RAGService:
             raise ValueError("Access denied")
         
         # 获取向量存储
-        vector_store = self.vector_stores.get(kb_id)
+        vector_store = self._get_vector_store(kb_id)
         if not vector_store:
             raise ValueError("Vector store not initialized")
         
-        # 执行相似度搜索
-        docs = vector_store.similarity_search_with_score(
-            query.text,
-            k=query.limit or 3,
-            score_threshold=query.score_threshold or 0.5
+        # 执行相似度搜索（查询向量单独计算，便于区分 embedding 和 Milvus 的耗时）
+        # 类别/标签/文档类型过滤下推到向量库，只在满足条件的分块中检索；共享布局下同时按 kb_id 过滤
+        filters = build_filters(
+            category=getattr(query, "category", None),
+            tags=getattr(query, "tags", None),
+            doc_type=getattr(query, "doc_type", None),
+            kb_id=kb_id if self.shared_layout else None
+        )
+        k = query.limit or 3
+        score_threshold = query.score_threshold or 0.5
+        mmr = getattr(query, "mmr", False)
+        parent_context = getattr(query, "parent_context", None)
+        if parent_context is None:
+            parent_context = settings.PARENT_RETRIEVAL_ENABLED
+        
+        # 权限检查之后再查缓存：知识库没有写入时，相同的查询和参数直接返回上次的结果
+        cache_key = self.retrieval_cache.key(
+            kb_id, query.text,
+            k=k, filters=filters, score_threshold=score_threshold, mmr=mmr,
+            fetch_k=query.fetch_k if mmr else None, mmr_lambda=query.mmr_lambda if mmr else None,
+            parent_context=parent_context
         )
+        cached = self.retrieval_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+        
+        # 旧 collection 没有过滤条件用到的字段，其中没有满足条件的分块
+        if missing_filter_fields(vector_store, filters):
+            return []
+        
+        # 知识库有旧版本时向量库中还有旧版本独占的分块，多召回一些，过滤后仍有 k 条；
+        # 没有 archived_versions 字段的知识库（计数上线前创建）无法判断，按有旧版本处理
+        versioned = settings.DOCUMENT_VERSIONING and kb.get("archived_versions", 1) > 0
+        search_k = k * settings.VERSION_SEARCH_OVERFETCH if versioned else k
+        embedding = await run_embedding(QUERY, self.embeddings.embed_query, query.text)
+        with observe_stage("milvus_search"):
+            if mmr:
+                # 过量召回 fetch_k 个候选，按阈值剪枝后用 MMR 选出 k 个互不重复的分块
+                docs = await run_vector_store(
+                    QUERY,
+                    mmr_search,
+                    vector_store,
+                    embedding,
+                    k=search_k,
+                    fetch_k=max(query.fetch_k or 4 * k, search_k),
+                    lambda_mult=query.mmr_lambda,
+                    score_threshold=score_threshold,
+                    **filter_kwargs(vector_store, filters)
+                )
+            else:
+                # 与 MMR 路径相同，分数为与查询的余弦相似度（Milvus 返回的 L2 距离在 scored_search 中换算）
+                docs = await run_vector_store(
+                    QUERY,
+                    scored_search,
+                    vector_store,
+                    embedding,
+                    k=search_k,
+                    score_threshold=score_threshold,
+                    **filter_kwargs(vector_store, filters)
+                )
+        if versioned:
+            docs = self._current_hits(kb_id, docs)
+        docs = docs[:k]
+        
+        if parent_context:
+            results = self._expand_to_sections(kb_id, docs)
+            self.retrieval_cache.set(cache_key, results)
+            return list(results)
         
         # 格式化结果
         results = []
         for doc, score in docs:
             # 获取原始文档信息
-            original_doc = self.db.documents.find_one({
-                "kb_id": kb_id,
-                "vector_ids": {"$in": [doc.metadata.get("vector_id")]}
-            })
+            with observe_stage("mongo_hydrate"):
+                original_doc = self.db.documents.find_one({
+                    "kb_id": kb_id,
+                    "vector_ids": {"$in": [doc.metadata.get("pk")]}
+                })
             
             results.append(VectorSearchResult(
                 content=doc.page_content,
@@ -221,6 +821,98 @@ class RAGService:
                 }
             ))
         
+        self.retrieval_cache.set(cache_key, results)
+        return list(results)
+    
+    def _current_hits(self, kb_id: str, docs: List) -> List:
+        """只保留被某个文档当前版本引用的命中（旧版本独占的分块不出现在默认检索结果中）"""
+        pks = [doc.metadata.get("pk") for doc, _ in docs]
+        with observe_stage("mongo_find_refs"):
+            refs = {
+                ref["_id"]: ref.get("refs") or []
+                for ref in self.db.vector_refs.find({"_id": {"$in": pks}}, {"refs": 1})
+            }
+        doc_ids = {ref["doc_id"] for locations in refs.values() for ref in locations if ObjectId.is_valid(ref["doc_id"])}
+        with observe_stage("mongo_find_doc"):
+            current_revs = {
+                str(record["_id"]): record.get("vector_rev") for record in self.db.documents.find(
+                    {"_id": {"$in": [ObjectId(doc_id) for doc_id in doc_ids]}, "kb_id": kb_id}, {"vector_rev": 1}
+                )
+            }
+        return [(doc, score) for (doc, score), pk in zip(docs, pks) if is_current_hit(refs.get(pk), current_revs)]
+    
+    def _expand_to_sections(self, kb_id: str, docs: List) -> List[VectorSearchResult]:
+        """
+        把子分块命中换成所在的父章节，同一文档中相同或相邻章节的命中合并为一段原文
+        
+        命中的向量可能被多个文档共用（近似去重），按 vector_refs 中的引用 (文档, 版本, 分块序号) 定位，
+        取第一个仍是文档当前版本的引用；没有章节信息的文档（未启用父文档检索时写入）保留分块原文。
+        """
+        pks = [doc.metadata.get("pk") for doc, _ in docs]
+        with observe_stage("mongo_find_refs"):
+            refs = {
+                ref["_id"]: ref.get("refs") or []
+                for ref in self.db.vector_refs.find({"_id": {"$in": pks}}, {"refs": 1})
+            }
+        candidates = [
+            refs.get(pk) or [{
+                "doc_id": doc.metadata.get("doc_id"), "rev": None, "chunk_index": doc.metadata.get("chunk_index")
+            }]
+            for (doc, _), pk in zip(docs, pks)
+        ]
+        doc_ids = {ref["doc_id"] for locations in candidates for ref in locations if ObjectId.is_valid(ref["doc_id"] or "")}
+        with observe_stage("mongo_hydrate"):
+            records = {
+                str(record["_id"]): record for record in self.db.documents.find(
+                    {"_id": {"$in": [ObjectId(doc_id) for doc_id in doc_ids]}, "kb_id": kb_id},
+                    {"title": 1, "source": 1, "author": 1, "content": 1, "sections": 1,
+                     "chunk_sections": 1, "vector_rev": 1, "created_at": 1}
+                )
+            }
+        
+        hits, chunks = [], {}
+        for (doc, score), pk, locations in zip(docs, pks, candidates):
+            for ref in locations:
+                record = records.get(ref["doc_id"])
+                if (record and record.get("sections") and ref["chunk_index"] is not None
+                        and ref["rev"] in (None, record.get("vector_rev"))):
+                    hits.append((ref["doc_id"], record["chunk_sections"][ref["chunk_index"]], score))
+                    break
+            else:
+                # 没有章节信息：单独作为一段，不与其他命中合并
+                chunks[("chunk", pk)] = doc
+                hits.append((("chunk", pk), 0, score))
+        
+        results = []
+        for run in merge_hits(hits):
+            if run["doc_id"] in chunks:
+                doc = chunks[run["doc_id"]]
+                results.append(VectorSearchResult(
+                    content=doc.page_content,
+                    score=float(run["score"]),
+                    metadata={
+                        "title": doc.metadata.get("title"),
+                        "source": doc.metadata.get("source"),
+                        "author": doc.metadata.get("author"),
+                        "chunk_index": doc.metadata.get("chunk_index"),
+                        "created_at": doc.metadata.get("created_at")
+                    }
+                ))
+                continue
+            record = records[run["doc_id"]]
+            results.append(VectorSearchResult(
+                content=section_text(record["content"], record["sections"], run["first_section"], run["last_section"]),
+                score=float(run["score"]),
+                metadata={
+                    "doc_id": run["doc_id"],
+                    "title": record.get("title"),
+                    "source": record.get("source"),
+                    "author": record.get("author"),
+                    "sections": [run["first_section"], run["last_section"]],
+                    "matched_chunks": run["hits"],
+                    "created_at": record.get("created_at")
+                }
+            ))
         return results
     
     async def delete_document(self, kb_id: str, doc_id: str, user_id: str) -> bool:
@@ -236,23 +928,33 @@ class RAGService:
             bool: 是否删除成功
         """
         # 验证权限
-        kb = self.db.knowledge_bases.find_one({"_id": ObjectId(kb_id)})
+        kb = self._get_kb_acl(kb_id)
         if not kb or kb["owner_id"] != user_id:
             raise ValueError("Access denied")
         
         # 获取文档
-        doc = self.db.documents.find_one({"_id": ObjectId(doc_id), "kb_id": kb_id})
+        with observe_stage("mongo_find_doc"):
+            doc = self.db.documents.find_one({"_id": ObjectId(doc_id), "kb_id": kb_id})
         if not doc:
             raise ValueError("Document not found")
         
-        # 从向量数据库删除
-        vector_store = self.vector_stores.get(kb_id)
-        if vector_store:
-            for vector_id in doc["vector_ids"]:
-                vector_store.delete([vector_id])
+        # 释放分块引用（包括保留的旧版本），删除不再被其他文档引用的向量
+        with observe_stage("mongo_find_versions"):
+            versions = list(self.db.document_versions.find({"doc_id": doc_id}, {"vector_ids": 1}))
+        vector_ids = list(doc["vector_ids"])
+        for version in versions:
+            vector_ids.extend(version["vector_ids"])
+        await run_vector_store(
+            INGEST, self._with_kb_lock, kb_id, self._release_vectors,
+            kb_id, doc_id, vector_ids, doc.get("vector_rev") if not versions else None, self._get_vector_store(kb_id)
+        )
         
         # 从MongoDB删除
-        result = self.db.documents.delete_one({"_id": ObjectId(doc_id)})
+        with observe_stage("mongo_delete"):
+            removed = self.db.document_versions.delete_many({"doc_id": doc_id}).deleted_count
+            result = self.db.documents.delete_one({"_id": ObjectId(doc_id)})
+        self._count_archived(kb_id, -removed)
+        self.retrieval_cache.bump(kb_id)
         return result.deleted_count > 0
     
     async def update_document(
@@ -260,58 +962,75 @@ class RAGService:
         kb_id: str,
         doc_id: str,
         update_data: DocumentUpdate,
-        user_id: str
+        user_id: str,
+        progress: Optional[Callable[[int, int], None]] = None
     ) -> bool:
         """
         更新文档
         
+        DOCUMENT_VERSIONING 开启时，内容变化会生成新版本：原内容归档到 document_versions，
+        旧版本的分块引用按保留策略（VERSION_RETENTION_COUNT / VERSION_RETENTION_DAYS）保留，
+        新旧版本相同的分块共用向量；只改元数据不生成新版本。
+        
         Args:
             kb_id: 知识库ID
             doc_id: 文档ID
             update_data: 更新数据
             user_id: 用户ID（用于权限验证）
+            progress: 内容变化时的进度回调 (已写入分块数, 分块总数)，见 _store_chunks
             
         Returns:
             bool: 是否更新成功
         """
         # 验证权限
-        kb = self.db.knowledge_bases.find_one({"_id": ObjectId(kb_id)})
+        kb = self._get_kb_acl(kb_id)
         if not kb or kb["owner_id"] != user_id:
             raise ValueError("Access denied")
         
         # 获取原文档
-        doc = self.db.documents.find_one({"_id": ObjectId(doc_id), "kb_id": kb_id})
+        with observe_stage("mongo_find_doc"):
+            doc = self.db.documents.find_one({"_id": ObjectId(doc_id), "kb_id": kb_id})
         if not doc:
             raise ValueError("Document not found")
         
         # 如果内容发生变化，需要更新向量存储
+        archive = False
         if update_data.content:
-            # 删除旧的向量
-            vector_store = self.vector_stores.get(kb_id)
-            if vector_store:
-                for vector_id in doc["vector_ids"]:
-                    vector_store.delete([vector_id])
+            vector_store = self._get_vector_store(kb_id)
+            if not vector_store:
+                raise ValueError("Vector store not initialized")
             
             # 创建新的向量
-            text_splitter = CharacterTextSplitter(
-                chunk_size=update_data.chunk_size or 1000,
-                chunk_overlap=update_data.chunk_overlap or 200
-            )
-            texts = text_splitter.split_text(update_data.content)
+            with observe_stage("split"):
+                texts, layout = self._split(update_data.content, update_data.chunk_size, update_data.chunk_overlap)
             
             metadata = {
                 "title": update_data.title or doc["title"],
                 "source": update_data.source or doc["source"],
                 "author": update_data.author or doc["author"],
                 "tags": update_data.tags or doc["tags"],
+                "category": getattr(update_data, "category", None) or doc.get("category"),
+                "doc_type": getattr(update_data, "doc_type", None) or doc.get("doc_type"),
                 "updated_at": datetime.utcnow(),
                 "kb_id": kb_id
             }
+            metadata.update(chunk_fields(metadata))
             
-            vector_ids = vector_store.add_texts(
-                texts=texts,
-                metadatas=[{**metadata, "chunk_index": i} for i in range(len(texts))]
+            # 先写新分块再处理旧分块：未改动的分块内容相同（或近似重复），直接复用旧向量，不再重新计算 embedding
+            vector_rev = str(ObjectId())
+            vector_ids, duplicates = await run_vector_store(
+                INGEST, self._with_kb_lock, kb_id, self._store_chunks,
+                kb_id, doc_id, vector_rev, vector_store, texts, metadata, progress
             )
+            # 旧版本归档并保留其引用；没有版本号的旧数据（去重功能上线前写入）直接释放
+            archive = settings.DOCUMENT_VERSIONING and doc.get("vector_rev")
+            if archive:
+                self._archive_version(doc)
+            else:
+                await run_vector_store(
+                    INGEST, self._with_kb_lock, kb_id, self._release_vectors,
+                    kb_id, doc_id, doc["vector_ids"], doc.get("vector_rev"), vector_store
+                )
         
         # 更新MongoDB文档
         update_fields = {
@@ -321,6 +1040,10 @@ class RAGService:
         if update_data.content:
             update_fields["content"] = update_data.content
             update_fields["vector_ids"] = vector_ids
+            update_fields["vector_rev"] = vector_rev
+            update_fields["dedup"] = {"chunks": len(texts), "duplicates": duplicates}
+            update_fields["version"] = doc.get("version", 1) + 1
+            update_fields.update(layout)
         if update_data.title:
             update_fields["title"] = update_data.title
         if update_data.source:
@@ -330,10 +1053,206 @@ class RAGService:
         if update_data.tags:
             update_fields["tags"] = update_data.tags
         
-        result = self.db.documents.update_one(
-            {"_id": ObjectId(doc_id)},
-            {"$set": update_fields}
-        )
+        with observe_stage("mongo_update"):
+            result = self.db.documents.update_one(
+                {"_id": ObjectId(doc_id)},
+                {"$set": update_fields}
+            )
+        self.retrieval_cache.bump(kb_id)
+        
+        if update_data.content and archive:
+            await run_vector_store(
+                INGEST, self._with_kb_lock, kb_id, self._prune_versions, kb_id, doc_id, vector_store
+            )
         
         return result.modified_count > 0
+    
+    def _archive_version(self, doc: Dict):
+        """把文档当前版本归档到 document_versions（不复制分块，只保存向量ID和版本号）"""
+        fields = (
+            "title", "content", "source", "author", "tags", "category", "doc_type",
+            "vector_ids", "vector_rev", "dedup", "sections", "chunk_sections"
+        )
+        with observe_stage("mongo_insert"):
+            self.db.document_versions.insert_one({
+                "kb_id": doc["kb_id"],
+                "doc_id": str(doc["_id"]),
+                "version": doc.get("version", 1),
+                **{name: doc.get(name) for name in fields},
+                "created_at": doc.get("updated_at") or doc.get("created_at"),
+                "archived_at": datetime.utcnow()
+            })
+        self._count_archived(doc["kb_id"], 1)
+    
+    def _count_archived(self, kb_id: str, delta: int):
+        """
+        更新知识库记录上的旧版本数（只更新已有该字段的记录）
+        
+        本进程的权限缓存立即失效；其他进程最多延迟 KB_ACL_CACHE_TTL 看到变化，
+        期间新归档的旧版本分块可能出现在检索结果中。
+        """
+        if not delta:
+            return
+        with observe_stage("mongo_update"):
+            self.db.knowledge_bases.update_one(
+                {"_id": ObjectId(kb_id), "archived_versions": {"$exists": True}},
+                {"$inc": {"archived_versions": delta}}
+            )
+        self.invalidate_kb_acl(kb_id)
+    
+    def _prune_versions(self, kb_id: str, doc_id: str, vector_store, now: Optional[datetime] = None) -> int:
+        """按保留策略清理文档的旧版本，释放其分块引用，返回清理的版本数"""
+        with observe_stage("mongo_find_versions"):
+            versions = list(self.db.document_versions.find(
+                {"doc_id": doc_id}, {"version": 1, "archived_at": 1, "vector_ids": 1, "vector_rev": 1}
+            ))
+        expired = expired_versions(
+            versions,
+            keep=settings.VERSION_RETENTION_COUNT,
+            max_age=settings.VERSION_RETENTION_DAYS * 86400,
+            now=now
+        )
+        for version in expired:
+            self._release_vectors(kb_id, doc_id, version["vector_ids"], version["vector_rev"], vector_store)
+        if expired:
+            with observe_stage("mongo_delete"):
+                self.db.document_versions.delete_many({"_id": {"$in": [version["_id"] for version in expired]}})
+            self._count_archived(kb_id, -len(expired))
+        return len(expired)
+    
+    async def gc_versions(self, kb_id: str, now: Optional[datetime] = None) -> Dict:
+        """
+        按保留策略清理知识库中所有文档的旧版本（按时间保留时需要定期执行，见 kb_versions.py）
+        
+        Returns:
+            Dict: {"documents": 涉及的文档数, "versions": 清理的版本数}
+        """
+        vector_store = self._get_vector_store(kb_id)
+        with observe_stage("mongo_find_versions"):
+            doc_ids = self.db.document_versions.distinct("doc_id", {"kb_id": kb_id})
+        removed = 0
+        for doc_id in doc_ids:
+            removed += await run_vector_store(
+                INGEST, self._with_kb_lock, kb_id, self._prune_versions, kb_id, doc_id, vector_store, now
+            )
+        if removed:
+            self.retrieval_cache.bump(kb_id)
+        return {"documents": len(doc_ids), "versions": removed}
+    
+    def _check_read_access(self, kb_id: str, user_id: Optional[str]):
+        kb = self._get_kb_acl(kb_id)
+        if not kb:
+            raise ValueError("Knowledge base not found")
+        if not kb["is_public"] and kb["owner_id"] != user_id:
+            raise ValueError("Access denied")
+    
+    async def list_versions(self, kb_id: str, doc_id: str, user_id: Optional[str] = None) -> List[Dict]:
+        """
+        文档的版本列表（当前版本在前，旧版本按版本号降序），不含内容
+        
+        Returns:
+            List[Dict]: [{"version", "current", "title", "chunks", "created_at", "archived_at"}, ...]
+        """
+        self._check_read_access(kb_id, user_id)
+        with observe_stage("mongo_find_doc"):
+            doc = self.db.documents.find_one(
+                {"_id": ObjectId(doc_id), "kb_id": kb_id}, {"version": 1, "title": 1, "dedup": 1, "updated_at": 1}
+            )
+        if not doc:
+            raise ValueError("Document not found")
+        with observe_stage("mongo_find_versions"):
+            versions = list(self.db.document_versions.find(
+                {"doc_id": doc_id}, {"version": 1, "title": 1, "dedup": 1, "created_at": 1, "archived_at": 1}
+            ).sort("version", -1))
+        current = {
+            "version": doc.get("version", 1), "current": True, "title": doc.get("title"),
+            "chunks": (doc.get("dedup") or {}).get("chunks"), "created_at": doc.get("updated_at"), "archived_at": None
+        }
+        return [current] + [
+            {
+                "version": version["version"], "current": False, "title": version.get("title"),
+                "chunks": (version.get("dedup") or {}).get("chunks"),
+                "created_at": version.get("created_at"), "archived_at": version.get("archived_at")
+            }
+            for version in versions
+        ]
+    
+    async def get_document_version(
+        self,
+        kb_id: str,
+        doc_id: str,
+        version: Optional[int] = None,
+        user_id: Optional[str] = None
+    ) -> Optional[Dict]:
+        """
+        文档某个版本的记录（内容、元数据、vector_ids），version 为 None 或当前版本号时返回文档记录
+        
+        Returns:
+            Optional[Dict]: 版本不存在（或已被清理）时为 None
+        """
+        self._check_read_access(kb_id, user_id)
+        with observe_stage("mongo_find_doc"):
+            doc = self.db.documents.find_one({"_id": ObjectId(doc_id), "kb_id": kb_id})
+        if not doc:
+            raise ValueError("Document not found")
+        if version is None or version == doc.get("version", 1):
+            return doc
+        with observe_stage("mongo_find_versions"):
+            return self.db.document_versions.find_one({"doc_id": doc_id, "version": version})
+    
+    async def search_version(
+        self,
+        kb_id: str,
+        doc_id: str,
+        version: Optional[int],
+        query: DocumentSearchQuery,
+        user_id: Optional[str] = None
+    ) -> List[VectorSearchResult]:
+        """
+        只在文档某个版本（包括仍保留的旧版本）的分块中检索
+        
+        Args:
+            version: 版本号，None 为当前版本
+        """
+        record = await self.get_document_version(kb_id, doc_id, version, user_id)
+        if record is None:
+            raise ValueError("Document version not found")
+        vector_store = self._get_vector_store(kb_id)
+        if not vector_store:
+            raise ValueError("Vector store not initialized")
+        
+        vector_ids = list(dict.fromkeys(record.get("vector_ids") or []))
+        if not vector_ids:
+            return []
+        embedding = await run_embedding(QUERY, self.embeddings.embed_query, query.text)
+        with observe_stage("milvus_search"):
+            docs = await run_vector_store(
+                QUERY,
+                scored_search,
+                vector_store,
+                embedding,
+                k=query.limit or 3,
+                score_threshold=query.score_threshold or 0.5,
+                **filter_kwargs(vector_store, {"ids": vector_ids})
+            )
+        # 共用的向量的元数据可能来自其他文档/版本，标题和分块序号以该版本为准
+        positions = {}
+        for index, vector_id in enumerate(record.get("vector_ids") or []):
+            positions.setdefault(str(vector_id), index)
+        return [
+            VectorSearchResult(
+                content=doc.page_content,
+                score=float(score),
+                metadata={
+                    "doc_id": doc_id,
+                    "version": record.get("version", 1),
+                    "title": record.get("title"),
+                    "source": record.get("source"),
+                    "author": record.get("author"),
+                    "chunk_index": positions.get(str(doc.metadata.get("pk"))),
+                    "created_at": record.get("created_at")
+                }
+            )
+            for doc, score in docs
+        ]
 
@@ -0,0 +1,102 @@
+import logging
+from typing import Dict, List, Optional
+from rag_service.embeddings import InstrumentedEmbeddings, create_embeddings
+from rag_service.filters import FILTER_FIELDS, MIN_MILVUS_VERSION, to_milvus_expr
+from rag_service.vectorstore import LocalVectorStore
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def create_embedding_model():
+    """
+    按配置创建 embedding 模型（EMBEDDING_ENGINE / EMBEDDING_MODEL），并统计调用耗时
+    """
+    options = {}
+    if settings.EMBEDDING_ENGINE == "onnx":
+        options = {
+            "quantized": settings.EMBEDDING_ONNX_QUANTIZED,
+            "intra_op_threads": settings.EMBEDDING_THREADS,
+        }
+    elif settings.EMBEDDING_ENGINE == "remote":
+        options = {"socket_path": settings.EMBEDDING_SERVER_SOCKET}
+    return InstrumentedEmbeddings(
+        create_embeddings(settings.EMBEDDING_MODEL, engine=settings.EMBEDDING_ENGINE, **options)
+    )
+
+def create_vector_store(embeddings, collection_name: str):
+    """
+    按配置创建向量存储（VECTOR_STORE_BACKEND）
+    
+    Args:
+        embeddings: embedding 模型
+        collection_name: collection 名称
+    """
+    if settings.VECTOR_STORE_BACKEND == "local":
+        return LocalVectorStore(embeddings, collection_name=collection_name)
+    
+    from langchain.vectorstores import Milvus
+    vector_store = Milvus(
+        embedding_function=embeddings,
+        connection_args={
+            "host": settings.MILVUS_HOST,
+            "port": settings.MILVUS_PORT
+        },
+        collection_name=collection_name
+    )
+    _check_milvus(vector_store)
+    return vector_store
+
+def _check_milvus(vector_store):
+    """打开 Milvus collection 时检查服务端版本和过滤字段，不满足时记录警告（不带过滤条件的检索不受影响）"""
+    from pymilvus import utility
+    
+    try:
+        version = utility.get_server_version(using=vector_store.alias)
+        parts = tuple(int(part) for part in version.lstrip("v").split(".")[:2])
+    except Exception:
+        parts = None
+    if parts and parts < MIN_MILVUS_VERSION:
+        logger.warning(
+            "Milvus 服务端版本 %s 低于 %s，按标签过滤（like 中缀匹配）不可用",
+            version, ".".join(map(str, MIN_MILVUS_VERSION))
+        )
+    missing = missing_filter_fields(vector_store)
+    if missing:
+        logger.warning(
+            "collection %s 缺少过滤字段 %s（创建于过滤字段加入之前），按这些字段过滤时结果为空；"
+            "需要过滤时把分块重新写入新的 collection（rag2 可用 kb_migrate.py 迁移到共享 collection）",
+            vector_store.collection_name, missing
+        )
+
+def missing_filter_fields(vector_store, filters: Optional[Dict] = None) -> List[str]:
+    """
+    Milvus collection 中缺少的过滤字段（rag_service.filters.FILTER_FIELDS）
+    
+    过滤字段加入之前创建的 collection 没有这些列，其中的分块都不满足这些字段上的条件，
+    调用方据此直接返回空结果，而不是把引用不存在字段的表达式发给 Milvus 报错。
+    
+    Args:
+        vector_store: 向量存储
+        filters: 只检查这些过滤条件用到的字段，默认检查全部
+        
+    Returns:
+        List[str]: 缺少的字段；本地向量库和尚未创建的 collection 为空列表
+    """
+    if isinstance(vector_store, LocalVectorStore) or getattr(vector_store, "col", None) is None:
+        return []
+    if filters is None:
+        names = FILTER_FIELDS
+    else:
+        names = [name for name in FILTER_FIELDS if filters.get(name)]
+    return [name for name in names if name not in vector_store.fields]
+
+def filter_kwargs(vector_store, filters: Optional[Dict]) -> Dict:
+    """
+    把过滤条件（rag_service.filters.build_filters）翻译为向量库检索参数：
+    本地向量库为 filter（列式索引预过滤），Milvus 为 expr 表达式
+    """
+    if not filters:
+        return {}
+    if isinstance(vector_store, LocalVectorStore):
+        return {"filter": filters}
+    return {"expr": to_milvus_expr(filters, vector_store._primary_field)}
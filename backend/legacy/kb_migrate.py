@@ -0,0 +1,39 @@
+"""
+把知识库从独立 collection 迁移到共享 collection（见 RAGService.migrate_to_shared）
+
+每个知识库一个 Milvus collection 时，知识库数量增长后 collection 的元数据、段和索引开销随之线性增长；
+共享布局下所有知识库的分块写入 SHARED_KB_COLLECTION，检索时按分块的 kb_id 字段过滤。
+迁移只复制已有向量，不重新计算 embedding；全部迁移完成后再把 KB_COLLECTION_LAYOUT 改为 shared 并重启服务。
+
+用法（在 backend/legacy 目录下，连接 .env 中配置的 MongoDB 和 Milvus）:
+    python kb_migrate.py                    # 迁移所有知识库
+    python kb_migrate.py <kb_id> [<kb_id> ...] [--drop-source]
+
+已迁移的知识库跳过复制；--drop-source 在迁移完成后删除原 collection（对已迁移的知识库单独执行也会删除）。
+"""
+
+import argparse
+import asyncio
+import json
+
+
+async def migrate(args):
+    from app.services.rag2 import RAGService
+
+    service = RAGService()
+    kb_ids = args.kb_ids or [str(kb["_id"]) for kb in service.db.knowledge_bases.find({}, {"_id": 1})]
+    for kb_id in kb_ids:
+        result = await service.migrate_to_shared(kb_id, drop_source=args.drop_source)
+        print(json.dumps(result, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="知识库迁移到共享 collection")
+    parser.add_argument("kb_ids", nargs="*", help="知识库ID，缺省为全部")
+    parser.add_argument("--drop-source", action="store_true", help="迁移完成后删除原 collection")
+    args = parser.parse_args()
+    asyncio.run(migrate(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+知识库快照导出/导入（见 rag_service.snapshot）
+
+新副本或恢复知识库时直接加载快照中的向量，不需要重新运行 embedding。
+
+用法（在 backend/legacy 目录下，连接 .env 中配置的 MongoDB 和 Milvus）:
+    python kb_snapshot.py export <kb_id> /backups/kb [--float16]
+    python kb_snapshot.py import /backups/kb/<kb_id>/<时间戳>
+    python kb_snapshot.py verify /backups/kb/<kb_id>/<时间戳>
+
+导出目录为 <输出目录>/<kb_id>/<UTC 时间戳>，同一知识库的多次导出互不覆盖。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from datetime import datetime, timezone
+
+import app  # noqa: F401  把 backend 目录加入 sys.path，rag_service 才能导入
+from rag_service.snapshot import Snapshot
+
+
+def _service():
+    from app.services.rag2 import RAGService
+    return RAGService()
+
+
+async def export(args):
+    service = _service()
+    service.open_vector_store(args.kb_id)
+    directory = os.path.join(args.output, args.kb_id, datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ"))
+    manifest = await service.export_knowledge_base(args.kb_id, directory, float16=args.float16)
+    print(json.dumps({"directory": directory, "count": manifest["count"], "records": manifest["records"]},
+                     ensure_ascii=False))
+
+
+async def restore(args):
+    kb_id = await _service().import_knowledge_base(args.directory)
+    print(json.dumps({"kb_id": kb_id}, ensure_ascii=False))
+
+
+def verify(args):
+    snapshot = Snapshot(args.directory)
+    snapshot.verify()
+    print(json.dumps({"count": snapshot.count, "info": snapshot.info, "verified": True}, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="知识库快照导出/导入")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="导出知识库快照")
+    export_parser.add_argument("kb_id")
+    export_parser.add_argument("output", help="输出目录")
+    export_parser.add_argument("--float16", action="store_true", help="向量以 float16 保存（体积减半）")
+    import_parser = commands.add_parser("import", help="从快照恢复知识库")
+    import_parser.add_argument("directory", help="快照目录")
+    verify_parser = commands.add_parser("verify", help="校验快照文件")
+    verify_parser.add_argument("directory", help="快照目录")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        asyncio.run(export(args))
+    elif args.command == "import":
+        asyncio.run(restore(args))
+    else:
+        verify(args)
+
+
+if __name__ == "__main__":
+    main()
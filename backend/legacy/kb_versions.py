@@ -0,0 +1,53 @@
+"""
+文档版本查看与清理（见 rag_service.versioning）
+
+更新文档时按数量保留策略自动清理该文档的旧版本；按时间保留（VERSION_RETENTION_DAYS）需要定期执行 gc。
+
+用法（在 backend/legacy 目录下，连接 .env 中配置的 MongoDB 和 Milvus）:
+    python kb_versions.py gc <kb_id>
+    python kb_versions.py list <kb_id> <doc_id>
+"""
+
+import argparse
+import asyncio
+import json
+
+
+def _service(kb_id: str):
+    from app.services.rag2 import RAGService
+
+    service = RAGService()
+    service.open_vector_store(kb_id)
+    return service
+
+
+async def gc(args):
+    result = await _service(args.kb_id).gc_versions(args.kb_id)
+    print(json.dumps(result, ensure_ascii=False))
+
+
+async def list_versions(args):
+    service = _service(args.kb_id)
+    owner = service._get_kb_acl(args.kb_id)
+    versions = await service.list_versions(args.kb_id, args.doc_id, owner["owner_id"] if owner else None)
+    print(json.dumps(versions, ensure_ascii=False, default=str, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文档版本查看与清理")
+    commands = parser.add_subparsers(dest="command", required=True)
+    gc_parser = commands.add_parser("gc", help="按保留策略清理知识库中的旧版本")
+    gc_parser.add_argument("kb_id")
+    list_parser = commands.add_parser("list", help="列出文档的版本")
+    list_parser.add_argument("kb_id")
+    list_parser.add_argument("doc_id")
+    args = parser.parse_args()
+
+    if args.command == "gc":
+        asyncio.run(gc(args))
+    else:
+        asyncio.run(list_versions(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,38 @@
 
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware # 用于处理跨源资源共享（CORS）
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.core.config import settings
+from app.core.ratelimit import rate_limit
 from app.api import chat, knowledge
+from app.services.container import ServiceContainer
+from rag_service.metrics import PROMETHEUS_CONTENT_TYPE, render_prometheus, server_timing_middleware
+from rag_service.responses import CompressionMiddleware
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    创建全局共享的服务容器；模型加载和存储连接在后台线程中预热，不阻塞端口监听，
+    预热完成前 /readyz 返回 503；预热完成后启动异步入库 worker
+    """
+    services = ServiceContainer()
+    app.state.services = services
+    warm_up = asyncio.get_running_loop().run_in_executor(None, services.warm_up)
+    ingest_workers = asyncio.create_task(services.start_ingest_workers(warm_up))
+    try:
+        yield
+    finally:
+        await warm_up
+        await ingest_workers
+        await services.stop_ingest_workers()
+        services.close()
 
 app = FastAPI( # FastAPI 框架的核心类，用于创建应用实例
     title=settings.PROJECT_NAME, # 项目的名称
-    openapi_url=f"{settings.API_V1_STR}/openapi.json" # 用于生成 API 文档
+    openapi_url=f"{settings.API_V1_STR}/openapi.json", # 用于生成 API 文档
+    lifespan=lifespan
 )
 
 # 配置CORS
@@ -18,14 +44,37 @@ app.add_middleware(
     allow_headers=["*"], # 参数设置允许的 HTTP 头。
 )
 
+# 记录各阶段耗时，写入 Server-Timing 响应头
+app.middleware("http")(server_timing_middleware)
+
+# 较大的响应（检索结果、引用全文）按客户端支持的编码压缩，优先 brotli
+app.add_middleware(CompressionMiddleware, minimum_size=settings.RESPONSE_COMPRESSION_MIN_SIZE)
+
 # 注册路由
 '''
 include_router 方法用于将路由添加到应用程序中。
 chat.router 和 knowledge.router 是从 chat 和 knowledge 子模块导入的路由对象。
 prefix 参数设置路由的前缀，通常是 API 版本号。
+dependencies 中的 rate_limit 按 API 密钥限流（令牌桶），超限返回 429；每日 token 配额只在 /chat 中检查（token_quota）。
 '''
-app.include_router(chat.router, prefix=settings.API_V1_STR)
-app.include_router(knowledge.router, prefix=settings.API_V1_STR)
+app.include_router(chat.router, prefix=settings.API_V1_STR, dependencies=[Depends(rate_limit)])
+app.include_router(knowledge.router, prefix=settings.API_V1_STR, dependencies=[Depends(rate_limit)])
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 指标（各阶段耗时直方图、p50/p95/p99、调用与异常计数）"""
+    return PlainTextResponse(render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """存活检查：进程能处理请求即可"""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """就绪检查：embedding 模型已加载、MongoDB 和向量库已连通；同时返回启动各步骤耗时"""
+    status = app.state.services.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,130 @@
+"""
+进程内 TTL + LRU 缓存
+
+- 条目数有上限，超出时淘汰最久未使用的条目；指定 maxbytes 时同时按估计的字节数限制
+- 每个条目在写入 ttl 秒后过期，跨进程的修改最多延迟 ttl 秒可见；本进程内的修改应调用 invalidate()
+- 命中/未命中/过期/淘汰次数和当前条目数导出到 /metrics（按缓存名称区分）
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from .metrics import counter, gauge
+
+CACHE_REQUESTS = counter("rag_cache_requests_total", "缓存查询次数", ["cache", "result"])
+CACHE_EVICTIONS = counter("rag_cache_evictions_total", "因容量上限被淘汰的缓存条目数", ["cache"])
+CACHE_ENTRIES = gauge("rag_cache_entries", "缓存当前条目数", ["cache"])
+CACHE_BYTES = gauge("rag_cache_bytes", "缓存条目估计占用的字节数（仅限按字节限制的缓存）", ["cache"])
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = 10000,
+        ttl: float = 30.0,
+        maxbytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None
+    ):
+        """
+        Args:
+            name: 缓存名称（指标标签）
+            maxsize: 最多缓存的条目数
+            ttl: 条目有效期（秒）
+            maxbytes: 所有条目估计字节数之和的上限，None 表示只按条目数限制
+            sizeof: 估计单个值字节数的函数，maxbytes 不为 None 时必须提供
+        """
+        if maxbytes is not None and sizeof is None:
+            raise ValueError("maxbytes 需要同时提供 sizeof")
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = CACHE_REQUESTS.labels(cache=name, result="hit")
+        self._misses = CACHE_REQUESTS.labels(cache=name, result="miss")
+        self._expired = CACHE_REQUESTS.labels(cache=name, result="expired")
+        self._evictions = CACHE_EVICTIONS.labels(cache=name)
+        self._entries = CACHE_ENTRIES.labels(cache=name)
+        self._bytes = CACHE_BYTES.labels(cache=name)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                self._hits.inc()
+                return entry[1]
+            if entry is not None:
+                self._discard(key)
+                self._expired.inc()
+            else:
+                self._misses.inc()
+            self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        size = self.sizeof(value) if self.maxbytes is not None else 0
+        if self.maxbytes is not None and size > self.maxbytes:
+            return  # 单个值超过整个缓存的容量，不缓存
+        with self._lock:
+            self._discard(key)
+            self._data[key] = (expires, value, size)
+            self.nbytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self.nbytes > self.maxbytes):
+                _, (_, _, evicted) = self._data.popitem(last=False)
+                self.nbytes -= evicted
+                self._evictions.inc()
+            self._entries.set(len(self._data))
+            self._bytes.set(self.nbytes)
+
+    def _discard(self, key: Hashable):
+        """删除条目并更新统计（调用方持有锁）"""
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[2]
+            self._entries.set(len(self._data))
+            self._bytes.set(self.nbytes)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        命中直接返回，否则调用 loader 加载并缓存（loader 返回 None 时不缓存，如知识库不存在）
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = loader()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+            self._entries.set(0)
+            self._bytes.set(0)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
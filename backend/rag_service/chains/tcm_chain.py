@@ -2,14 +2,14 @@ from langchain_core.runnables import RunnablePassthrough
 from langchain_core.prompts import ChatPromptTemplate  
 from langchain_core.output_parsers import StrOutputParser  
 from langchain_community.llms.tongyi import Tongyi  
-from ..retriever import get_retriever  
+from ..retriever import aretrieve, get_retriever  
+from ..metrics import observe_stage
 
 def format_docs(docs):  
     return "\n\n".join(doc.page_content for doc in docs)  
 
-def create_rag_chain():  
+def create_answer_chain():  
     llm = Tongyi(model_name="qwen-plus")  
-    retriever = get_retriever()  
     
     prompt_template = """  
     你是一个专业的中医助手，请根据以下中医知识库内容回答问题：  
@@ -26,14 +26,30 @@ def create_rag_chain():
     
     prompt = ChatPromptTemplate.from_template(prompt_template)  
     
+    return prompt | llm | StrOutputParser()  
+
+def create_rag_chain():  
+    retriever = get_retriever()  
+    
     return (  
         {"context": retriever | format_docs, "question": RunnablePassthrough()}  
-        | prompt  
-        | llm  
-        | StrOutputParser()  
+        | create_answer_chain()  
     )  
 
-async def get_rag_response(question: str):  
-    chain = create_rag_chain()  
-    response = await chain.ainvoke(question)  
-    return {"answer": response}  
\ No newline at end of file
+async def get_rag_response(question: str, chat_history: list = None):  
+    # 检索和生成分开执行，分别统计 retrieve / llm 阶段耗时
+    # 检索的 embedding 和 Milvus 调用都是阻塞的，分别在 embedding / 向量库线程池中执行
+    with observe_stage("retrieve"):
+        docs = await aretrieve(question)  
+    
+    chain = create_answer_chain()  
+    with observe_stage("llm"):
+        response = await chain.ainvoke({"context": format_docs(docs), "question": question})  
+    
+    return {  
+        "answer": response,  
+        "source_documents": [  
+            {"content": doc.page_content, "metadata": doc.metadata}  
+            for doc in docs  
+        ]  
+    }  
@@ -0,0 +1,191 @@
+"""
+入库分块近似去重（MinHash + LSH）
+
+同一部经典的不同版本、重印本切出的分块往往只差几个字或标点，
+全部入库既浪费向量库内存，又会让 top-k 检索结果被同一段内容占满。
+
+- MinHasher: 去掉空白和标点后取字符 k-gram，计算 MinHash 签名（NumPy 向量化）
+- MinHashLSH: 把签名分成 b 个 band，任一 band 完全相同即为候选，查询开销与已入库数量无关
+- Deduplicator: 候选再用签名估计 Jaccard 相似度，超过阈值视为重复，返回已有的规范分块
+"""
+
+import re
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .metrics import counter
+
+DEDUP_CHUNKS = counter("rag_dedup_chunks_total", "入库去重检查的分块数", ["result"])
+
+# 计算签名前去掉的字符：空白、标点和符号（版本差异常见于句读和排版）
+_NORMALIZE_RE = re.compile(r"[\s\W_]+")
+_SHINGLE_BASE = np.uint64(1_000_003)
+
+
+def normalize(text: str) -> str:
+    return _NORMALIZE_RE.sub("", text)
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        """
+        Args:
+            num_perm: 签名长度（哈希函数个数），越大 Jaccard 估计越准，内存为 4 * num_perm 字节/分块
+            shingle_size: 字符 k-gram 的长度
+            seed: 哈希函数的随机种子，同一索引内必须保持一致
+        """
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # multiply-shift 哈希族：h(x) = (a * x + b) mod 2^64 >> 32，a 为奇数
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    def shingle_hashes(self, text: str) -> np.ndarray:
+        """归一化文本的 k-gram 多项式哈希（去重后）"""
+        codes = np.frombuffer(normalize(text).encode("utf-32-le"), dtype="<u4").astype(np.uint64)
+        if codes.size == 0:
+            return codes
+        k = min(self.shingle_size, codes.size)
+        hashes = np.zeros(codes.size - k + 1, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for j in range(k):
+                hashes = hashes * _SHINGLE_BASE + codes[j:codes.size - k + 1 + j]
+        return np.unique(hashes)
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash 签名（uint32 数组）；空文本返回全为最大值的签名"""
+        hashes = self.shingle_hashes(text)
+        if hashes.size == 0:
+            return np.full(self.num_perm, np.iinfo(np.uint32).max, dtype=np.uint32)
+        with np.errstate(over="ignore"):
+            values = (self._a[:, None] * hashes[None, :] + self._b[:, None]) >> np.uint64(32)
+        return values.min(axis=1).astype(np.uint32)
+
+
+def jaccard(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """用两个 MinHash 签名估计 Jaccard 相似度"""
+    return float(np.mean(sig_a == sig_b))
+
+
+def optimal_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    选择 band 数 b 和每个 band 的行数 r，使阈值两侧的误判面积（假阳性 + 假阴性）最小
+
+    两个签名被选为候选的概率为 1 - (1 - s^r)^b（s 为 Jaccard 相似度）
+    """
+    grid = np.linspace(0.0, 1.0, 201)
+    step = grid[1] - grid[0]
+    best, best_error = (1, num_perm), float("inf")
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        probability = 1.0 - (1.0 - grid ** rows) ** bands
+        below, above = grid <= threshold, grid > threshold
+        error = (probability[below].sum() + (1.0 - probability[above]).sum()) * step
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class MinHashLSH:
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128):
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+        self._buckets: List[Dict[bytes, Set[Hashable]]] = [{} for _ in range(self.bands)]
+        self._keys: Dict[Hashable, List[bytes]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            signature[i * self.rows:(i + 1) * self.rows].tobytes()
+            for i in range(self.bands)
+        ]
+
+    def insert(self, key: Hashable, signature: np.ndarray):
+        band_keys = self._band_keys(signature)
+        self._keys[key] = band_keys
+        for bucket, band_key in zip(self._buckets, band_keys):
+            bucket.setdefault(band_key, set()).add(key)
+
+    def remove(self, key: Hashable):
+        for bucket, band_key in zip(self._buckets, self._keys.pop(key, [])):
+            members = bucket.get(band_key)
+            if members:
+                members.discard(key)
+                if not members:
+                    del bucket[band_key]
+
+    def query(self, signature: np.ndarray) -> Set[Hashable]:
+        candidates: Set[Hashable] = set()
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(band_key, ()))
+        return candidates
+
+
+class Deduplicator:
+    """
+    近似重复分块检测
+
+    用法：
+        key, signature = dedup.check(text)
+        if key is None:  # 新内容，写入向量库后登记
+            dedup.add(vector_id, signature)
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle_size, seed)
+        self.lsh = MinHashLSH(threshold, num_perm)
+        self._signatures: Dict[Hashable, np.ndarray] = {}
+        self.checked = 0
+        self.duplicates = 0
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def check(self, text: str) -> Tuple[Optional[Hashable], np.ndarray]:
+        """
+        Returns:
+            (key, signature): key 为最相似且超过阈值的已登记分块，没有则为 None
+        """
+        signature = self.hasher.signature(text)
+        best_key, best_score = None, self.threshold
+        for key in self.lsh.query(signature):
+            score = jaccard(signature, self._signatures[key])
+            if score >= best_score:
+                best_key, best_score = key, score
+        self.checked += 1
+        if best_key is not None:
+            self.duplicates += 1
+        DEDUP_CHUNKS.labels(result="duplicate" if best_key is not None else "unique").inc()
+        return best_key, signature
+
+    def add(self, key: Hashable, signature: np.ndarray):
+        self._signatures[key] = signature
+        self.lsh.insert(key, signature)
+
+    def remove(self, key: Hashable):
+        if self._signatures.pop(key, None) is not None:
+            self.lsh.remove(key)
+
+    def rename(self, old_key: Hashable, new_key: Hashable):
+        """分块写入向量库拿到主键后，把临时键替换为向量主键"""
+        signature = self._signatures.get(old_key)
+        if signature is not None:
+            self.remove(old_key)
+            self.add(new_key, signature)
+
+    @property
+    def dedup_ratio(self) -> float:
+        """检查过的分块中被判为重复的比例"""
+        return self.duplicates / self.checked if self.checked else 0.0
+
+    def report(self) -> Dict:
+        return {
+            "chunks": self.checked,
+            "unique": self.checked - self.duplicates,
+            "duplicates": self.duplicates,
+            "dedup_ratio": self.dedup_ratio,
+        }
@@ -0,0 +1,345 @@
+"""
+共享 embedding 服务（Unix socket）
+
+多个 uvicorn worker 和 Django 进程各自加载一份 text2vec 模型（large 模型约 1.3 GB），限制了单机能跑的 worker 数。
+embedding 服务在本机单独运行一个进程加载模型，各进程通过 Unix socket 请求向量：
+- 服务端把所有连接的请求合并成批（最多 max_batch 条文本，或最多等待 max_wait_ms），一次调用模型；
+  查询请求优先于入库文档组批，入库的大批量请求按 max_batch 拆开，不会让查询排在整批入库之后
+- 客户端 RemoteEmbeddings 实现 embed_query / embed_documents，进程内不加载模型（不导入 torch）
+- 同一服务可加载多个模型，请求按模型名路由
+
+协议：请求为 4 字节长度（大端）+ JSON {"op": "embed", "model", "kind": "query"|"documents", "texts"}；
+响应为 4 字节头部长度 + 4 字节数据长度 + JSON 头部 {"ok", "n", "dim"} 或 {"ok": false, "error"}
++ n * dim 个 float32（小端）。{"op": "stats"} 返回各模型的批次统计。
+
+查询和文档用同一次 embed_documents 计算（本项目的 huggingface / onnx / hash 引擎对两者的计算相同）。
+
+用法（在 backend 目录下）:
+    python -m rag_service.embedding_server --socket /tmp/rag_embedding.sock \\
+        --model huggingface:GanymedeNil/text2vec-large-chinese --model huggingface:shibing624/text2vec-base-chinese
+然后 worker 配置 EMBEDDING_ENGINE=remote、EMBEDDING_SERVER_SOCKET=/tmp/rag_embedding.sock，
+Django / rag_service.retriever 设置环境变量 EMBEDDING_SERVER_SOCKET 即可。
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = histogram(
+    "rag_embedding_server_batch_size", "embedding 服务每次调用模型的文本数", ["model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+QUEUE_SECONDS = histogram(
+    "rag_embedding_server_queue_seconds", "请求在 embedding 服务中等待组批的时间（秒）", ["model", "kind"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+_REQUEST_HEADER = struct.Struct(">I")
+_RESPONSE_HEADER = struct.Struct(">II")
+KINDS = ("query", "documents")  # 组批时的优先顺序
+
+
+class EmbeddingServerError(RuntimeError):
+    """embedding 服务返回错误（如模型未加载、推理异常）"""
+
+
+class _Batcher:
+    """单个模型的组批队列，模型调用在专用线程中串行执行"""
+
+    def __init__(self, name: str, embeddings, max_batch: int, max_wait: float):
+        self.name = name
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queues = {kind: deque() for kind in KINDS}
+        self.wakeup = asyncio.Event()
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix=f"embed-{name}")
+        self.batches = 0
+        self.texts = 0
+
+    def pending(self) -> int:
+        return sum(len(item[0]) for queue in self.queues.values() for item in queue)
+
+    async def embed(self, kind: str, texts: List[str]) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for start in range(0, len(texts), self.max_batch):
+            future = loop.create_future()
+            self.queues[kind].append((texts[start:start + self.max_batch], future, kind, loop.time()))
+            futures.append(future)
+        self.wakeup.set()
+        return np.concatenate(await asyncio.gather(*futures))
+
+    def _take(self) -> List[Tuple]:
+        """按优先顺序取出一批（至少一个请求，总文本数不超过 max_batch）"""
+        batch, size = [], 0
+        for kind in KINDS:
+            queue = self.queues[kind]
+            while queue and (not batch or size + len(queue[0][0]) <= self.max_batch):
+                item = queue.popleft()
+                batch.append(item)
+                size += len(item[0])
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.wakeup.wait()
+            if self.pending() < self.max_batch:
+                await asyncio.sleep(self.max_wait)  # 等待其他请求凑批
+            batch = self._take()
+            if not self.pending():
+                self.wakeup.clear()
+            if not batch:
+                continue
+
+            now = loop.time()
+            for _, _, kind, enqueued in batch:
+                QUEUE_SECONDS.labels(model=self.name, kind=kind).observe(now - enqueued)
+            texts = [text for item in batch for text in item[0]]
+            BATCH_SIZE.labels(model=self.name).observe(len(texts))
+            try:
+                vectors = await loop.run_in_executor(self.executor, self.embeddings.embed_documents, texts)
+                vectors = np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+            except Exception as exc:
+                logger.exception("embedding 计算失败（模型 %s，%d 条）", self.name, len(texts))
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            offset = 0
+            for item_texts, future, _, _ in batch:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    def stats(self) -> Dict:
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "mean_batch_size": self.texts / self.batches if self.batches else 0.0,
+            "pending": self.pending(),
+        }
+
+
+class EmbeddingServer:
+    def __init__(self, models: Dict[str, object], max_batch: int = 64, max_wait_ms: float = 5.0):
+        """
+        Args:
+            models: {模型名: embedding 对象}，客户端按模型名请求
+            max_batch: 每次调用模型的最大文本数
+            max_wait_ms: 不足一批时最多等待其他请求的毫秒数
+        """
+        self.models = models
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.batchers: Dict[str, _Batcher] = {}
+        self._tasks = []
+        self._writers = set()
+
+    async def serve(self, socket_path: str, ready: threading.Event = None):
+        """在 socket_path 上监听，直到任务被取消"""
+        self.batchers = {
+            name: _Batcher(name, embeddings, self.max_batch, self.max_wait)
+            for name, embeddings in self.models.items()
+        }
+        self._tasks = [asyncio.create_task(batcher.run()) for batcher in self.batchers.values()]
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # 上次异常退出留下的 socket 文件
+        server = await asyncio.start_unix_server(self._handle, path=socket_path)
+        os.chmod(socket_path, 0o660)
+        logger.info("embedding 服务监听 %s，模型: %s", socket_path, ", ".join(self.models))
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            for writer in list(self._writers):
+                writer.close()
+            for batcher in self.batchers.values():
+                batcher.executor.shutdown(wait=False)
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    (size,) = _REQUEST_HEADER.unpack(await reader.readexactly(_REQUEST_HEADER.size))
+                    request = json.loads(await reader.readexactly(size))
+                except asyncio.IncompleteReadError:
+                    break
+                header, payload = await self._dispatch(request)
+                encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+                writer.write(_RESPONSE_HEADER.pack(len(encoded), len(payload)) + encoded + payload)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _dispatch(self, request: Dict) -> Tuple[Dict, bytes]:
+        op = request.get("op")
+        if op == "stats":
+            return {"ok": True, "stats": {name: batcher.stats() for name, batcher in self.batchers.items()}}, b""
+        if op != "embed":
+            return {"ok": False, "error": f"unknown op: {op}"}, b""
+        batcher = self.batchers.get(request.get("model"))
+        if batcher is None:
+            return {"ok": False, "error": f"model not loaded: {request.get('model')}"}, b""
+        kind = request.get("kind") if request.get("kind") in KINDS else "documents"
+        texts = request.get("texts") or []
+        if not texts:
+            return {"ok": True, "n": 0, "dim": 0}, b""
+        try:
+            vectors = await batcher.embed(kind, texts)
+        except Exception as exc:
+            return {"ok": False, "error": f"{type(exc).__name__}: {exc}"}, b""
+        vectors = np.ascontiguousarray(vectors, dtype="<f4")
+        return {"ok": True, "n": vectors.shape[0], "dim": vectors.shape[1]}, vectors.tobytes()
+
+
+class RemoteEmbeddings:
+    """
+    embedding 服务的客户端，接口与 langchain Embeddings 相同
+
+    每个线程一个连接（调用方在线程池中并发调用），连接断开时重连一次（如服务重启）。
+    """
+
+    def __init__(self, model_name: str, socket_path: str, timeout: float = 60.0, batch_size: int = 256):
+        """
+        Args:
+            model_name: 服务端加载的模型名
+            socket_path: 服务监听的 Unix socket 路径
+            timeout: 单次请求的超时（秒）
+            batch_size: embed_documents 每次请求的最大文本数
+        """
+        self.model_name = model_name
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout)
+            conn.connect(self.socket_path)
+            self._local.conn = conn
+        return conn
+
+    def _close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @staticmethod
+    def _read(conn: socket.socket, size: int) -> bytes:
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        received = 0
+        while received < size:
+            n = conn.recv_into(view[received:])
+            if n == 0:
+                raise ConnectionError("embedding 服务关闭了连接")
+            received += n
+        return bytes(buffer)
+
+    def request(self, payload: Dict) -> Tuple[Dict, bytes]:
+        encoded = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        message = _REQUEST_HEADER.pack(len(encoded)) + encoded
+        for attempt in (0, 1):
+            try:
+                conn = self._connection()
+                conn.sendall(message)
+                header_size, data_size = _RESPONSE_HEADER.unpack(self._read(conn, _RESPONSE_HEADER.size))
+                header = json.loads(self._read(conn, header_size))
+                return header, self._read(conn, data_size)
+            except (ConnectionError, socket.timeout, OSError):
+                self._close()
+                if attempt:
+                    raise
+
+    def _embed(self, kind: str, texts: List[str]) -> np.ndarray:
+        header, data = self.request({"op": "embed", "model": self.model_name, "kind": kind, "texts": texts})
+        if not header.get("ok"):
+            raise EmbeddingServerError(header.get("error"))
+        return np.frombuffer(data, dtype="<f4").reshape(header["n"], header["dim"])
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed("query", [text])[0].tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed("documents", texts[start:start + self.batch_size]).tolist())
+        return vectors
+
+    def stats(self) -> Dict:
+        header, _ = self.request({"op": "stats"})
+        return header.get("stats", {})
+
+
+def parse_model(spec: str) -> Tuple[str, str]:
+    """engine:model，如 huggingface:shibing624/text2vec-base-chinese；省略引擎时为 huggingface"""
+    engine, sep, model = spec.partition(":")
+    return (engine, model) if sep else ("huggingface", spec)
+
+
+def main():
+    from .embeddings import create_embeddings
+
+    parser = argparse.ArgumentParser(description="共享 embedding 服务")
+    parser.add_argument("--socket", default="/tmp/rag_embedding.sock", help="Unix socket 路径")
+    parser.add_argument("--model", action="append", required=True, help="engine:model，可重复指定多个")
+    parser.add_argument("--max-batch", type=int, default=64, help="每次调用模型的最大文本数")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="不足一批时最多等待的毫秒数")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    models = {}
+    for spec in args.model:
+        engine, model = parse_model(spec)
+        models[model] = create_embeddings(model, engine=engine)
+        models[model].embed_documents(["预热"])
+    server = EmbeddingServer(models, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+
+    async def run():
+        task = asyncio.create_task(server.serve(args.socket))
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, task.cancel)
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Embedding 模型封装
+
+- InstrumentedEmbeddings: 包装任意实现了 embed_query / embed_documents 的 embedding 对象，
+  为每次调用记录 embed_query / embed_documents 阶段耗时
+- HashEmbeddings: 确定性的哈希向量，离线基准测试用
+- OnnxEmbeddings: 用 ONNX Runtime 运行导出的 text2vec 模型（可选 int8 动态量化，见 onnx_export.py）
+- create_embeddings(): 按配置的引擎创建模型（remote 引擎为共享 embedding 服务的客户端，见 embedding_server.py）
+- check_parity(): 比较两个引擎对同一批文本的输出（逐条余弦相似度）
+"""
+
+import os
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .metrics import counter, observe_stage
+
+EMBEDDED_TEXTS = counter("rag_embedded_texts_total", "已计算 embedding 的文本条数", ["kind"])
+
+
+class InstrumentedEmbeddings:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def embed_query(self, text: str) -> List[float]:
+        with observe_stage("embed_query"):
+            vector = self.embeddings.embed_query(text)
+        EMBEDDED_TEXTS.labels(kind="query").inc()
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with observe_stage("embed_documents"):
+            vectors = self.embeddings.embed_documents(texts)
+        EMBEDDED_TEXTS.labels(kind="document").inc(len(texts))
+        return vectors
+
+    def __getattr__(self, name):
+        # 其余属性（model_name 等）透传给被包装的模型
+        return getattr(self.embeddings, name)
+
+
+class HashEmbeddings:
+    """
+    确定性的轻量 embedding：把字符 unigram/bigram 哈希到固定维度后做 L2 归一化
+
+    不需要下载模型，同样的输入在任何进程中都得到同样的向量，
+    用于离线基准测试和本地开发（检索质量远低于真实模型）
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for n in (1, 2):
+            for i in range(len(text) - n + 1):
+                vector[zlib.crc32(text[i:i + n].encode("utf-8")) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+
+class OnnxEmbeddings:
+    """
+    ONNX Runtime 推理的 text2vec 模型
+
+    与 HuggingFaceEmbeddings（sentence-transformers）输出一致：最后一层隐状态按 attention mask 做 mean pooling，
+    不做归一化。批量计算时按长度排序后分批，减少 padding。
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        quantized: bool = False,
+        intra_op_threads: int = 0,
+        inter_op_threads: int = 1,
+        batch_size: int = 32,
+        max_length: int = 512
+    ):
+        """
+        Args:
+            model_dir: onnx_export 导出的目录（包含 model.onnx / model.int8.onnx 和分词器文件）
+            quantized: 是否使用 int8 动态量化的模型
+            intra_op_threads: 单个算子使用的线程数，0 表示由 ONNX Runtime 决定（物理核数）
+            inter_op_threads: 算子间并行的线程数
+            batch_size: embed_documents 每批的文本数
+            max_length: 最大 token 数，超出截断
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_file = os.path.join(model_dir, "model.int8.onnx" if quantized else "model.onnx")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.model_file = model_file
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        feeds = {name: value.astype(np.int64) for name, value in inputs.items() if name in self.input_names}
+        hidden = self.session.run(None, feeds)[0]
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._encode([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+
+def check_parity(reference, candidate, texts: List[str], min_cosine: float = 0.99) -> Dict:
+    """
+    比较两个 embedding 引擎的输出
+
+    Returns:
+        dict: 逐条余弦相似度的最小值/平均值，以及是否全部不低于 min_cosine
+    """
+    a = np.asarray(reference.embed_documents(texts), dtype=np.float64)
+    b = np.asarray(candidate.embed_documents(texts), dtype=np.float64)
+    cosine = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    return {
+        "texts": len(texts),
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "passed": bool(cosine.min() >= min_cosine),
+    }
+
+
+def create_embeddings(model_name: str, engine: str = "huggingface", **options):
+    """
+    按引擎创建 embedding 模型
+
+    Args:
+        model_name: HuggingFace 模型名，如 shibing624/text2vec-base-chinese；
+            onnx 引擎为导出目录（见 rag_service.onnx_export）
+        engine: huggingface（PyTorch，默认）、onnx（ONNX Runtime）、hash（确定性哈希向量，离线测试用）
+            或 remote（请求本机的共享 embedding 服务，进程内不加载模型）
+        options: onnx 引擎的参数，见 OnnxEmbeddings；remote 引擎的 socket_path / timeout，见 RemoteEmbeddings
+    """
+    if engine == "hash":
+        return HashEmbeddings()
+    if engine == "remote":
+        from .embedding_server import RemoteEmbeddings
+        return RemoteEmbeddings(model_name, **options)
+    if engine == "onnx":
+        return OnnxEmbeddings(model_name, **options)
+    if engine == "huggingface":
+        try:
+            from langchain_community.embeddings.huggingface import HuggingFaceEmbeddings
+        except ImportError:
+            from langchain.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_name)
+    raise ValueError(f"Unknown embedding engine: {engine}")
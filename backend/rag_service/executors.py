@@ -0,0 +1,225 @@
+"""
+阻塞调用的有界线程池
+
+embedding 计算（CPU）和向量库调用（pymilvus 阻塞 I/O）都是同步的，直接在 async 接口里调用会卡住整个事件循环。
+这里提供两个按资源类型划分的线程池，所有 RAG 服务共用：
+- embedding: CPU 密集，线程数默认不超过物理核数的一半（模型推理本身还会用多线程）
+- vector_store: I/O 密集，线程数可以较多
+
+每个线程池分 query / ingest 两条通道：
+- 空闲线程总是先取 query 通道的任务
+- ingest 通道同时占用的线程数有上限，始终给查询留出线程，批量入库不会饿死查询
+- 每条通道排队的任务数有上限，超出时立即抛出 ExecutorBusy（接口返回 503），而不是无限排队
+队列深度、运行中任务数、排队耗时和拒绝次数导出到 /metrics。
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+from .metrics import counter, gauge, histogram
+
+QUERY = "query"
+INGEST = "ingest"
+EMBEDDING_POOL = "embedding"
+VECTOR_STORE_POOL = "vector_store"
+
+QUEUE_DEPTH = gauge("rag_executor_queue_depth", "线程池排队中的任务数", ["pool", "lane"])
+ACTIVE_TASKS = gauge("rag_executor_active_tasks", "线程池运行中的任务数", ["pool", "lane"])
+WAIT_SECONDS = histogram("rag_executor_wait_seconds", "任务在线程池中的排队耗时（秒）", ["pool", "lane"],
+                         buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+REJECTED = counter("rag_executor_rejected_total", "因排队已满被拒绝的任务数", ["pool", "lane"])
+
+
+class ExecutorBusy(RuntimeError):
+    """通道排队已满"""
+
+
+class _Lane:
+    def __init__(self, pool: str, name: str, max_active: int, max_queue: int):
+        self.name = name
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.pending = deque()
+        self.active = 0
+        self.depth_gauge = QUEUE_DEPTH.labels(pool=pool, lane=name)
+        self.active_gauge = ACTIVE_TASKS.labels(pool=pool, lane=name)
+        self.wait_histogram = WAIT_SECONDS.labels(pool=pool, lane=name)
+        self.rejected = REJECTED.labels(pool=pool, lane=name)
+
+
+class BoundedExecutor:
+    def __init__(self, name: str, workers: int, lanes: Dict[str, Tuple[int, int]]):
+        """
+        Args:
+            name: 线程池名称（指标标签）
+            workers: 线程数
+            lanes: 通道名 → (最多同时运行的任务数, 最多排队的任务数)，按优先级从高到低排列
+        """
+        self.name = name
+        self.workers = workers
+        self._lanes = {lane: _Lane(name, lane, *limits) for lane, limits in lanes.items()}
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, lane: str, fn: Callable, *args, **kwargs) -> Future:
+        """提交任务（在调用方的 contextvars 上下文中执行，阶段耗时仍计入当前请求）"""
+        future = Future()
+        context = contextvars.copy_context()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError(f"executor {self.name} is shut down")
+            target = self._lanes[lane]
+            if len(target.pending) >= target.max_queue:
+                target.rejected.inc()
+                raise ExecutorBusy(f"{self.name}/{lane} 排队已满（{target.max_queue}）")
+            target.pending.append((future, context, fn, args, kwargs, time.perf_counter()))
+            target.depth_gauge.set(len(target.pending))
+            self._cond.notify()
+        return future
+
+    async def run(self, lane: str, fn: Callable, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(lane, fn, *args, **kwargs))
+
+    def _next(self) -> Optional[tuple]:
+        for lane in self._lanes.values():
+            if lane.pending and lane.active < lane.max_active:
+                item = lane.pending.popleft()
+                lane.active += 1
+                lane.depth_gauge.set(len(lane.pending))
+                lane.active_gauge.set(lane.active)
+                return lane, item
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                task = self._next()
+                while task is None:
+                    if self._shutdown:
+                        return
+                    self._cond.wait()
+                    task = self._next()
+            lane, (future, context, fn, args, kwargs, queued_at) = task
+            lane.wait_histogram.observe(time.perf_counter() - queued_at)
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(context.run(fn, *args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+            with self._cond:
+                lane.active -= 1
+                lane.active_gauge.set(lane.active)
+                # 通道释放了名额，可能有其他线程在等这条通道的任务
+                self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                lane.name: {"queued": len(lane.pending), "active": lane.active, "max_active": lane.max_active}
+                for lane in self._lanes.values()
+            }
+
+    def shutdown(self, wait: bool = True):
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+_executors: Dict[str, BoundedExecutor] = {}
+_lock = threading.Lock()
+_config = {}
+
+
+def _ingest_limit(workers: int, share: float) -> int:
+    """ingest 通道可同时占用的线程数：按比例，至少 1 个，并至少给查询留 1 个线程"""
+    limit = max(1, int(workers * share))
+    return min(limit, workers - 1) if workers > 1 else 1
+
+
+def configure(
+    embedding_workers: Optional[int] = None,
+    vector_store_workers: Optional[int] = None,
+    ingest_share: float = 0.5,
+    max_queue: int = 256,
+    ingest_max_queue: int = 32
+):
+    """
+    设置线程池大小和通道限制，需在第一次使用线程池之前调用
+
+    Args:
+        embedding_workers: embedding 线程数，默认为 CPU 核数的一半（至少 1）
+        vector_store_workers: 向量库调用线程数，默认 16
+        ingest_share: ingest 通道最多占用的线程比例
+        max_queue: query 通道最多排队的任务数
+        ingest_max_queue: ingest 通道最多排队的任务数
+    """
+    _config.update(
+        embedding_workers=embedding_workers,
+        vector_store_workers=vector_store_workers,
+        ingest_share=ingest_share,
+        max_queue=max_queue,
+        ingest_max_queue=ingest_max_queue,
+    )
+
+
+def _create(name: str) -> BoundedExecutor:
+    if name == EMBEDDING_POOL:
+        workers = _config.get("embedding_workers") or max(1, (os.cpu_count() or 2) // 2)
+    else:
+        workers = _config.get("vector_store_workers") or 16
+    share = _config.get("ingest_share", 0.5)
+    return BoundedExecutor(name, workers, {
+        QUERY: (workers, _config.get("max_queue", 256)),
+        INGEST: (_ingest_limit(workers, share), _config.get("ingest_max_queue", 32)),
+    })
+
+
+def get_executor(name: str) -> BoundedExecutor:
+    executor = _executors.get(name)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(name)
+            if executor is None:
+                executor = _executors[name] = _create(name)
+    return executor
+
+
+async def run_embedding(lane: str, fn: Callable, *args, **kwargs):
+    """在 embedding 线程池中执行（如 embeddings.embed_query）"""
+    return await get_executor(EMBEDDING_POOL).run(lane, fn, *args, **kwargs)
+
+
+def call_embedding(lane: str, fn: Callable, *args, **kwargs):
+    """
+    在其他线程池的任务中（如持有知识库写入锁的向量库任务）同步调用 embedding 线程池并等待结果，
+    CPU 计算仍受 embedding 线程池的线程数和通道限制；不能在事件循环中调用
+    """
+    return get_executor(EMBEDDING_POOL).submit(lane, fn, *args, **kwargs).result()
+
+
+async def run_vector_store(lane: str, fn: Callable, *args, **kwargs):
+    """在向量库线程池中执行（如 similarity_search_by_vector / 写入已计算好的向量 / delete）"""
+    return await get_executor(VECTOR_STORE_POOL).run(lane, fn, *args, **kwargs)
+
+
+def shutdown(wait: bool = True):
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait)
@@ -0,0 +1,116 @@
+"""
+检索过滤条件下推
+
+每个分块都带有以下标量字段，检索时把请求中的过滤条件翻译成向量库原生的过滤表达式，
+只在满足条件的子集内做相似度计算，过滤后仍能返回完整的 k 条结果（而不是先取 k 条再丢弃）：
+- category: 类别
+- doc_type: 文档类型
+- kb_id: 所属知识库
+- tags: 标签，编码为 "|标签1|标签2|" 形式的字符串，用 like "%|标签|%" 匹配（langchain 的 Milvus
+  按第一批元数据推断 schema，不支持列表类型）。like 的中缀匹配和转义需要 Milvus 2.3 及以上，
+  2.2 只支持前缀匹配；标签中的 %、_ 转义后按字面匹配
+
+过滤条件统一为 dict：{"category": str, "doc_type": str, "kb_id": str, "tags": [str, ...], "ids": [主键, ...]}，
+tags 要求同时包含所有给定标签；ids 限定在给定主键的分块中检索（如文档某个历史版本的分块）。
+
+这些字段加入之前创建的 Milvus collection 没有对应的列（写入时多余的元数据被丢弃），
+用 app.services.vector_store.missing_filter_fields 检测，按这些字段过滤时结果为空。
+"""
+
+import json
+from typing import Dict, Iterable, List, Optional
+
+SCALAR_FIELDS = ("category", "doc_type", "kb_id")
+FILTER_FIELDS = SCALAR_FIELDS + ("tags",)
+TAG_SEPARATOR = "|"
+MIN_MILVUS_VERSION = (2, 3)  # tags 的 like 中缀匹配需要的 Milvus 服务端版本
+
+
+def encode_tags(tags: Optional[Iterable[str]]) -> str:
+    tags = [tag for tag in (tags or []) if tag]
+    if not tags:
+        return ""
+    return TAG_SEPARATOR + TAG_SEPARATOR.join(tags) + TAG_SEPARATOR
+
+
+def decode_tags(value) -> List[str]:
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [tag for tag in (value or "").split(TAG_SEPARATOR) if tag]
+
+
+def chunk_fields(metadata: Dict) -> Dict:
+    """分块写入向量库时附加的标量过滤字段（缺省为空字符串，Milvus 不接受空值）"""
+    fields = {name: str(metadata.get(name) or "") for name in SCALAR_FIELDS}
+    fields["tags"] = encode_tags(decode_tags(metadata.get("tags")))
+    return fields
+
+
+def restore_fields(metadata: Dict) -> Dict:
+    """检索结果的元数据：标签还原为列表"""
+    if "tags" in metadata:
+        return {**metadata, "tags": decode_tags(metadata["tags"])}
+    return metadata
+
+
+def build_filters(
+    category: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+    doc_type: Optional[str] = None,
+    kb_id: Optional[str] = None
+) -> Dict:
+    """由请求参数构造过滤条件，未指定的条件不出现在结果中"""
+    filters = {
+        name: value
+        for name, value in (("category", category), ("doc_type", doc_type), ("kb_id", kb_id))
+        if value
+    }
+    if tags:
+        filters["tags"] = list(tags)
+    return filters
+
+
+def _quote(value: str) -> str:
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _like_escape(value: str) -> str:
+    """转义 like 模式中的通配符，标签按字面匹配"""
+    return str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def to_milvus_expr(filters: Optional[Dict], pk_field: str = "pk") -> Optional[str]:
+    """
+    翻译为 Milvus 布尔表达式，如 category == "方剂" and tags like "%|伤寒|%"
+
+    Args:
+        filters: 过滤条件
+        pk_field: 主键字段名（ids 条件使用；Milvus 自增主键为 int64，字符串形式的数字转换回整数）
+
+    Returns:
+        Optional[str]: 没有过滤条件时为 None
+    """
+    if not filters:
+        return None
+    clauses = [f"{name} == {_quote(filters[name])}" for name in SCALAR_FIELDS if filters.get(name)]
+    clauses.extend(
+        f"tags like {_quote('%' + TAG_SEPARATOR + _like_escape(tag) + TAG_SEPARATOR + '%')}"
+        for tag in filters.get("tags") or []
+    )
+    if filters.get("ids") is not None:
+        keys = [int(pk) if str(pk).lstrip("-").isdigit() else str(pk) for pk in filters["ids"]]
+        clauses.append(f"{pk_field} in {json.dumps(keys, ensure_ascii=False)}")
+    return " and ".join(clauses) or None
+
+
+def matches(metadata: Dict, filters: Optional[Dict]) -> bool:
+    """单条元数据是否满足过滤条件（与 to_milvus_expr 语义一致）"""
+    if not filters:
+        return True
+    for name in SCALAR_FIELDS:
+        if filters.get(name) and metadata.get(name) != filters[name]:
+            return False
+    if filters.get("ids") is not None and str(metadata.get("pk")) not in {str(pk) for pk in filters["ids"]}:
+        return False
+    tags = set(decode_tags(metadata.get("tags")))
+    return all(tag in tags for tag in filters.get("tags") or [])
@@ -0,0 +1,332 @@
+"""
+异步入库任务
+
+长文档的切分、embedding 和写入放在 HTTP 请求里同步执行，会超时并长时间占用 worker。
+入库接口改为提交任务后立即返回 202 和任务ID，由后台的入库 worker 执行，客户端轮询任务状态：
+- 任务保存在 MongoDB 的 ingest_jobs 集合中（进程重启不丢失，同一数据库的所有 uvicorn worker 共享队列）
+- 每个 worker 用 find_one_and_update 原子地认领任务，一次最多认领 batch_size 个，依次执行；
+  只认领有处理函数的任务类型，多个服务共用同一集合时不会抢走彼此的任务
+- 任务存储的读写是同步的 pymongo 调用，worker 在默认线程池中执行它们，不阻塞事件循环
+- 执行中按分块批次上报进度（embedded / total），同时刷新心跳；
+  心跳超过 lease 秒未更新的 running 任务（进程崩溃）重新认领，最多执行 max_attempts 次
+- 处理函数抛出异常时任务失败，错误信息写入任务；入库线程池排队已满（ExecutorBusy）时放回队列稍后重试
+- 完成的任务删除请求数据（文档全文），任务记录在 retention 秒后由 TTL 索引清理
+
+任务状态: queued → running → succeeded / failed。
+进程崩溃后重试的任务可能重复写入已完成的部分分块（至少执行一次）。
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, ReturnDocument
+
+from .executors import ExecutorBusy
+from .metrics import counter, histogram
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+JOBS_TOTAL = counter("rag_ingest_jobs_total", "入库任务结束次数", ["kind", "status"])
+JOB_SECONDS = histogram(
+    "rag_ingest_job_seconds", "入库任务从认领到结束的耗时（秒）", ["kind"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+)
+WAIT_SECONDS = histogram(
+    "rag_ingest_job_wait_seconds", "入库任务从提交到被认领的等待时间（秒）", ["kind"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+# 处理函数: (请求数据, 进度回调) → 结果（如 {"doc_id": ...}）；进度回调可在线程池中调用
+Handler = Callable[[Dict, Callable[[int, int], None]], Awaitable[Dict]]
+
+
+def _log_progress_error(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning("上报入库进度失败: %s", future.exception())
+
+
+class IngestJobStore:
+    def __init__(self, collection, lease: float = 300.0, max_attempts: int = 3, retention: float = 7 * 86400):
+        """
+        Args:
+            collection: MongoDB 集合（ingest_jobs）
+            lease: running 任务的心跳超过该秒数未更新时视为执行它的进程已退出，可被重新认领
+            max_attempts: 每个任务最多认领执行的次数
+            retention: 结束的任务记录保留的秒数
+        """
+        self.collection = collection
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retention = retention
+        self._indexed = False
+
+    def _ensure_indexes(self):
+        if not self._indexed:
+            self.collection.create_index([("status", ASCENDING), ("kind", ASCENDING), ("created_at", ASCENDING)])
+            self.collection.create_index("finished_at", expireAfterSeconds=int(self.retention))
+            self._indexed = True
+
+    def create(self, kind: str, payload: Dict, owner: Optional[str] = None) -> str:
+        """
+        提交任务
+
+        Args:
+            kind: 任务类型（对应 worker 的处理函数）
+            payload: 请求数据（BSON 可序列化）
+            owner: 提交者，查询任务状态时校验
+
+        Returns:
+            str: 任务ID
+        """
+        self._ensure_indexes()
+        now = datetime.utcnow()
+        job_id = ObjectId()
+        self.collection.insert_one({
+            "_id": job_id,
+            "kind": kind,
+            "owner": owner,
+            "status": QUEUED,
+            "payload": payload,
+            "progress": {"embedded": 0, "total": None},
+            "attempts": 0,
+            "error": None,
+            "result": None,
+            "created_at": now,
+            "started_at": None,
+            "heartbeat": None,
+            "finished_at": None,
+        })
+        return str(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """任务状态（不含请求数据），任务ID无效或不存在时返回 None"""
+        try:
+            oid = ObjectId(job_id)
+        except (InvalidId, TypeError):
+            return None
+        return self.collection.find_one({"_id": oid}, {"payload": 0})
+
+    def claim(self, worker: str, limit: int, kinds: Optional[Iterable[str]] = None) -> List[Dict]:
+        """
+        认领最多 limit 个任务（先提交的先执行），包括心跳超时的 running 任务
+
+        超过 max_attempts 的任务直接标记为失败，不返回。
+
+        Args:
+            worker: worker 名称（记录在任务中）
+            limit: 最多认领的任务数
+            kinds: 只认领这些类型的任务，默认不限
+        """
+        self._ensure_indexes()
+        kind_filter = {} if kinds is None else {"kind": {"$in": list(kinds)}}
+        jobs = []
+        while len(jobs) < limit:
+            now = datetime.utcnow()
+            job = self.collection.find_one_and_update(
+                {**kind_filter, "$or": [
+                    {"status": QUEUED},
+                    {"status": RUNNING, "heartbeat": {"$lt": now - timedelta(seconds=self.lease)}},
+                ]},
+                {
+                    "$set": {"status": RUNNING, "worker": worker, "started_at": now, "heartbeat": now},
+                    "$inc": {"attempts": 1},
+                },
+                sort=[("created_at", ASCENDING)],
+                return_document=ReturnDocument.AFTER
+            )
+            if job is None:
+                break
+            if job["attempts"] > self.max_attempts:
+                self.fail(str(job["_id"]), f"执行 {self.max_attempts} 次均未完成（worker 进程退出）", kind=job["kind"])
+                continue
+            WAIT_SECONDS.labels(kind=job["kind"]).observe((now - job["created_at"]).total_seconds())
+            jobs.append(job)
+        return jobs
+
+    def progress(self, job_id: str, embedded: int, total: int):
+        """上报进度并刷新心跳"""
+        self.collection.update_one(
+            {"_id": ObjectId(job_id), "status": RUNNING},
+            {"$set": {"progress": {"embedded": embedded, "total": total}, "heartbeat": datetime.utcnow()}}
+        )
+
+    def succeed(self, job_id: str, result: Optional[Dict] = None, kind: str = ""):
+        self.collection.update_one(
+            {"_id": ObjectId(job_id)},
+            {
+                "$set": {"status": SUCCEEDED, "result": result, "finished_at": datetime.utcnow()},
+                "$unset": {"payload": ""},
+            }
+        )
+        JOBS_TOTAL.labels(kind=kind, status=SUCCEEDED).inc()
+
+    def fail(self, job_id: str, error: str, kind: str = ""):
+        self.collection.update_one(
+            {"_id": ObjectId(job_id)},
+            {"$set": {"status": FAILED, "error": error, "finished_at": datetime.utcnow()}}
+        )
+        JOBS_TOTAL.labels(kind=kind, status=FAILED).inc()
+
+    def release(self, job_id: str):
+        """放回队列（不计入执行次数）"""
+        self.collection.update_one(
+            {"_id": ObjectId(job_id), "status": RUNNING},
+            {"$set": {"status": QUEUED, "heartbeat": None}, "$inc": {"attempts": -1}}
+        )
+
+    def counts(self) -> Dict[str, int]:
+        """排队中和执行中的任务数"""
+        return {
+            status: self.collection.count_documents({"status": status})
+            for status in (QUEUED, RUNNING)
+        }
+
+
+class IngestWorkerPool:
+    def __init__(
+        self,
+        store: IngestJobStore,
+        handlers: Dict[str, Handler],
+        workers: int = 2,
+        batch_size: int = 4,
+        poll_interval: float = 1.0
+    ):
+        """
+        Args:
+            store: 任务存储
+            handlers: 任务类型 → 处理函数
+            workers: 并发的 worker 数（实际的 embedding / 写入并发还受入库线程池通道限制）
+            batch_size: 每个 worker 一次认领的任务数
+            poll_interval: 队列为空时轮询的间隔（秒）；本进程提交的任务通过 notify() 立即唤醒
+        """
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        """在当前事件循环中启动 worker"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._run(f"ingest-{i}")) for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        """停止 worker；执行中的任务被取消后放回队列"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """有新任务提交（可在任意线程调用）"""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _store(self, method: Callable, *args, **kwargs):
+        """在默认线程池中执行任务存储的同步读写"""
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(method, *args, **kwargs))
+
+    def _reporter(self, job_id: str) -> Callable[[int, int], None]:
+        """进度回调：在线程池中调用时直接写入；在事件循环中调用时交给默认线程池，不等待结果"""
+        def report(embedded: int, total: int):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                self.store.progress(job_id, embedded, total)
+                return
+            future = self._loop.run_in_executor(None, self.store.progress, job_id, embedded, total)
+            future.add_done_callback(_log_progress_error)
+        return report
+
+    def _release_claimed(self, claim: asyncio.Future):
+        if not claim.cancelled() and claim.exception() is None:
+            for job in claim.result():
+                self.store.release(str(job["_id"]))
+
+    async def _run(self, worker: str):
+        while True:
+            claim = asyncio.ensure_future(
+                self._store(self.store.claim, worker, self.batch_size, kinds=list(self.handlers))
+            )
+            try:
+                jobs = await asyncio.shield(claim)
+            except asyncio.CancelledError:
+                # 停止时认领还在线程池中进行，完成后把认领到的任务放回队列
+                claim.add_done_callback(self._release_claimed)
+                raise
+            except Exception:
+                logger.exception("认领入库任务失败")
+                jobs = []
+            if not jobs:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            for i, job in enumerate(jobs):
+                try:
+                    busy = await self._execute(job)
+                except asyncio.CancelledError:
+                    # 任务已被取消，不能再 await，直接在当前线程放回队列
+                    for pending in jobs[i:]:
+                        self.store.release(str(pending["_id"]))
+                    raise
+                if busy:
+                    for pending in jobs[i + 1:]:
+                        await self._store(self.store.release, str(pending["_id"]))
+                    await asyncio.sleep(self.poll_interval)
+                    break
+
+    async def _execute(self, job: Dict) -> bool:
+        """
+        执行一个任务
+
+        Returns:
+            bool: 入库线程池排队已满，任务已放回队列
+        """
+        job_id, kind = str(job["_id"]), job["kind"]
+        handler = self.handlers.get(kind)
+        if handler is None:
+            await self._store(self.store.fail, job_id, f"未知的任务类型: {kind}", kind=kind)
+            self.failed += 1
+            return False
+
+        started = time.perf_counter()
+        try:
+            result = await handler(job["payload"], self._reporter(job_id))
+        except ExecutorBusy:
+            await self._store(self.store.release, job_id)
+            return True
+        except Exception as e:
+            logger.exception("入库任务 %s (%s) 失败", job_id, kind)
+            await self._store(self.store.fail, job_id, f"{type(e).__name__}: {e}", kind=kind)
+            self.failed += 1
+            return False
+        finally:
+            JOB_SECONDS.labels(kind=kind).observe(time.perf_counter() - started)
+        await self._store(self.store.succeed, job_id, result, kind=kind)
+        self.completed += 1
+        return False
+
+    def stats(self) -> Dict:
+        return {"workers": len(self._tasks), "completed": self.completed, "failed": self.failed}
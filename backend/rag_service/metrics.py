@@ -0,0 +1,331 @@
+"""
+RAG 链路分阶段耗时统计
+
+- Counter / Histogram: 进程内指标，接口参照 prometheus_client（labels().inc() / labels().observe()）
+- Histogram 同时维护 Prometheus 累积桶和最近 N 个样本的滑动窗口，用于计算 p50/p95/p99
+- observe_stage(): 记录一个阶段（embedding、Milvus、Mongo、LLM 等）的耗时和错误次数，
+  并追加到当前请求的 Server-Timing 明细中
+- render_prometheus(): 以 Prometheus 文本格式导出所有指标
+"""
+
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+WINDOW_SIZE = 1024
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+            for key, child in list(self._children.items())
+        ]
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+            for key, child in list(self._children.items())
+        ]
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self._lock = threading.Lock()
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.window = deque(maxlen=WINDOW_SIZE)
+
+    def observe(self, value: float):
+        with self._lock:
+            self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+            self.window.append(value)
+
+    def quantiles(self, qs: Sequence[float] = QUANTILES) -> Dict[float, float]:
+        """基于滑动窗口计算分位数（最近 WINDOW_SIZE 个样本）"""
+        with self._lock:
+            samples = sorted(self.window)
+        if not samples:
+            return {q: 0.0 for q in qs}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in qs}
+
+
+class Histogram(_Metric):
+    """
+    直方图：导出 Prometheus 标准的 _bucket/_sum/_count，
+    并额外导出 <name>_quantile 指标（滑动窗口的 p50/p95/p99）
+    """
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.bucket_counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, (("le", _format_value(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+    def render(self) -> str:
+        text = super().render()
+        quantile_lines = [
+            f"# HELP {self.name}_quantile {self.documentation} (sliding window of {WINDOW_SIZE} samples)",
+            f"# TYPE {self.name}_quantile gauge",
+        ]
+        for key, child in list(self._children.items()):
+            for q, value in child.quantiles().items():
+                labels = _format_labels(self.labelnames, key, (("quantile", str(q)),))
+                quantile_lines.append(f"{self.name}_quantile{labels} {_format_value(value)}")
+        return text + "\n" + "\n".join(quantile_lines)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in list(self._metrics.values())) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+STAGE_LATENCY = histogram("rag_stage_duration_seconds", "RAG 各阶段耗时（秒）", ["stage"])
+STAGE_CALLS = counter("rag_stage_calls_total", "RAG 各阶段调用次数", ["stage"])
+STAGE_ERRORS = counter("rag_stage_errors_total", "RAG 各阶段异常次数", ["stage"])
+REQUEST_LATENCY = histogram("http_request_duration_seconds", "HTTP 请求总耗时（秒）", ["method", "route", "status"])
+
+# 当前请求的阶段耗时明细，由 server_timing_middleware 在每个请求开始时设置
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def observe_stage(stage: str):
+    """
+    统计一个阶段的耗时
+
+    Args:
+        stage: 阶段名称，如 embed_query / milvus_search / mongo_find / llm
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage=stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage=stage).observe(elapsed)
+        STAGE_CALLS.labels(stage=stage).inc()
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def timed(stage: str):
+    """observe_stage 的装饰器形式，同时支持同步函数和协程函数"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with observe_stage(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with observe_stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def format_server_timing(timings: List[Tuple[str, float]], total: Optional[float] = None) -> str:
+    """
+    生成 Server-Timing 响应头，同名阶段的耗时累加，单位毫秒
+
+    例如: embed_query;dur=12.4, milvus_search;dur=30.1, llm;dur=812.0, total;dur=860.2
+    """
+    merged: Dict[str, float] = {}
+    for stage, elapsed in timings:
+        merged[stage] = merged.get(stage, 0.0) + elapsed
+    if total is not None:
+        merged["total"] = total
+    return ", ".join(f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in merged.items())
+
+
+async def server_timing_middleware(request, call_next):
+    """
+    FastAPI/Starlette HTTP 中间件：收集本次请求内各阶段耗时，写入 Server-Timing 响应头，
+    并按路由模板记录请求总耗时
+
+    用法: app.middleware("http")(server_timing_middleware)
+    """
+    timings: List[Tuple[str, float]] = []
+    token = _request_timings.set(timings)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _request_timings.reset(token)
+    total = time.perf_counter() - start
+
+    route = request.scope.get("route")
+    REQUEST_LATENCY.labels(
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code
+    ).observe(total)
+    response.headers["Server-Timing"] = format_server_timing(timings, total)
+    return response
+
+
+def render_prometheus() -> str:
+    """以 Prometheus 文本格式（version 0.0.4）导出全部指标"""
+    return REGISTRY.render()
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
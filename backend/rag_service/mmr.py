@@ -0,0 +1,190 @@
+"""
+最大边际相关性（MMR）多样化
+
+top-k 直接相似度排序时，同一段落的几个重叠分块往往一起进入 prompt。
+MMR 先多取 fetch_k 个候选，再逐个挑选「与查询相关、又与已选结果不重复」的分块：
+    score(c) = λ · sim(q, c) - (1 - λ) · max_{s ∈ 已选} sim(c, s)
+
+实现全部是 NumPy 矩阵运算：候选向量归一化后，相关度是一次矩阵-向量乘法；
+每选出一个结果，用一次矩阵-向量乘法更新所有候选与已选集合的最大相似度，共 k 次，没有逐对的 Python 循环。
+
+不用 MMR 时用 scored_search：不取回向量，按向量库自己的排序返回，分数换算成余弦相似度后剔除，
+score_threshold 的含义与向量库后端（Milvus 默认返回 L2 距离）和是否使用 MMR 无关。
+Milvus 的检索都只请求一次：MMR 需要的向量通过 output_fields 随检索结果返回，不再按主键二次查询。
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def mmr_select(
+    query: Sequence[float],
+    candidates,
+    k: int,
+    lambda_mult: float = 0.5,
+    score_threshold: Optional[float] = None
+) -> Tuple[List[int], np.ndarray]:
+    """
+    从候选向量中按 MMR 选出 k 个
+
+    Args:
+        query: 查询向量
+        candidates: 候选向量矩阵 (n, dim)
+        k: 选出的数量
+        lambda_mult: 相关性权重，1 为纯相似度排序，0 为只看多样性
+        score_threshold: 与查询的余弦相似度低于该值的候选直接剔除
+
+    Returns:
+        (indices, relevance): 选中候选的下标（按选择顺序），以及全部候选与查询的余弦相似度
+    """
+    matrix = _normalize(np.asarray(candidates, dtype=np.float32))
+    if matrix.size == 0:
+        return [], np.zeros(0, dtype=np.float32)
+    relevance = matrix @ _normalize(np.asarray(query, dtype=np.float32))
+
+    available = np.ones(len(matrix), dtype=bool)
+    if score_threshold is not None:
+        available &= relevance >= score_threshold
+    # 各候选与已选集合的最大相似度；第一个结果只看相关性
+    max_similarity = None
+    selected: List[int] = []
+    for _ in range(min(k, int(available.sum()))):
+        scores = lambda_mult * relevance
+        if max_similarity is not None:
+            scores = scores - (1.0 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        similarity = matrix @ matrix[best]
+        max_similarity = similarity if max_similarity is None else np.maximum(max_similarity, similarity)
+    return selected, relevance
+
+
+def relevance_score(vector_store, score: float) -> float:
+    """
+    把 Milvus 返回的分数换算成余弦相似度
+
+    L2 为距离的平方，embedding 归一化时 cos = 1 - d / 2（未归一化的模型可建 COSINE 度量的 collection）；
+    IP / COSINE 直接作为相似度
+    """
+    params = vector_store.search_params or vector_store.index_params or {}
+    if params.get("metric_type", "L2") == "L2":
+        return 1.0 - score / 2.0
+    return score
+
+
+def _milvus_search(
+    vector_store,
+    embedding: List[float],
+    k: int,
+    with_vectors: bool = False,
+    param: Optional[dict] = None,
+    expr: Optional[str] = None,
+    timeout: Optional[int] = None,
+    **kwargs
+) -> List[Tuple]:
+    """
+    一次 Collection.search：主键写入 metadata["pk"]，with_vectors 时向量字段一起返回
+
+    Returns:
+        List[(Document, score, vector)]: 按向量库的排序，score 为余弦相似度，不取向量时 vector 为 None
+    """
+    if vector_store.col is None:
+        return []
+    vector_field = vector_store._vector_field
+    output_fields = [
+        name for name in vector_store.fields
+        if name != vector_store._primary_field and (with_vectors or name != vector_field)
+    ]
+    res = vector_store.col.search(
+        data=[embedding],
+        anns_field=vector_field,
+        param=param or vector_store.search_params,
+        limit=k,
+        expr=expr,
+        output_fields=output_fields,
+        timeout=timeout,
+        **kwargs
+    )
+    results = []
+    for hit in res[0]:
+        data = {name: hit.entity.get(name) for name in output_fields}
+        vector = data.pop(vector_field, None)
+        doc = vector_store._parse_document(data)
+        doc.metadata[vector_store._primary_field] = hit.id
+        results.append((doc, relevance_score(vector_store, hit.score), vector))
+    return results
+
+
+def search_with_vectors(vector_store, embedding: List[float], fetch_k: int, **kwargs) -> List[Tuple]:
+    """
+    检索 fetch_k 个候选并取回它们的向量（LocalVectorStore 直接返回；Milvus 在同一次检索中返回向量字段）
+
+    Returns:
+        List[(Document, vector)]
+    """
+    if hasattr(vector_store, "similarity_search_with_vectors_by_vector"):
+        return vector_store.similarity_search_with_vectors_by_vector(embedding, k=fetch_k, **kwargs)
+    return [(doc, vector) for doc, _, vector in _milvus_search(vector_store, embedding, fetch_k, True, **kwargs)]
+
+
+def scored_search(
+    vector_store,
+    embedding: List[float],
+    k: int = 4,
+    score_threshold: Optional[float] = None,
+    **kwargs
+) -> List[Tuple]:
+    """
+    top-k 相似度检索，低于 score_threshold 的结果剔除（不取回向量）
+
+    Args:
+        kwargs: 传给向量库检索的其他参数（如过滤条件 filter / expr）
+
+    Returns:
+        List[(Document, score)]: 按相似度降序，score 为与查询的余弦相似度（与 mmr_search 相同）
+    """
+    if hasattr(vector_store, "similarity_search_with_vectors_by_vector"):
+        # LocalVectorStore 的分数本身就是余弦相似度
+        return vector_store.similarity_search_with_score_by_vector(
+            embedding, k=k, score_threshold=score_threshold, **kwargs
+        )
+    return [
+        (doc, score) for doc, score, _ in _milvus_search(vector_store, embedding, k, **kwargs)
+        if score_threshold is None or score >= score_threshold
+    ]
+
+
+def mmr_search(
+    vector_store,
+    embedding: List[float],
+    k: int = 4,
+    fetch_k: int = 20,
+    lambda_mult: float = 0.5,
+    score_threshold: Optional[float] = None,
+    **kwargs
+) -> List[Tuple]:
+    """
+    过量召回 + 阈值剪枝 + MMR 选择
+
+    Args:
+        kwargs: 传给向量库检索的其他参数（如过滤条件 filter / expr）
+
+    Returns:
+        List[(Document, score)]: score 为与查询的余弦相似度（与向量库后端无关）
+    """
+    candidates = search_with_vectors(vector_store, embedding, max(fetch_k, k), **kwargs)
+    if not candidates:
+        return []
+    selected, relevance = mmr_select(
+        embedding, [vector for _, vector in candidates], k, lambda_mult, score_threshold
+    )
+    return [(candidates[i][0], float(relevance[i])) for i in selected]
@@ -0,0 +1,88 @@
+"""
+NDJSON（每行一个 JSON 对象）流式请求与响应
+
+批量上传的请求体可达数百 MB，整体读入再解析会让内存随请求大小增长：
+- iter_ndjson: 按收到的字节块增量切行、解析，内存只与最长的一行有关；
+  超过 max_line_bytes 的行直接报错并跳过，不再缓存
+- NDJSONStreamingResponse: 把异步迭代的 dict 逐行写回客户端，可以边读请求体边返回结果
+  （不像 StreamingResponse 那样另起任务监听断开，那会和读请求体争抢 receive 消息）
+"""
+
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import orjson
+from starlette.responses import StreamingResponse
+
+from .responses import _default
+
+MEDIA_TYPE = "application/x-ndjson"
+
+
+def _parse(line: bytes) -> Tuple[Optional[Dict], Optional[str]]:
+    try:
+        record = orjson.loads(line)
+    except orjson.JSONDecodeError as e:
+        return None, f"JSON 解析失败: {e}"
+    if not isinstance(record, dict):
+        return None, "每行应为一个 JSON 对象"
+    return record, None
+
+
+async def iter_ndjson(
+    chunks: AsyncIterator[bytes],
+    max_line_bytes: int = 16 * 1024 * 1024
+) -> AsyncIterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """
+    增量解析 NDJSON 字节流（空行跳过，最后一行可以没有换行符）
+
+    Args:
+        chunks: 字节块（如 Request.stream()）
+        max_line_bytes: 单行最大字节数
+
+    Yields:
+        (line, record, error): 行号（从 1 开始）；解析成功时 record 为该行的对象，否则 error 为原因
+    """
+    buffer = bytearray()
+    line_no = 0
+    skipping = False  # 当前行已超长，丢弃到下一个换行符
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            line_no += 1
+            if skipping:
+                skipping = False
+            elif end - start > max_line_bytes:
+                yield line_no, None, f"单行超过 {max_line_bytes} 字节"
+            elif buffer[start:end].strip():
+                yield (line_no, *_parse(bytes(buffer[start:end])))
+            start = end + 1
+        del buffer[:start]
+        if not skipping and len(buffer) > max_line_bytes:
+            yield line_no + 1, None, f"单行超过 {max_line_bytes} 字节"
+            skipping = True
+        if skipping:
+            buffer.clear()
+    if buffer.strip() and not skipping:
+        yield (line_no + 1, *_parse(bytes(buffer)))
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    media_type = MEDIA_TYPE
+
+    def __init__(self, content: AsyncIterator[Any], **kwargs):
+        super().__init__(self._encode(content), **kwargs)
+
+    @staticmethod
+    async def _encode(content: AsyncIterator[Any]) -> AsyncIterator[bytes]:
+        async for item in content:
+            yield orjson.dumps(item, default=_default, option=orjson.OPT_APPEND_NEWLINE)
+
+    async def __call__(self, scope, receive, send):
+        # 请求体由响应的生成器读取，这里不能再调用 receive；客户端断开时 send 抛出异常，生成器随之结束
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,105 @@
+"""
+把 text2vec 模型导出为 ONNX（可选 int8 动态量化），供 EMBEDDING_ENGINE=onnx 使用
+
+导出目录包含:
+- model.onnx: 与 PyTorch 模型等价的 FP32 图（输出最后一层隐状态，pooling 在 OnnxEmbeddings 中做）
+- model.int8.onnx: --quantize 时生成，权重按 int8 动态量化，体积约为 1/4，CPU 上通常快 1.5~3 倍
+- 分词器文件
+
+导出后用同一批中文文本比较 ONNX 与 PyTorch（HuggingFaceEmbeddings）的输出，
+逐条余弦相似度低于 --min-cosine 时以非零状态退出。
+
+用法（在 backend 目录下）:
+    python -m rag_service.onnx_export --model shibing624/text2vec-base-chinese \\
+        --output /models/text2vec-base-chinese-onnx --quantize
+"""
+
+import argparse
+import json
+import os
+import sys
+
+PARITY_TEXTS = [
+    "麻黄汤主治太阳病，头痛发热，身疼腰痛，骨节疼痛，恶风无汗而喘者。",
+    "黄帝问曰：余闻上古之人，春秋皆度百岁，而动作不衰。",
+    "人参味甘微苦，性微温，归脾、肺、心经，能大补元气，复脉固脱。",
+    "失眠多梦，心悸健忘，舌红少苔，脉细数，宜滋阴养血、补心安神。",
+    "当归补血汤：黄芪一两，当归二钱，水煎服。",
+    "感冒了应该吃什么中药？",
+    "脾胃虚弱的人平时饮食要注意什么",
+    "The Shanghan Lun is a classical Chinese medical text.",
+]
+
+
+def export(model_name: str, output_dir: str, opset: int = 14):
+    """导出 FP32 ONNX 模型和分词器"""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(PARITY_TEXTS[:2], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            os.path.join(output_dir, "model.onnx"),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    tokenizer.save_pretrained(output_dir)
+
+
+def quantize(output_dir: str):
+    """int8 动态量化（只量化权重，激活在运行时量化，不需要校准数据）"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(
+        os.path.join(output_dir, "model.onnx"),
+        os.path.join(output_dir, "model.int8.onnx"),
+        weight_type=QuantType.QInt8,
+    )
+
+
+def parity(model_name: str, output_dir: str, quantized: bool, min_cosine: float):
+    from .embeddings import OnnxEmbeddings, check_parity, create_embeddings
+
+    reference = create_embeddings(model_name, engine="huggingface")
+    candidate = OnnxEmbeddings(output_dir, quantized=quantized)
+    return check_parity(reference, candidate, PARITY_TEXTS, min_cosine)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出 text2vec 模型为 ONNX")
+    parser.add_argument("--model", required=True, help="HuggingFace 模型名")
+    parser.add_argument("--output", required=True, help="导出目录")
+    parser.add_argument("--quantize", action="store_true", help="同时生成 int8 动态量化模型")
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="与 PyTorch 输出的最低余弦相似度")
+    parser.add_argument("--skip-check", action="store_true", help="不做一致性检查")
+    args = parser.parse_args()
+
+    export(args.model, args.output, args.opset)
+    if args.quantize:
+        quantize(args.output)
+    if args.skip_check:
+        return
+
+    failed = False
+    for quantized in ([False, True] if args.quantize else [False]):
+        result = parity(args.model, args.output, quantized, args.min_cosine)
+        print(json.dumps({"model": "int8" if quantized else "fp32", **result}, ensure_ascii=False))
+        failed = failed or not result["passed"]
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+父文档（small-to-big）检索
+
+小分块召回好但上下文零碎，大分块上下文完整但浪费 prompt token。这里两者分开：
+- 入库：先把文档切成互不重叠的父章节（sections，按 token 数打包整句，章节标记处断开），
+  再在每个章节内切出细粒度的子分块（chunks），只有子分块写入向量库；
+  文档记录中保存章节边界（字符位置）和每个子分块所属的章节
+- 检索：用子分块召回，再换成包含命中分块的最小章节；同一文档中相同或相邻章节的命中合并为一段连续原文，
+  结果按其中排名最靠前的命中排序
+
+子分块的序号即 rag2 元数据中的 chunk_index。
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .splitter import ChineseTextSplitter
+
+
+def split_parent_child(
+    text: str,
+    parent_splitter: ChineseTextSplitter,
+    child_splitter: ChineseTextSplitter
+) -> Tuple[List[Tuple[int, int]], List[str], List[int]]:
+    """
+    切分父章节和子分块（子分块不跨章节）
+
+    Args:
+        text: 文档全文
+        parent_splitter: 父章节分块器（chunk_overlap 应为 0，章节之间首尾相接）
+        child_splitter: 子分块分块器
+
+    Returns:
+        (sections, chunks, chunk_sections): 章节在 text 中的 [start, end) 位置，
+        子分块文本，以及每个子分块所属章节的序号
+    """
+    sections = parent_splitter.split_spans(text)
+    chunks, chunk_sections = [], []
+    for index, (start, end) in enumerate(sections):
+        for chunk in child_splitter.split_text(text[start:end]):
+            chunks.append(chunk)
+            chunk_sections.append(index)
+    return sections, chunks, chunk_sections
+
+
+def merge_hits(hits: Sequence[Tuple[str, int, float]]) -> List[Dict]:
+    """
+    把子分块命中按文档合并为连续的章节区间
+
+    Args:
+        hits: [(doc_id, section_index, score), ...]，按检索排名排列
+
+    Returns:
+        List[Dict]: [{"doc_id", "first_section", "last_section", "score", "hits"}, ...]，
+        按区间内排名最靠前的命中排序，score 为该命中的分数（与向量库后端的分数含义一致），hits 为区间内的命中数
+    """
+    by_doc: Dict[str, Dict[int, int]] = {}
+    for rank, (doc_id, section, _) in enumerate(hits):
+        by_doc.setdefault(doc_id, {}).setdefault(section, rank)
+
+    merged = []
+    for doc_id, sections in by_doc.items():
+        run: Optional[Dict] = None
+        for section in sorted(sections):
+            rank = sections[section]
+            if run is not None and section == run["last_section"] + 1:
+                run["last_section"] = section
+                run["rank"] = min(run["rank"], rank)
+                continue
+            run = {"doc_id": doc_id, "first_section": section, "last_section": section, "rank": rank}
+            merged.append(run)
+    merged.sort(key=lambda item: item["rank"])
+
+    counts: Dict[Tuple[str, int], int] = {}
+    for doc_id, section, _ in hits:
+        counts[(doc_id, section)] = counts.get((doc_id, section), 0) + 1
+    for run in merged:
+        run["score"] = hits[run.pop("rank")][2]
+        run["hits"] = sum(
+            counts.get((run["doc_id"], section), 0)
+            for section in range(run["first_section"], run["last_section"] + 1)
+        )
+    return merged
+
+
+def section_text(content: str, sections: Sequence[Sequence[int]], first: int, last: int) -> str:
+    """第 first 到 last 个章节（含）对应的原文"""
+    return content[sections[first][0]:sections[last][1]]
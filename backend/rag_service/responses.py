@@ -0,0 +1,148 @@
+"""
+接口响应的序列化与压缩
+
+- FastJSONResponse: 用 orjson 序列化（比标准库 json 快数倍，原生支持 datetime），
+  序列化耗时记为 serialize 阶段（出现在 Server-Timing 中）
+- CompressionMiddleware: 响应体超过阈值且客户端支持时压缩，优先 brotli（安装了 brotli 包时），其次 gzip；
+  流式响应不处理
+- 压缩前后的响应字节数按编码记录在 http_response_bytes 直方图中
+- excerpt(): 引用分块只返回摘要时使用，全文通过分块ID单独获取
+"""
+
+import gzip
+import time
+from typing import Any, Optional
+
+import orjson
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+from .metrics import histogram, observe_stage
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只用 gzip
+    brotli = None
+
+RESPONSE_BYTES = histogram(
+    "http_response_bytes", "响应体字节数（identity 为压缩前）", ["encoding"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+)
+COMPRESSION_SECONDS = histogram(
+    "http_response_compress_seconds", "响应压缩耗时（秒）", ["encoding"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+)
+
+
+def _default(value: Any):
+    # bson.ObjectId 等 orjson 不认识的类型按字符串输出
+    return str(value)
+
+
+def excerpt(text: str, length: int = 120) -> str:
+    return text if len(text) <= length else text[:length] + "…"
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        with observe_stage("serialize"):
+            body = orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        RESPONSE_BYTES.labels(encoding="identity").observe(len(body))
+        return body
+
+
+def _choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name.strip():
+            accepted.add(name.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """
+    ASGI 中间件：压缩超过 minimum_size 字节的完整（非流式）响应
+
+    用法: app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = _choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+        chunks = []
+
+        async def wrapped_send(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                start_message = message
+                # 没有 Content-Length 的是流式响应（如 SSE），已编码的也不再处理
+                if "content-length" not in headers or "content-encoding" in headers:
+                    passthrough = True
+                    await send(message)
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            # 经过 http 中间件的响应会被拆成多段发送，凑齐完整响应体后再压缩
+            chunks.append(message.get("body", b""))
+            if message.get("more_body"):
+                return
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start_message["headers"])
+            if len(body) < self.minimum_size:
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            body = self._compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            start_message["headers"] = headers.raw
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, wrapped_send)
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        start = time.perf_counter()
+        if encoding == "br":
+            compressed = brotli.compress(body, quality=self.brotli_quality)
+        else:
+            compressed = gzip.compress(body, compresslevel=self.gzip_level)
+        COMPRESSION_SECONDS.labels(encoding=encoding).observe(time.perf_counter() - start)
+        RESPONSE_BYTES.labels(encoding=encoding).observe(len(compressed))
+        return compressed
@@ -0,0 +1,149 @@
+"""
+检索结果缓存
+
+知识库很少变化，而同一 (知识库, 查询, 过滤条件, k) 的检索在每次请求时都要重新计算 embedding 并查询向量库。
+检索结果按下面的键缓存，命中时两步都省掉：
+    (命名空间, 代数, 归一化后的查询, 检索参数)
+
+- 命名空间：rag2 为 kb_id，rag.py 和链式检索器为 collection 名
+- 代数：每个命名空间一个计数器，写入/更新/删除文档后调用 bump() 加一。
+  键中带着检索开始时的代数，写入后旧条目不会再被命中，随 LRU 淘汰，不需要扫描缓存
+- 查询归一化：NFKC（全角转半角）、合并空白、英文小写
+- 容量按估计的字节数限制；另有 TTL 兜底：代数计数器在进程内，
+  其他进程（其他 uvicorn worker、Django 同步任务）写入后，本进程最多 TTL 秒后看到新结果
+- 命中率见 /metrics 中的 rag_cache_requests_total{cache="retrieval"}，占用见 rag_cache_bytes
+
+缓存的结果由多个请求共享，调用方不要原地修改。
+"""
+
+import sys
+import threading
+import unicodedata
+from typing import Any, Dict, Hashable, Optional
+
+from .cache import TTLCache
+
+_config: Dict = {"enabled": True, "maxbytes": 64 * 1024 * 1024, "ttl": 300.0, "maxsize": 100000}
+_cache: Optional["RetrievalCache"] = None
+_cache_lock = threading.Lock()
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text or "").split()).lower()
+
+
+def _freeze(value: Any) -> Hashable:
+    """把过滤条件等参数转换为可哈希、与顺序无关的键"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        items = [_freeze(item) for item in value]
+        return tuple(sorted(items, key=repr) if isinstance(value, set) else items)
+    return value
+
+
+def estimate_size(value: Any) -> int:
+    """
+    估计检索结果占用的字节数（字符串按 UTF-8 长度计，容器和对象加固定开销）
+
+    支持 langchain Document、pydantic 模型、dict / list / tuple 及标量的任意嵌套
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return 32
+    if isinstance(value, str):
+        return 49 + len(value.encode("utf-8"))
+    if isinstance(value, bytes):
+        return 33 + len(value)
+    if isinstance(value, dict):
+        return 64 + sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return 56 + 8 * len(value) + sum(estimate_size(item) for item in value)
+    if hasattr(value, "page_content"):
+        return 64 + estimate_size(value.page_content) + estimate_size(getattr(value, "metadata", None))
+    if hasattr(value, "__dict__"):
+        return 64 + estimate_size(vars(value))
+    return sys.getsizeof(value)
+
+
+class RetrievalCache:
+    def __init__(self, maxbytes: int, ttl: float, maxsize: int = 100000, enabled: bool = True):
+        """
+        Args:
+            maxbytes: 缓存结果估计字节数的上限
+            ttl: 条目有效期（秒），限制其他进程写入后看到旧结果的时间
+            maxsize: 最多缓存的条目数
+            enabled: False 时 get 总是未命中、set 不保存（代数仍然计数）
+        """
+        self.enabled = enabled
+        self.cache = TTLCache("retrieval", maxsize, ttl, maxbytes=maxbytes, sizeof=estimate_size)
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def generation(self, namespace: str) -> int:
+        return self._generations.get(namespace, 0)
+
+    def bump(self, namespace: str):
+        """命名空间中的数据发生变化（写入完成后调用）：此前缓存的检索结果全部失效"""
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+    def key(self, namespace: str, query: str, **params) -> Hashable:
+        """
+        检索结果的缓存键，应在检索开始前生成（带着当时的代数，检索期间发生的写入会使该结果失效）
+
+        Args:
+            namespace: 知识库ID或 collection 名
+            query: 查询文本
+            params: 影响结果的其他参数（k、过滤条件、MMR 参数、阈值等）
+        """
+        return (namespace, self.generation(namespace), normalize_query(query), _freeze(params))
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        return self.cache.get(key)
+
+    def set(self, key: Hashable, results: Any):
+        if self.enabled:
+            self.cache.set(key, results)
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.cache),
+            "bytes": self.cache.nbytes,
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+            "hit_rate": self.cache.hit_rate,
+        }
+
+
+def configure(enabled: bool = True, maxbytes: int = 64 * 1024 * 1024, ttl: float = 300.0, maxsize: int = 100000):
+    """
+    设置检索缓存参数，需在第一次使用缓存之前调用
+
+    Args:
+        enabled: 是否启用
+        maxbytes: 缓存结果估计字节数的上限
+        ttl: 条目有效期（秒）
+        maxsize: 最多缓存的条目数
+    """
+    _config.update(enabled=enabled, maxbytes=maxbytes, ttl=ttl, maxsize=maxsize)
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """进程内共享的检索缓存（rag.py、rag2.py 和链式检索器共用，代数计数器也共用）"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RetrievalCache(
+                    maxbytes=_config["maxbytes"],
+                    ttl=_config["ttl"],
+                    maxsize=_config["maxsize"],
+                    enabled=_config["enabled"]
+                )
+    return _cache
@@ -1,31 +1,192 @@
+import json
+import logging
+import os
+from functools import lru_cache
+from typing import List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
 from langchain_community.vectorstores.milvus import Milvus  
 from langchain_community.embeddings.huggingface import HuggingFaceEmbeddings  
-from langchain_community.document_loaders.directory import DirectoryLoader, TextLoader  
-from langchain.text_splitter import RecursiveCharacterTextSplitter  
+from pathlib import Path
+from .dedup import Deduplicator
+from .embeddings import InstrumentedEmbeddings, create_embeddings
+from .executors import QUERY, run_embedding, run_vector_store
+from .metrics import observe_stage
+from .retrieval_cache import get_retrieval_cache
+from .splitter import ChineseTextSplitter
+from .streaming import iter_file_chunks
 
-def get_retriever():  
-    embeddings = HuggingFaceEmbeddings(model_name="GanymedeNil/text2vec-large-chinese")  
-    
-    vector_db = Milvus(  
-        embedding_function=embeddings,  
+COLLECTION_NAME = "tcm_knowledge"
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+INSERT_BATCH_SIZE = 256  # 每批写入向量库的分块数
+DEDUP_THRESHOLD = 0.85  # 分块间估计 Jaccard 相似度不低于该值视为重复
+EMBEDDING_MODEL = "GanymedeNil/text2vec-large-chinese"
+
+logger = logging.getLogger(__name__)
+
+@lru_cache()
+def get_embeddings():
+    # 模型只加载一次，供检索、知识库初始化和增量同步共用；
+    # 设置了 EMBEDDING_SERVER_SOCKET 时使用本机的共享 embedding 服务，进程内不加载模型
+    socket_path = os.environ.get("EMBEDDING_SERVER_SOCKET")
+    if socket_path:
+        return InstrumentedEmbeddings(create_embeddings(EMBEDDING_MODEL, engine="remote", socket_path=socket_path))
+    return InstrumentedEmbeddings(
+        HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    )
+
+def get_vector_store():
+    return Milvus(  
+        embedding_function=get_embeddings(),  
         connection_args={"host": "localhost", "port": "19530"},  
-        collection_name="tcm_knowledge"  
+        collection_name=COLLECTION_NAME  
     )  
-    
-    return vector_db.as_retriever(search_kwargs={"k": 3})  
 
-# 知识库初始化脚本  
-def initialize_knowledge_base():  
-    loader = DirectoryLoader("/data/tcm_docs", glob="**/*.txt")  
-    documents = loader.load()  
-    
-    text_splitter = RecursiveCharacterTextSplitter(  
-        chunk_size=500,  
-        chunk_overlap=50  
+def get_text_splitter():
+    return ChineseTextSplitter(  
+        chunk_size=CHUNK_SIZE,  
+        chunk_overlap=CHUNK_OVERLAP  
     )  
+
+class CachedRetriever(BaseRetriever):
+    """
+    在检索器前加一层检索结果缓存（rag_service.retrieval_cache），键为 collection 名 + 查询 + search_kwargs
+
+    向 collection 写入后需调用 get_retrieval_cache().bump(COLLECTION_NAME)，
+    initialize_knowledge_base 和 Django 的 VectorIndexer 已经这样做。
+    """
+
+    retriever: BaseRetriever
+    namespace: str = COLLECTION_NAME
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        cache = get_retrieval_cache()
+        key = cache.key(self.namespace, query, **getattr(self.retriever, "search_kwargs", {}))
+        docs = cache.get(key)
+        if docs is None:
+            docs = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+            cache.set(key, docs)
+        return list(docs)
+
+
+def get_retriever():  
+    with observe_stage("retriever_init"):
+        vector_db = get_vector_store()
     
-    splits = text_splitter.split_documents(documents)  
-    vector_db = Milvus.from_documents(  
-        documents=splits,  
-        embedding=get_retriever().embedding_function  
-    )  
\ No newline at end of file
+    return CachedRetriever(retriever=vector_db.as_retriever(search_kwargs={"k": 3}))  
+
+def _search_by_vector(embedding: List[float], k: int) -> List[Document]:
+    with observe_stage("retriever_init"):
+        vector_db = get_vector_store()
+    return vector_db.similarity_search_by_vector(embedding, k=k)
+
+async def aretrieve(query: str, k: int = 3) -> List[Document]:
+    """
+    异步检索（与 get_retriever() 共用检索结果缓存）：查询向量在 embedding 线程池中计算，
+    按向量检索在向量库线程池中执行
+    """
+    cache = get_retrieval_cache()
+    key = cache.key(COLLECTION_NAME, query, k=k)
+    docs = cache.get(key)
+    if docs is None:
+        embedding = await run_embedding(QUERY, get_embeddings().embed_query, query)
+        docs = await run_vector_store(QUERY, _search_by_vector, embedding, k)
+        cache.set(key, docs)
+    return list(docs)
+
+def chunk_metadata(source: str, references=()) -> dict:
+    """
+    tcm_knowledge 中分块的元数据：出处，以及与该分块近似重复、共用这一个向量的其他出处
+
+    references 编码为 JSON 字符串（langchain 的 Milvus 按第一批元数据推断 schema，不支持列表类型）；
+    同一 collection 的所有写入方都要带上这个字段，否则与已有 schema 的列数不一致
+    """
+    return {"source": source, "references": json.dumps(list(references), ensure_ascii=False)}
+
+# 知识库初始化脚本  
+def initialize_knowledge_base(corpus_dir="/data/tcm_docs", pattern="**/*.txt",
+                              dedup_threshold=DEDUP_THRESHOLD, references_path=None):  
+    """
+    逐个文件流式解码、分块并分批写入向量库，内存占用与单个文件大小无关
+    （GBK/GB18030 编码的文件会自动识别）
+
+    不同版本/重印本中近似重复的分块（MinHash 估计的 Jaccard 相似度 >= dedup_threshold）
+    只写入第一次出现的一份，其余出处记入该分块元数据的 references。
+    语料读两遍：第一遍只计算签名、找出重复分块和它们的出处，第二遍写入规范分块，
+    写入时引用列表已经完整（向量写入后不再修改元数据）。
+
+    Args:
+        corpus_dir: 语料目录
+        pattern: 文件匹配模式
+        dedup_threshold: 去重阈值，None 表示不去重
+        references_path: 另外输出一份引用表（JSON: {向量主键: [重复分块的出处, ...]}）
+
+    Returns:
+        dict: 分块数、写入数、重复数和去重比例
+    """
+    def iter_chunks():
+        index = 0
+        for path in sorted(Path(corpus_dir).glob(pattern)):
+            if not path.is_file():
+                continue
+            for chunk in iter_file_chunks(str(path), CHUNK_SIZE, CHUNK_OVERLAP):
+                yield index, str(path), chunk
+                index += 1
+
+    # 第一遍：规范分块的序号 → 重复分块的出处，以及重复分块的序号
+    dedup = Deduplicator(dedup_threshold) if dedup_threshold is not None else None
+    references, duplicate_indexes = {}, set()
+    if dedup is not None:
+        for index, source, chunk in iter_chunks():
+            canonical, signature = dedup.check(chunk)
+            if canonical is not None:
+                references.setdefault(canonical, []).append(source)
+                duplicate_indexes.add(index)
+            else:
+                dedup.add(index, signature)
+        dedup = None  # 签名索引不再需要，写入前释放
+
+    # 第二遍：写入规范分块，引用随元数据一起写入
+    vector_db = get_vector_store()
+    written = {}  # 有引用的规范分块的向量主键 → 引用，供 references_path 输出
+    pending, texts, metadatas = [], [], []
+
+    def flush():
+        ids = vector_db.add_texts(texts, metadatas=metadatas)
+        get_retrieval_cache().bump(COLLECTION_NAME)
+        for index, pk in zip(pending, ids):
+            if index in references:
+                written[pk] = references[index]
+        pending.clear()
+        texts.clear()
+        metadatas.clear()
+
+    chunk_count = 0
+    for index, source, chunk in iter_chunks():
+        chunk_count += 1
+        if index in duplicate_indexes:
+            continue
+        pending.append(index)
+        texts.append(chunk)
+        metadatas.append(chunk_metadata(source, references.get(index, ())))
+        if len(texts) >= INSERT_BATCH_SIZE:
+            flush()
+    if texts:
+        flush()
+
+    duplicates = len(duplicate_indexes)
+    report = {
+        "chunks": chunk_count,
+        "inserted": chunk_count - duplicates,
+        "duplicates": duplicates,
+        "dedup_ratio": duplicates / chunk_count if chunk_count else 0.0,
+    }
+    logger.info("知识库初始化完成: %s", report)
+    if references_path:
+        with open(references_path, "w", encoding="utf-8") as f:
+            json.dump({str(pk): sources for pk, sources in written.items()}, f, ensure_ascii=False)
+    return report
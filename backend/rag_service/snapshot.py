@@ -0,0 +1,266 @@
+"""
+知识库快照：导出/导入向量、分块和 Mongo 记录，恢复时不重新计算 embedding
+
+快照是一个目录（导出时先写入 <目录>.tmp，全部完成后原子重命名）：
+- manifest.json: 格式版本、分块数、向量维度和类型、导出信息（知识库、embedding 模型等）、各文件的 SHA-256
+- vectors.npy: 连续的 (n, dim) 向量矩阵，float32 或 float16（--float16，体积减半，余弦相似度误差约 1e-3）
+- texts.bin / texts.offsets.npy: 分块文本按 UTF-8 首尾相接，第 i 个分块为 [offsets[i], offsets[i + 1]) 字节
+- chunks.json: 主键和元数据，按列存储（{"ids": [...], "columns": {字段: [...]}}，MongoDB 扩展 JSON，保留 datetime 等类型）
+- <名称>.bson: Mongo 记录，逐条 BSON 首尾相接（与 mongodump 相同）
+
+导入先校验所有文件的校验和，再按批写入向量库（rag_service.vectorstore.write_vectors），
+Mongo 记录用 insert_many 批量写入。Milvus 的自增主键在导入后会变化，restore_vectors 返回旧主键到新主键的映射，
+调用方据此改写 Mongo 记录中引用的向量ID。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import bson
+import numpy as np
+from bson import json_util
+
+from .filters import to_milvus_expr
+from .vectorstore import write_vectors
+
+FORMAT = "rag-kb-snapshot"
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+_MISSING = {"$missing": True}  # 该行没有这个元数据字段
+
+
+class SnapshotError(ValueError):
+    """快照格式不支持、文件缺失或校验和不一致"""
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_vectors(
+    vector_store,
+    batch_size: int = 1000,
+    filters: Optional[Dict] = None
+) -> Iterator[Tuple[List, np.ndarray, List[str], List[Dict]]]:
+    """
+    按批读出向量库中的全部分块
+
+    LocalVectorStore 直接读内存；Milvus 用 query_iterator（pymilvus >= 2.3）分页读出全部字段。
+
+    Args:
+        filters: 只读出满足条件的分块（rag_service.filters.build_filters），如共享 collection 中某个知识库的分块
+
+    Yields:
+        (ids, vectors, texts, metadatas)
+    """
+    if hasattr(vector_store, "iter_rows"):
+        yield from vector_store.iter_rows(batch_size, filter=filters)
+        return
+
+    col = vector_store.col
+    if col is None:
+        return
+    pk_field, vector_field, text_field = (
+        vector_store._primary_field, vector_store._vector_field, vector_store._text_field
+    )
+    expr = to_milvus_expr(filters, pk_field) if filters else ""
+    iterator = col.query_iterator(batch_size=batch_size, expr=expr, output_fields=list(vector_store.fields))
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            yield (
+                [row[pk_field] for row in rows],
+                np.asarray([row[vector_field] for row in rows], dtype=np.float32),
+                [row[text_field] for row in rows],
+                [
+                    {key: value for key, value in row.items() if key not in (pk_field, vector_field, text_field)}
+                    for row in rows
+                ],
+            )
+    finally:
+        iterator.close()
+
+
+def export_snapshot(
+    directory: str,
+    vector_store,
+    records: Optional[Dict[str, Iterable[Dict]]] = None,
+    info: Optional[Dict] = None,
+    float16: bool = False,
+    batch_size: int = 1000,
+    filters: Optional[Dict] = None
+) -> Dict:
+    """
+    导出快照
+
+    Args:
+        directory: 快照目录（不能已存在）
+        vector_store: 要导出的向量库（LocalVectorStore 或 langchain Milvus）
+        records: {名称: Mongo 记录}，分别写入 <名称>.bson
+        info: 写入 manifest 的附加信息（如知识库ID、embedding 模型）
+        float16: 向量以 float16 保存
+        batch_size: 从向量库分批读取的条数
+        filters: 只导出满足条件的分块（共享 collection 布局下为 {"kb_id": 知识库ID}）
+
+    Returns:
+        Dict: manifest
+    """
+    if os.path.exists(directory):
+        raise SnapshotError(f"快照目录已存在: {directory}")
+    tmp = directory.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    ids, blocks, metadatas = [], [], []
+    offsets = [0]
+    with open(os.path.join(tmp, "texts.bin"), "wb") as texts_file:
+        for batch_ids, vectors, texts, batch_metadatas in iter_vectors(vector_store, batch_size, filters):
+            ids.extend(batch_ids)
+            blocks.append(np.asarray(vectors, dtype=np.float16 if float16 else np.float32))
+            metadatas.extend(batch_metadatas)
+            for text in texts:
+                encoded = text.encode("utf-8")
+                texts_file.write(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+
+    dtype = "float16" if float16 else "float32"
+    vectors = np.concatenate(blocks) if blocks else np.zeros((0, 0), dtype=dtype)
+    np.save(os.path.join(tmp, "vectors.npy"), np.ascontiguousarray(vectors))
+    np.save(os.path.join(tmp, "texts.offsets.npy"), np.asarray(offsets, dtype=np.int64))
+
+    names = list(dict.fromkeys(key for metadata in metadatas for key in metadata))
+    columns = {name: [metadata.get(name, _MISSING) for metadata in metadatas] for name in names}
+    with open(os.path.join(tmp, "chunks.json"), "w", encoding="utf-8") as f:
+        f.write(json_util.dumps({"ids": ids, "columns": columns}, ensure_ascii=False))
+
+    record_counts = {}
+    for name, docs in (records or {}).items():
+        count = 0
+        with open(os.path.join(tmp, f"{name}.bson"), "wb") as f:
+            for doc in docs:
+                f.write(bson.encode(doc))
+                count += 1
+        record_counts[name] = count
+
+    manifest = {
+        "format": FORMAT,
+        "version": FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "count": len(ids),
+        "dim": int(vectors.shape[1]) if vectors.size else 0,
+        "dtype": dtype,
+        "records": record_counts,
+        "info": info or {},
+        "files": {
+            name: {"sha256": _sha256(os.path.join(tmp, name)), "bytes": os.path.getsize(os.path.join(tmp, name))}
+            for name in sorted(os.listdir(tmp))
+        },
+    }
+    with open(os.path.join(tmp, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, directory)
+    return manifest
+
+
+class Snapshot:
+    """读取快照目录（向量矩阵以内存映射方式打开，不整体读入内存）"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        path = os.path.join(directory, MANIFEST)
+        if not os.path.exists(path):
+            raise SnapshotError(f"不是快照目录（缺少 {MANIFEST}）: {directory}")
+        with open(path, encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT or self.manifest.get("version", 0) > FORMAT_VERSION:
+            raise SnapshotError(
+                f"不支持的快照格式: {self.manifest.get('format')} v{self.manifest.get('version')}"
+            )
+
+    @property
+    def count(self) -> int:
+        return self.manifest["count"]
+
+    @property
+    def info(self) -> Dict:
+        return self.manifest.get("info", {})
+
+    def verify(self):
+        """逐个文件校验大小和 SHA-256，不一致时抛出 SnapshotError"""
+        for name, expected in self.manifest["files"].items():
+            path = os.path.join(self.directory, name)
+            if not os.path.exists(path):
+                raise SnapshotError(f"快照文件缺失: {name}")
+            if os.path.getsize(path) != expected["bytes"] or _sha256(path) != expected["sha256"]:
+                raise SnapshotError(f"快照文件校验失败: {name}")
+
+    def iter_batches(self, batch_size: int = 1000) -> Iterator[Tuple[List, np.ndarray, List[str], List[Dict]]]:
+        """
+        Yields:
+            (ids, vectors, texts, metadatas): 向量转换为 float32
+        """
+        vectors = np.load(os.path.join(self.directory, "vectors.npy"), mmap_mode="r")
+        offsets = np.load(os.path.join(self.directory, "texts.offsets.npy"))
+        with open(os.path.join(self.directory, "chunks.json"), encoding="utf-8") as f:
+            chunks = json_util.loads(f.read())
+        ids, columns = chunks["ids"], chunks["columns"]
+        with open(os.path.join(self.directory, "texts.bin"), "rb") as texts_file:
+            for start in range(0, self.count, batch_size):
+                end = min(start + batch_size, self.count)
+                texts_file.seek(int(offsets[start]))
+                blob = texts_file.read(int(offsets[end] - offsets[start]))
+                base = offsets[start]
+                texts = [
+                    blob[offsets[i] - base:offsets[i + 1] - base].decode("utf-8") for i in range(start, end)
+                ]
+                metadatas = [
+                    {name: values[i] for name, values in columns.items() if values[i] != _MISSING}
+                    for i in range(start, end)
+                ]
+                yield ids[start:end], np.asarray(vectors[start:end], dtype=np.float32), texts, metadatas
+
+    def iter_records(self, name: str) -> Iterator[Dict]:
+        path = os.path.join(self.directory, f"{name}.bson")
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            yield from bson.decode_file_iter(f)
+
+
+def restore_vectors(vector_store, snapshot: Snapshot, batch_size: int = 1000) -> Dict:
+    """
+    把快照中的分块按批写入向量库
+
+    Returns:
+        Dict: 旧主键 → 新主键（主键保留时两者相同）
+    """
+    id_map = {}
+    for ids, vectors, texts, metadatas in snapshot.iter_batches(batch_size):
+        new_ids = write_vectors(vector_store, ids, vectors, texts, metadatas)
+        id_map.update(zip(ids, new_ids))
+    return id_map
+
+
+def insert_records(collection, records: Iterable[Dict], batch_size: int = 1000) -> int:
+    """按批 insert_many 写入 Mongo 记录，返回写入条数"""
+    batch, total = [], 0
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            total += len(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+        total += len(batch)
+    return total
@@ -0,0 +1,270 @@
+"""
+中文文本分块器
+
+CharacterTextSplitter / RecursiveCharacterTextSplitter 按字符数和通用分隔符切分，
+不认识中文句读，常把一句话从中间截断。
+
+ChineseTextSplitter:
+- 在整段文本的码点数组上一次性找出句子边界（以 。！？；… 及换行结尾，连带其后的右引号/右括号）
+- 按 token 数打包句子：累计不超过 chunk_size，相邻分块重叠末尾不超过 chunk_overlap 个 token 的整句
+- 「第X卷/篇/章」「卷之X」「【方名】」等古籍章节标记所在行开始新的分块，重叠不跨章节
+- 超长句子先按逗号/顿号等分句切开，仍超长再按长度硬切
+- 支持流式输入：SplitStream.feed() 每次接收一段文本，只缓存尚未确定的最后一个分块
+
+句子边界和 token 计数都用 NumPy 向量化计算，每个分块的结束位置在 token 前缀和上二分得到，
+Python 层的循环次数与分块数而不是句子数成正比。
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# 码点 → 字符类别的查找表（位标志），一次下标运算即可得到整段文本每个字符的类别
+_SENTENCE_END, _CLOSER, _NEWLINE, _WHITESPACE, _ALNUM = 1, 2, 4, 8, 16
+_CHAR_FLAGS = np.zeros(0x110000, dtype=np.uint8)
+_CHAR_FLAGS[[ord(c) for c in "。！？；!?;…"]] |= _SENTENCE_END
+_CHAR_FLAGS[[ord(c) for c in "”’」』）)】"]] |= _CLOSER
+_CHAR_FLAGS[0x0A] |= _NEWLINE
+_CHAR_FLAGS[[0x09, 0x0A, 0x0B, 0x0C, 0x0D, 0x20, 0xA0, 0x3000]] |= _WHITESPACE
+for _low, _high in (("0", "9"), ("A", "Z"), ("a", "z")):
+    _CHAR_FLAGS[ord(_low):ord(_high) + 1] |= _ALNUM
+# 超长句子的次级切分点
+CLAUSE_RE = re.compile(r"[^，、：,:]*[，、：,:]+")
+# 古籍章节标记（出现在行首）
+SECTION_RE = re.compile(
+    r"^[ \t　]*(?:第[一二三四五六七八九十百千零〇\d]+[卷篇章节回部]"
+    r"|卷[之第]?[一二三四五六七八九十百千零〇\d]+"
+    r"|【[^】\n]{1,20}】)",
+    re.MULTILINE
+)
+
+
+def _char_flags(text: str) -> np.ndarray:
+    return _CHAR_FLAGS[np.frombuffer(text.encode("utf-32-le"), dtype="<u4")]
+
+
+def _shift(mask: np.ndarray, offset: int) -> np.ndarray:
+    """mask 向后（offset > 0）或向前（offset < 0）平移，移出的位置补 False"""
+    shifted = np.zeros_like(mask)
+    if abs(offset) < len(mask):
+        if offset > 0:
+            shifted[offset:] = mask[:-offset]
+        else:
+            shifted[:offset] = mask[-offset:]
+    return shifted
+
+
+def _sentence_ends(flags: np.ndarray) -> np.ndarray:
+    """
+    句子结束位置（句子最后一个字符之后的下标）：
+    一串句末标点（连同紧跟的至多两个右引号/括号）之后，或一串换行之后
+    """
+    end = (flags & _SENTENCE_END).astype(bool)
+    closer = (flags & _CLOSER).astype(bool)
+    attached = closer & (_shift(end, 1) | (_shift(closer, 1) & _shift(end, 2)))
+    newline = (flags & _NEWLINE).astype(bool)
+    # 下一个字符仍属于同一串结尾标点/换行时不在此处断开（末尾之后视为普通字符）
+    continues_end = _shift(end | closer, -1)
+    mask = ((end | attached) & ~continues_end) | (newline & ~_shift(newline, -1))
+    return np.flatnonzero(mask) + 1
+
+
+def _token_starts(flags: np.ndarray) -> np.ndarray:
+    """
+    每个字符是否为一个 token 的开头：连续的 ASCII 字母数字算一个 token，
+    其余每个非空白字符算一个（中文 BERT 类分词器基本按字切分）
+    """
+    alnum = (flags & _ALNUM).astype(bool)
+    whitespace = (flags & _WHITESPACE).astype(bool)
+    return ~whitespace & ~(alnum & _shift(alnum, 1))
+
+
+def _strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    """text[start:end].strip() 在 text 中的位置"""
+    piece = text[start:end]
+    stripped = piece.lstrip()
+    start += len(piece) - len(stripped)
+    return start, start + len(stripped.rstrip())
+
+
+def approx_token_len(text: str) -> int:
+    return int(_token_starts(_char_flags(text)).sum())
+
+
+class ChineseTextSplitter:
+    def __init__(
+        self,
+        chunk_size: int = 500,
+        chunk_overlap: int = 50,
+        length_function: Optional[Callable[[str], int]] = None
+    ):
+        """
+        Args:
+            chunk_size: 每个分块的最大 token 数
+            chunk_overlap: 相邻分块重叠的最大 token 数
+            length_function: 计算 token 数的函数，默认为 approx_token_len（整段向量化计算）；
+                可传入 embedding 模型分词器，如 lambda t: len(tokenizer.tokenize(t))，此时逐句计算
+        """
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap 必须小于 chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length_function = length_function
+
+    def split_text(self, text: str) -> List[str]:
+        chunks, _ = self._pack(text, final=True)
+        return chunks
+
+    def split_spans(self, text: str) -> List[Tuple[int, int]]:
+        """与 split_text 相同的切分，返回每个分块在 text 中的 [start, end) 位置（已去掉首尾空白）"""
+        spans, _ = self._pack_spans(text, final=True)
+        return spans
+
+    def iter_split(self, blocks: Iterable[str]) -> Iterator[str]:
+        """流式切分：blocks 为任意切开的文本片段（如逐块解码的文件内容）"""
+        stream = self.stream()
+        for block in blocks:
+            yield from stream.feed(block)
+        yield from stream.finish()
+
+    def stream(self) -> "SplitStream":
+        return SplitStream(self)
+
+    def create_documents(self, texts: List[str], metadatas: Optional[List[dict]] = None):
+        from langchain_core.documents import Document
+
+        metadatas = metadatas or [{} for _ in texts]
+        return [
+            Document(page_content=chunk, metadata=dict(metadata))
+            for text, metadata in zip(texts, metadatas)
+            for chunk in self.split_text(text)
+        ]
+
+    def split_documents(self, documents):
+        """与 langchain TextSplitter.split_documents 兼容，返回与输入相同类型的 Document"""
+        return [
+            type(doc)(page_content=chunk, metadata=dict(doc.metadata))
+            for doc in documents
+            for chunk in self.split_text(doc.page_content)
+        ]
+
+    def _pack(self, buffer: str, final: bool) -> Tuple[List[str], int]:
+        """
+        把 buffer 打包成分块
+
+        Returns:
+            (chunks, consumed): 已确定的分块，以及 buffer 中已处理完的前缀长度；
+            final=False 时最后一个尚未确定的分块不输出，从 consumed 开始的文本需要留到下次
+        """
+        spans, consumed = self._pack_spans(buffer, final)
+        return [buffer[start:end] for start, end in spans], consumed
+
+    def _pack_spans(self, buffer: str, final: bool) -> Tuple[List[Tuple[int, int]], int]:
+        """同 _pack，分块以 buffer 中的 [start, end) 位置表示"""
+        flags = _char_flags(buffer)
+        bounds = self._sentence_bounds(flags, final)
+        tokens = self._token_prefix(buffer, flags, bounds)
+        bounds, tokens = self._split_long(buffer, flags, bounds, tokens)
+        n = len(bounds) - 1
+        if n <= 0:
+            return [], len(buffer) if final else 0
+        sections = self._section_starts(buffer, bounds).tolist()
+        bounds, tokens = bounds.tolist(), tokens.tolist()
+
+        spans: List[Tuple[int, int]] = []
+        start = 0
+        while start < n:
+            end = max(bisect_right(tokens, tokens[start] + self.chunk_size) - 1, start + 1)
+            next_section = bisect_right(sections, start)
+            capped = next_section < len(sections) and sections[next_section] <= end
+            if capped:
+                end = sections[next_section]
+            if end >= n and not final:
+                break  # 后面的文本可能还会并入这个分块
+            span = _strip_span(buffer, bounds[start], bounds[end])
+            if span[0] < span[1]:
+                spans.append(span)
+            if end >= n:
+                return spans, len(buffer)
+            if capped:
+                start = end
+                continue
+            # 下一块从末尾不超过 chunk_overlap 个 token 的整句开始，且要能放下下一句
+            overlap_start = bisect_left(tokens, tokens[end] - self.chunk_overlap)
+            fit_start = bisect_left(tokens, tokens[end + 1] - self.chunk_size)
+            start = min(max(overlap_start, fit_start, start + 1), end)
+        return spans, bounds[start]
+
+    def _sentence_bounds(self, flags: np.ndarray, final: bool) -> np.ndarray:
+        """句子边界（含开头的 0）"""
+        size = len(flags)
+        ends = _sentence_ends(flags)
+        # 恰好在缓冲区末尾结束的句子可能还有后续的引号/换行，留到下一次处理
+        if ends.size and ends[-1] == size and not final:
+            ends = ends[:-1]
+        last = ends[-1] if ends.size else 0
+        # 最后一段没有句末标点的文本；长时间没有标点（如无标点的扫描文本）时也不再等待
+        if last < size and (final or size - last > self.chunk_size * 4):
+            ends = np.append(ends, size)
+        return np.concatenate(([0], ends)).astype(np.int64)
+
+    def _token_prefix(self, buffer: str, flags: np.ndarray, bounds: np.ndarray) -> np.ndarray:
+        """每个句子边界之前的累计 token 数"""
+        if self.length_function is None:
+            prefix = np.zeros(len(flags) + 1, dtype=np.int64)
+            np.cumsum(_token_starts(flags), out=prefix[1:])
+            return prefix[bounds]
+        lengths = [self.length_function(buffer[a:b]) for a, b in zip(bounds, bounds[1:])]
+        return np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+
+    def _split_long(self, buffer: str, flags: np.ndarray, bounds: np.ndarray, tokens: np.ndarray):
+        """把超过 chunk_size 的句子在分句标点处切开，仍超长的按长度硬切"""
+        long_sentences = np.nonzero(np.diff(tokens) > self.chunk_size)[0]
+        if not long_sentences.size:
+            return bounds, tokens
+        extra = []
+        for k in long_sentences:
+            begin, end = bounds[k], bounds[k + 1]
+            cuts = [match.end() for match in CLAUSE_RE.finditer(buffer, begin, end)]
+            for a, b in zip([begin] + cuts, cuts + [end]):
+                piece_tokens = self._length(buffer[a:b])
+                if piece_tokens > self.chunk_size:
+                    # 每个 token 至少一个字符，按 chunk_size 个字符切分不会超长（自定义分词器时按比例估计）
+                    step = max(1, (b - a) * self.chunk_size // piece_tokens)
+                    extra.extend(range(a + step, b, step))
+            extra.extend(cuts)
+        bounds = np.union1d(bounds, np.asarray(extra, dtype=np.int64))
+        return bounds, self._token_prefix(buffer, flags, bounds)
+
+    @staticmethod
+    def _section_starts(buffer: str, bounds: np.ndarray) -> np.ndarray:
+        """章节标记所在行对应的句子序号（升序）"""
+        starts = np.array([match.start() for match in SECTION_RE.finditer(buffer)], dtype=np.int64)
+        index = np.searchsorted(bounds, starts)
+        valid = index < len(bounds)
+        index, starts = index[valid], starts[valid]
+        return index[bounds[index] == starts]
+
+    def _length(self, text: str) -> int:
+        return (self.length_function or approx_token_len)(text)
+
+
+class SplitStream:
+    """ChineseTextSplitter 的增量切分状态，只缓存尚未确定的最后一个分块"""
+
+    def __init__(self, splitter: ChineseTextSplitter):
+        self.splitter = splitter
+        self._tail = ""
+
+    def feed(self, text: str) -> List[str]:
+        buffer = self._tail + text
+        chunks, consumed = self.splitter._pack(buffer, final=False)
+        self._tail = buffer[consumed:]
+        return chunks
+
+    def finish(self) -> List[str]:
+        buffer, self._tail = self._tail, ""
+        chunks, _ = self.splitter._pack(buffer, final=True)
+        return chunks
@@ -0,0 +1,115 @@
+"""
+大文件流式解码与分块
+
+古籍文本文件可达数十 MB，整体读入再切分会让内存随文件大小增长。
+这里按字节块增量处理：
+- StreamDecoder: 缓冲开头一小段字节检测编码（BOM / UTF-8 / GB18030），之后用增量解码器逐块解码，
+  多字节字符跨块时由解码器保留不完整的尾部字节
+- IncrementalChunker: ChineseTextSplitter 的流式接口，只缓存未结束的半句和当前分块
+两者组合后内存占用只与 chunk_size 和读块大小有关，与文件大小无关。
+"""
+
+import codecs
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+
+from .splitter import ChineseTextSplitter
+
+DETECT_BYTES = 64 * 1024  # 检测编码使用的开头字节数
+READ_SIZE = 64 * 1024
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def detect_encoding(sample: bytes) -> str:
+    """
+    根据文件开头的字节判断编码
+
+    有 BOM 时以 BOM 为准；否则能按 UTF-8 解码（允许末尾截断半个字符）即为 UTF-8，
+    其余按 GB18030 处理（GBK / GB2312 的超集，扫描古籍常见）。
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "gb18030"
+
+
+class StreamDecoder:
+    """字节块 → 文本块的增量解码器"""
+
+    def __init__(self, encoding: Optional[str] = None, errors: str = "replace"):
+        self.encoding = encoding
+        self.errors = errors
+        self._pending = b""
+        self._decoder = None
+        if encoding:
+            self._decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+
+    def decode(self, data: bytes, final: bool = False) -> str:
+        if self._decoder is None:
+            self._pending += data
+            if len(self._pending) < DETECT_BYTES and not final:
+                return ""
+            self.encoding = detect_encoding(self._pending)
+            self._decoder = codecs.getincrementaldecoder(self.encoding)(errors=self.errors)
+            data, self._pending = self._pending, b""
+        return self._decoder.decode(data, final=final)
+
+
+class IncrementalChunker:
+    """
+    增量分块器
+
+    feed() 每次接收一段文本，返回已经可以确定的分块；finish() 返回剩余文本。
+    """
+
+    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50,
+                 splitter: Optional[ChineseTextSplitter] = None):
+        self.splitter = splitter or ChineseTextSplitter(chunk_size, chunk_overlap)
+        self._stream = self.splitter.stream()
+
+    def feed(self, text: str) -> List[str]:
+        return self._stream.feed(text)
+
+    def finish(self) -> List[str]:
+        return self._stream.finish()
+
+
+def iter_text_chunks(
+    blocks: Iterable[bytes],
+    chunker: Optional[IncrementalChunker] = None,
+    decoder: Optional[StreamDecoder] = None
+) -> Iterator[str]:
+    """把字节块序列流式解码并分块"""
+    chunker = chunker or IncrementalChunker()
+    decoder = decoder or StreamDecoder()
+    for block in blocks:
+        yield from chunker.feed(decoder.decode(block))
+    yield from chunker.feed(decoder.decode(b"", final=True))
+    yield from chunker.finish()
+
+
+def iter_file_blocks(fileobj: BinaryIO, size: int = READ_SIZE) -> Iterator[bytes]:
+    while True:
+        block = fileobj.read(size)
+        if not block:
+            return
+        yield block
+
+
+def iter_file_chunks(path: str, chunk_size: int = 500, chunk_overlap: int = 50,
+                     encoding: Optional[str] = None) -> Iterator[str]:
+    """按块读取文件并流式分块，不把整个文件读入内存"""
+    with open(path, "rb") as f:
+        yield from iter_text_chunks(
+            iter_file_blocks(f),
+            IncrementalChunker(chunk_size, chunk_overlap),
+            StreamDecoder(encoding)
+        )
@@ -0,0 +1,325 @@
+"""
+本地内存向量库
+
+LocalVectorStore 实现了 RAG 服务用到的 Milvus（langchain）接口子集：
+add_texts / similarity_search / similarity_search_by_vector /
+similarity_search_with_score(_by_vector) / delete，
+向量保存在一个连续的 float32 矩阵中，检索是一次矩阵乘法 + argpartition。
+检索支持 filter 参数（见 rag_service.filters），对应 Milvus 的 expr：
+先用标量字段的列式索引（ids 条件按主键）算出满足条件的行，只对这些行计算相似度。
+
+用于离线基准测试和本地开发，不做持久化（需要时用 rag_service.snapshot 导出/导入）。
+write_vectors 向 LocalVectorStore 或 Milvus 写入已计算好的向量（不再调用 embedding 模型）。
+注意：score 为余弦相似度（越大越相似），而 Milvus 默认返回 L2 距离（越小越相似）。
+"""
+
+import json
+import threading
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .filters import SCALAR_FIELDS, decode_tags
+
+
+@dataclass
+class Document:
+    """与 langchain Document 字段一致的检索结果"""
+    page_content: str
+    metadata: Dict = field(default_factory=dict)
+
+
+class _FilterIndex:
+    """过滤字段的列式索引：category / doc_type / kb_id 编码为整数列，每个标签一列布尔值"""
+
+    def __init__(self):
+        self.vocab = {name: {"": 0} for name in SCALAR_FIELDS}
+        self.codes = {name: np.zeros(0, dtype=np.int32) for name in SCALAR_FIELDS}
+        self.tags: Dict[str, np.ndarray] = {}
+        self.size = 0
+
+    def append(self, metadatas: List[Dict]):
+        n = len(metadatas)
+        for name in SCALAR_FIELDS:
+            vocab = self.vocab[name]
+            new = np.fromiter(
+                (vocab.setdefault(str(m.get(name) or ""), len(vocab)) for m in metadatas), dtype=np.int32, count=n
+            )
+            self.codes[name] = np.concatenate([self.codes[name], new])
+        for tag in self.tags:
+            self.tags[tag] = np.concatenate([self.tags[tag], np.zeros(n, dtype=bool)])
+        for i, metadata in enumerate(metadatas):
+            for tag in decode_tags(metadata.get("tags")):
+                column = self.tags.get(tag)
+                if column is None:
+                    column = self.tags[tag] = np.zeros(self.size + n, dtype=bool)
+                column[self.size + i] = True
+        self.size += n
+
+    def keep(self, rows: List[int]):
+        for name in SCALAR_FIELDS:
+            self.codes[name] = self.codes[name][rows]
+        kept = {tag: column[rows] for tag, column in self.tags.items()}
+        self.tags = {tag: column for tag, column in kept.items() if column.any()}
+        self.size = len(rows)
+
+    def mask(self, filters: Dict) -> np.ndarray:
+        mask = np.ones(self.size, dtype=bool)
+        for name in SCALAR_FIELDS:
+            if filters.get(name):
+                code = self.vocab[name].get(str(filters[name]))
+                if code is None:
+                    return np.zeros(self.size, dtype=bool)
+                mask &= self.codes[name] == code
+        for tag in filters.get("tags") or []:
+            column = self.tags.get(tag)
+            if column is None:
+                return np.zeros(self.size, dtype=bool)
+            mask &= column
+        return mask
+
+
+class LocalVectorStore:
+    def __init__(self, embedding_function, collection_name: str = "local"):
+        self.embedding_func = embedding_function
+        self.collection_name = collection_name
+        self._lock = threading.RLock()
+        self._vectors: Optional[np.ndarray] = None  # 按容量翻倍扩展，前 self._size 行有效
+        self._size = 0
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict] = []
+        self._filter_index = _FilterIndex()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        # 调用方用 `if vector_store:` 判断是否已初始化，空库也应为真
+        return True
+
+    @property
+    def embeddings(self):
+        return self.embedding_func
+
+    @property
+    def nbytes(self) -> int:
+        """有效向量占用的字节数"""
+        return self._vectors[:self._size].nbytes if self._size else 0
+
+    def add_texts(
+        self,
+        texts: List[str],
+        metadatas: Optional[List[Dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs
+    ) -> List[str]:
+        """计算 embedding 并写入，返回主键列表"""
+        texts = list(texts)
+        if not texts:
+            return []
+        embeddings = self.embedding_func.embed_documents(texts)
+        return self.add_embeddings(texts, embeddings, metadatas=metadatas, ids=ids)
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings,
+        metadatas: Optional[List[Dict]] = None,
+        ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """直接写入已计算好的向量（不再调用 embedding 模型）"""
+        matrix = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+
+        with self._lock:
+            self._reserve(self._size + len(texts), matrix.shape[1])
+            self._vectors[self._size:self._size + len(texts)] = matrix
+            self._size += len(texts)
+            self._ids.extend(ids)
+            self._texts.extend(texts)
+            self._metadatas.extend({**metadata, "pk": pk} for metadata, pk in zip(metadatas, ids))
+            self._filter_index.append(metadatas)
+        return list(ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs) -> bool:
+        if not ids:
+            return False
+        targets = set(ids)
+        with self._lock:
+            keep = [i for i, pk in enumerate(self._ids) if pk not in targets]
+            if len(keep) == self._size:
+                return False
+            vectors = self._vectors[keep] if keep else None
+            self._ids = [self._ids[i] for i in keep]
+            self._texts = [self._texts[i] for i in keep]
+            self._metadatas = [self._metadatas[i] for i in keep]
+            self._filter_index.keep(keep)
+            self._vectors = vectors
+            self._size = len(keep)
+        return True
+
+    def _search(self, embedding: List[float], k: int, filter: Optional[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """在锁内调用：返回按相似度降序的 top-k 行号和分数"""
+        empty = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if self._size == 0:
+            return empty
+        rows = None
+        if filter:
+            mask = self._filter_index.mask(filter)
+            if filter.get("ids") is not None:
+                targets = {str(pk) for pk in filter["ids"]}
+                mask &= np.fromiter((pk in targets for pk in self._ids), dtype=bool, count=self._size)
+            rows = np.flatnonzero(mask)
+        if rows is not None and rows.size == 0:
+            return empty
+        vectors = self._vectors[:self._size] if rows is None else self._vectors[rows]
+        query = self._normalize(np.asarray(embedding, dtype=np.float32)[None, :])[0]
+        scores = vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return (top if rows is None else rows[top]), scores[top]
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        score_threshold: Optional[float] = None,
+        filter: Optional[Dict] = None,
+        **kwargs
+    ) -> List[Tuple[Document, float]]:
+        """
+        Args:
+            filter: 过滤条件（rag_service.filters.build_filters），只在满足条件的分块中检索
+        """
+        with self._lock:
+            top, scores = self._search(embedding, k, filter)
+            results = [
+                (Document(self._texts[i], dict(self._metadatas[i])), float(score))
+                for i, score in zip(top, scores)
+            ]
+        if score_threshold is not None:
+            results = [(doc, score) for doc, score in results if score >= score_threshold]
+        return results
+
+    def similarity_search_with_vectors_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict] = None,
+        **kwargs
+    ) -> List[Tuple[Document, np.ndarray]]:
+        """返回 top-k 分块及其（归一化的）向量，供 MMR 等重排使用"""
+        with self._lock:
+            top, _ = self._search(embedding, k, filter)
+            return [
+                (Document(self._texts[i], dict(self._metadatas[i])), self._vectors[i].copy())
+                for i in top
+            ]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        embedding = self.embedding_func.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def get_by_ids(self, ids: List[str]) -> List[Document]:
+        """按主键取分块（不存在的主键忽略）"""
+        targets = set(ids)
+        with self._lock:
+            return [
+                Document(self._texts[i], dict(self._metadatas[i]))
+                for i, pk in enumerate(self._ids) if pk in targets
+            ]
+
+    def iter_rows(self, batch_size: int = 1000, filter: Optional[Dict] = None):
+        """
+        按批导出全部分块（调用时的快照）
+
+        Args:
+            filter: 只导出满足条件的分块（同检索的 filter）
+
+        Yields:
+            (ids, vectors, texts, metadatas): 向量为 (n, dim) float32（已归一化），元数据不含 pk
+        """
+        with self._lock:
+            if filter:
+                rows = np.flatnonzero(self._filter_index.mask(filter))
+                size = len(rows)
+                vectors = self._vectors[rows] if size else None
+                ids = [self._ids[i] for i in rows]
+                texts = [self._texts[i] for i in rows]
+                metadatas = [self._metadatas[i] for i in rows]
+            else:
+                size = self._size
+                vectors = self._vectors[:size].copy() if size else None
+                ids, texts, metadatas = list(self._ids), list(self._texts), list(self._metadatas)
+        for start in range(0, size, batch_size):
+            end = min(start + batch_size, size)
+            yield (
+                ids[start:end],
+                vectors[start:end],
+                texts[start:end],
+                [{key: value for key, value in metadata.items() if key != "pk"} for metadata in metadatas[start:end]]
+            )
+
+    def _reserve(self, size: int, dim: int):
+        if self._vectors is None:
+            self._vectors = np.zeros((max(size, 1024), dim), dtype=np.float32)
+        elif size > self._vectors.shape[0]:
+            grown = np.zeros((max(size, self._vectors.shape[0] * 2), dim), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+def get_chunks(vector_store, ids: List[str]) -> List[Document]:
+    """
+    按主键取分块全文：LocalVectorStore 直接查找，Milvus（langchain）按主键查询标量字段
+    Milvus 的自增主键为 int64，字符串形式的数字会先转换回整数
+    """
+    if hasattr(vector_store, "get_by_ids"):
+        return vector_store.get_by_ids(ids)
+
+    pk_field, text_field = vector_store._primary_field, vector_store._text_field
+    keys = [int(pk) if str(pk).lstrip("-").isdigit() else pk for pk in ids]
+    output_fields = [name for name in vector_store.fields if name != vector_store._vector_field]
+    rows = vector_store.col.query(expr=f"{pk_field} in {json.dumps(keys)}", output_fields=output_fields)
+    return [Document(row.pop(text_field), row) for row in rows]
+
+
+def write_vectors(vector_store, ids: List, vectors: np.ndarray, texts: List[str], metadatas: List[Dict]) -> List:
+    """
+    写入已计算好的向量，返回新主键（LocalVectorStore 保留原主键；Milvus 自增主键时为新分配的主键）
+    """
+    if hasattr(vector_store, "add_embeddings"):
+        return vector_store.add_embeddings(texts, vectors, metadatas=metadatas, ids=[str(pk) for pk in ids])
+
+    if vector_store.col is None:
+        # 新 collection：按第一条数据建表、建索引（与 langchain Milvus.add_texts 相同）
+        vector_store._init(embeddings=vectors[:1].tolist(), metadatas=metadatas[:1])
+    pk_field = vector_store._primary_field
+    columns = {
+        vector_store._text_field: texts,
+        vector_store._vector_field: vectors.tolist(),
+        pk_field: list(ids),
+    }
+    for name in vector_store.fields:
+        if name not in columns:
+            columns[name] = [metadata.get(name) for metadata in metadatas]
+    data = [columns[name] for name in vector_store.fields if not (name == pk_field and vector_store.auto_id)]
+    result = vector_store.col.insert(data)
+    return list(result.primary_keys) if vector_store.auto_id else list(ids)
@@ -0,0 +1,67 @@
+"""
+文档版本（写时复制）
+
+rag2 的文档每次更新内容都生成一个新版本，旧版本只保存引用，不复制分块：
+- 分块按内容寻址：vector_refs 中每个向量记录分块文本的哈希（chunk_hash），
+  写入新版本时内容相同的分块直接引用已有向量（同一文档的旧版本或其他文档），不重新计算 embedding；
+  开启近似去重时，哈希未命中的分块再按 MinHash 查找近似重复
+- 向量的引用为 (文档, 版本的 vector_rev, 分块序号)，旧版本的引用在保留期内不释放，
+  新旧版本共用的分块只存一份向量
+- 文档记录始终是当前版本；旧版本归档在 document_versions 中（内容、元数据、vector_ids、vector_rev）
+- 默认检索只返回当前版本引用的分块：命中的向量按引用判断是否属于某个文档的当前版本（is_current_hit）
+- 保留策略（expired_versions）：每个文档保留最近 keep 个旧版本、且不早于 max_age 秒；
+  超出的版本释放引用，不再被任何版本引用的向量随之删除
+"""
+
+import hashlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+
+def chunk_hash(text: str) -> str:
+    """分块内容的寻址键（UTF-8 文本的 SHA-256）"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def is_current_hit(refs: Optional[List[Dict]], current_revs: Dict[str, Optional[str]]) -> bool:
+    """
+    命中的向量是否被某个文档的当前版本引用
+
+    Args:
+        refs: 向量在 vector_refs 中的引用 [{"doc_id", "rev", "chunk_index"}, ...]；
+            None 表示没有引用记录（版本功能上线前写入的向量），视为当前版本
+        current_revs: 文档ID → 当前版本的 vector_rev（已删除的文档不在其中）
+    """
+    if refs is None:
+        return True
+    return any(
+        ref["doc_id"] in current_revs and ref.get("rev") in (None, current_revs[ref["doc_id"]])
+        for ref in refs
+    )
+
+
+def expired_versions(
+    versions: Iterable[Dict],
+    keep: int = 0,
+    max_age: float = 0,
+    now: Optional[datetime] = None
+) -> List[Dict]:
+    """
+    按保留策略选出要清理的旧版本
+
+    Args:
+        versions: 同一文档的旧版本记录（含 version 和 archived_at）
+        keep: 保留最近的旧版本数，0 表示不按数量清理
+        max_age: 旧版本归档后保留的秒数，0 表示不按时间清理
+        now: 当前时间（UTC）
+
+    Returns:
+        List[Dict]: 要清理的版本，按版本号升序
+    """
+    ordered = sorted(versions, key=lambda version: version["version"], reverse=True)
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=max_age) if max_age else None
+    expired = [
+        version for index, version in enumerate(ordered)
+        if (keep and index >= keep) or (cutoff is not None and version["archived_at"] < cutoff)
+    ]
+    return expired[::-1]
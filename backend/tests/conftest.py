@@ -0,0 +1,17 @@
+"""
+pytest 公共配置：把 backend/ 和 backend/legacy/ 加入 sys.path，并设置导入 legacy 配置所需的环境变量
+"""
+
+import os
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+for path in (BACKEND_DIR, BACKEND_DIR / "legacy"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+os.environ.setdefault("DOUBAO_AK", "test-api-key")
+os.environ.setdefault("VECTOR_STORE_BACKEND", "local")
+os.environ.setdefault("EMBEDDING_ENGINE", "hash")
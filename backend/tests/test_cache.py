@@ -0,0 +1,69 @@
+import pytest
+
+from rag_service import cache as cache_module
+from rag_service.cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache("test_ttl", ttl=10)
+    cache.set("a", 1)
+    clock[0] += 9
+    assert cache.get("a") == 1
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache("test_lru", maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_maxbytes_limits_total_size():
+    cache = TTLCache("test_bytes", maxbytes=10, sizeof=len)
+    cache.set("a", "x" * 6)
+    cache.set("b", "x" * 6)
+    assert cache.get("a") is None and cache.nbytes == 6
+    cache.set("huge", "x" * 11)
+    assert cache.get("huge") is None and cache.get("b") == "x" * 6
+
+
+def test_maxbytes_requires_sizeof():
+    with pytest.raises(ValueError):
+        TTLCache("test_invalid", maxbytes=10)
+
+
+def test_get_or_load_does_not_cache_none():
+    cache = TTLCache("test_load")
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return None
+
+    assert cache.get_or_load("missing", loader) is None
+    assert cache.get_or_load("missing", loader) is None
+    assert len(calls) == 2
+    assert cache.get_or_load("kb", lambda: {"acl": []}) == {"acl": []}
+    assert cache.get_or_load("kb", lambda: pytest.fail("not cached")) == {"acl": []}
+
+
+def test_invalidate_and_hit_rate():
+    cache = TTLCache("test_invalidate")
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    cache.invalidate("a")
+    assert cache.get("a") is None
+    assert cache.hit_rate == 0.5
@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+
+from rag_service.dedup import Deduplicator, MinHasher, jaccard, normalize, optimal_bands
+
+TEXT = "太阳之为病，脉浮，头项强痛而恶寒。太阳病，发热，汗出，恶风，脉缓者，名为中风。"
+
+
+def test_normalize_ignores_whitespace_and_punctuation():
+    assert normalize("太阳 之为病，脉浮。\n") == "太阳之为病脉浮"
+
+
+def test_signature_is_deterministic_and_punctuation_insensitive():
+    hasher = MinHasher()
+    signature = hasher.signature(TEXT)
+    assert signature.dtype == np.uint32 and signature.shape == (128,)
+    assert np.array_equal(signature, MinHasher().signature(TEXT.replace("，", ",")))
+    assert jaccard(signature, hasher.signature("伤寒论 桂枝汤方 桂枝三两去皮 芍药三两 甘草二两炙")) < 0.2
+
+
+def test_optimal_bands_uses_whole_signature():
+    bands, rows = optimal_bands(0.85, 128)
+    assert bands * rows <= 128
+    assert rows > 1
+
+
+def test_deduplicator_finds_near_duplicates():
+    dedup = Deduplicator(threshold=0.8)
+    key, signature = dedup.check(TEXT)
+    assert key is None
+    dedup.add("v1", signature)
+
+    # 另一版本只差句读和一个字
+    key, _ = dedup.check(TEXT.replace("，", "、").replace("名为", "名曰"))
+    assert key == "v1"
+    key, _ = dedup.check("阳明之为病，胃家实是也。问曰：何缘得阳明病？")
+    assert key is None
+    assert dedup.report() == {"chunks": 3, "unique": 2, "duplicates": 1, "dedup_ratio": 1 / 3}
+
+
+def test_deduplicator_rename_and_remove():
+    dedup = Deduplicator(threshold=0.8)
+    _, signature = dedup.check(TEXT)
+    dedup.add(("pending", "doc", 0), signature)
+    dedup.rename(("pending", "doc", 0), 42)
+    assert dedup.check(TEXT)[0] == 42
+    dedup.remove(42)
+    assert len(dedup) == 0
+    assert dedup.check(TEXT)[0] is None
+
+
+def test_chunk_metadata_encodes_references():
+    from rag_service.retriever import chunk_metadata
+
+    metadata = chunk_metadata("伤寒论/宋本", ["伤寒论/赵开美本"])
+    assert metadata["source"] == "伤寒论/宋本"
+    assert json.loads(metadata["references"]) == ["伤寒论/赵开美本"]
+    assert chunk_metadata("a")["references"] == "[]"
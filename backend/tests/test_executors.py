@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+import pytest
+
+from rag_service import executors
+from rag_service.executors import INGEST, QUERY, BoundedExecutor, ExecutorBusy
+
+
+@pytest.fixture
+def pool():
+    pool = BoundedExecutor("test", 2, {QUERY: (2, 4), INGEST: (1, 1)})
+    yield pool
+    pool.shutdown()
+
+
+def test_ingest_lane_limits_active_tasks(pool):
+    release, started = threading.Event(), threading.Event()
+
+    def blocking():
+        started.set()
+        return release.wait(timeout=5)
+
+    first = pool.submit(INGEST, blocking)
+    assert started.wait(timeout=5)
+    queued = pool.submit(INGEST, lambda: "later")
+    # 第二个 ingest 任务在排队，query 通道仍有空闲线程
+    assert pool.submit(QUERY, lambda: "query").result(timeout=5) == "query"
+    assert pool.stats()[INGEST] == {"queued": 1, "active": 1, "max_active": 1}
+
+    with pytest.raises(ExecutorBusy):
+        pool.submit(INGEST, lambda: None)
+
+    release.set()
+    assert first.result(timeout=5) is True
+    assert queued.result(timeout=5) == "later"
+
+
+def test_run_propagates_exceptions(pool):
+    def boom():
+        raise ValueError("bad")
+
+    with pytest.raises(ValueError):
+        asyncio.run(pool.run(QUERY, boom))
+
+
+def test_call_embedding_runs_in_embedding_pool():
+    def thread_name():
+        return threading.current_thread().name
+
+    # 在向量库线程池的任务中同步调用 embedding 线程池
+    name = asyncio.run(executors.run_vector_store(
+        INGEST, executors.call_embedding, INGEST, thread_name
+    ))
+    assert name.startswith(executors.EMBEDDING_POOL)
@@ -0,0 +1,44 @@
+from rag_service.filters import (
+    build_filters, chunk_fields, decode_tags, encode_tags, matches, restore_fields, to_milvus_expr
+)
+
+
+def test_tags_round_trip():
+    assert encode_tags(["伤寒", "", "方剂"]) == "|伤寒|方剂|"
+    assert encode_tags(None) == ""
+    assert decode_tags("|伤寒|方剂|") == ["伤寒", "方剂"]
+    assert decode_tags(["a"]) == ["a"]
+    assert restore_fields({"tags": "|a|"}) == {"tags": ["a"]}
+
+
+def test_chunk_fields_fill_missing_values():
+    assert chunk_fields({"category": "方剂", "tags": ["a"]}) == {
+        "category": "方剂", "doc_type": "", "kb_id": "", "tags": "|a|"
+    }
+
+
+def test_build_filters_drops_empty_values():
+    assert build_filters(category="方剂", tags=[], kb_id="") == {"category": "方剂"}
+    assert to_milvus_expr(build_filters()) is None
+
+
+def test_to_milvus_expr_combines_clauses():
+    expr = to_milvus_expr({"category": "方剂", "kb_id": "k1", "tags": ["伤寒"], "ids": ["12", "abc"]})
+    assert expr == 'category == "方剂" and kb_id == "k1" and tags like "%|伤寒|%" and pk in [12, "abc"]'
+
+
+def test_to_milvus_expr_escapes_quotes_and_backslashes():
+    assert to_milvus_expr({"category": 'a"b\\c'}) == 'category == "a\\"b\\\\c"'
+
+
+def test_to_milvus_expr_escapes_like_wildcards():
+    # 标签中的 % 和 _ 按字面匹配：like 转义为 \% / \_，再作为字符串字面量转义反斜杠
+    assert to_milvus_expr({"tags": ["10%_off"]}) == 'tags like "%|10\\\\%\\\\_off|%"'
+
+
+def test_matches_has_same_semantics():
+    metadata = {"category": "方剂", "kb_id": "k1", "tags": "|伤寒|金匮|", "pk": 12}
+    assert matches(metadata, {"category": "方剂", "tags": ["伤寒"], "ids": ["12"]})
+    assert not matches(metadata, {"tags": ["伤寒", "温病"]})
+    assert not matches(metadata, {"ids": [13]})
+    assert matches(metadata, None)
@@ -0,0 +1,128 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from rag_service.executors import ExecutorBusy
+from rag_service.ingest_jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, IngestJobStore, IngestWorkerPool
+
+
+@pytest.fixture
+def store():
+    return IngestJobStore(mongomock.MongoClient().db.ingest_jobs, lease=60, max_attempts=2)
+
+
+def _expire_lease(store, job_id):
+    store.collection.update_one(
+        {"status": RUNNING, "_id": store.get(job_id)["_id"]},
+        {"$set": {"heartbeat": datetime.utcnow() - timedelta(seconds=store.lease + 1)}}
+    )
+
+
+def test_claim_returns_oldest_jobs_first(store):
+    ids = [store.create("knowledge.create", {"n": i}) for i in range(3)]
+
+    jobs = store.claim("w", limit=2)
+
+    assert [str(job["_id"]) for job in jobs] == ids[:2]
+    assert all(job["status"] == RUNNING and job["attempts"] == 1 for job in jobs)
+    assert store.counts() == {QUEUED: 1, RUNNING: 2}
+
+
+def test_claim_only_requested_kinds(store):
+    store.create("document.create", {})
+    wanted = store.create("knowledge.create", {})
+
+    jobs = store.claim("w", limit=5, kinds=["knowledge.create"])
+
+    assert [str(job["_id"]) for job in jobs] == [wanted]
+    assert store.counts()[QUEUED] == 1
+
+
+def test_running_job_is_reclaimed_after_lease_expires(store):
+    job_id = store.create("knowledge.create", {})
+    store.claim("w1", limit=1)
+    assert store.claim("w2", limit=1) == []
+
+    _expire_lease(store, job_id)
+    jobs = store.claim("w2", limit=1)
+
+    assert [job["worker"] for job in jobs] == ["w2"]
+    assert jobs[0]["attempts"] == 2
+
+
+def test_job_fails_after_max_attempts(store):
+    job_id = store.create("knowledge.create", {})
+    for _ in range(store.max_attempts):
+        store.claim("w", limit=1)
+        _expire_lease(store, job_id)
+
+    assert store.claim("w", limit=1) == []
+    job = store.get(job_id)
+    assert job["status"] == FAILED
+    assert "2 次" in job["error"]
+
+
+def test_release_does_not_count_attempt(store):
+    job_id = store.create("knowledge.create", {})
+    store.claim("w", limit=1)
+    store.release(job_id)
+
+    job = store.get(job_id)
+    assert job["status"] == QUEUED
+    assert job["attempts"] == 0
+
+
+def test_succeed_drops_payload(store):
+    job_id = store.create("knowledge.create", {"text": "全文"})
+    store.claim("w", limit=1)
+    store.succeed(job_id, {"doc_id": "d1"})
+
+    job = store.collection.find_one({})
+    assert job["status"] == SUCCEEDED
+    assert job["result"] == {"doc_id": "d1"}
+    assert "payload" not in job
+
+
+def test_get_invalid_id_returns_none(store):
+    assert store.get("not-an-object-id") is None
+
+
+def test_worker_pool_runs_handlers_and_releases_busy_jobs(store):
+    ok_id = store.create("ok", {"value": 1})
+    broken_id = store.create("broken", {})
+    busy_id = store.create("busy", {})
+    other_id = store.create("other", {})
+
+    async def ok(payload, progress):
+        progress(1, 1)
+        return {"value": payload["value"]}
+
+    async def busy(payload, progress):
+        raise ExecutorBusy("full")
+
+    async def broken(payload, progress):
+        raise ValueError("bad")
+
+    async def main():
+        pool = IngestWorkerPool(store, {"ok": ok, "busy": busy, "broken": broken},
+                                workers=1, batch_size=1, poll_interval=0.01)
+        pool.start()
+        for _ in range(200):
+            await asyncio.sleep(0.01)
+            if store.get(ok_id)["status"] == SUCCEEDED and store.get(broken_id)["status"] == FAILED:
+                break
+        await pool.stop()
+        return pool
+
+    pool = asyncio.run(main())
+
+    assert store.get(ok_id)["result"] == {"value": 1}
+    assert store.get(ok_id)["progress"] == {"embedded": 1, "total": 1}
+    assert store.get(broken_id)["error"] == "ValueError: bad"
+    assert store.get(busy_id)["status"] == QUEUED
+    # 没有处理函数的任务类型不会被认领
+    assert store.get(other_id)["status"] == QUEUED
+    assert pool.completed == 1 and pool.failed == 1
@@ -0,0 +1,71 @@
+import asyncio
+
+from rag_service import metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    hist = metrics.Histogram("test_hist_seconds", "测试", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        hist.observe(value)
+
+    samples = hist._samples()
+    assert 'test_hist_seconds_bucket{le="0.1"} 1' in samples
+    assert 'test_hist_seconds_bucket{le="1.0"} 3' in samples
+    assert 'test_hist_seconds_bucket{le="+Inf"} 4' in samples
+    assert "test_hist_seconds_count 4" in samples
+
+
+def test_histogram_quantiles_use_sliding_window():
+    hist = metrics.Histogram("test_quantile_seconds", "测试")
+    for value in range(1, 101):
+        hist.observe(float(value))
+
+    quantiles = hist.labels().quantiles()
+    assert quantiles[0.5] == 51.0
+    assert quantiles[0.99] == 100.0
+    assert metrics.Histogram("test_empty_seconds", "测试").labels().quantiles()[0.5] == 0.0
+
+
+def test_labels_are_escaped():
+    counter = metrics.Counter("test_escape_total", "测试", ["stage"])
+    counter.labels(stage='a"b\n').inc()
+    assert counter._samples() == ['test_escape_total{stage="a\\"b\\n"} 1.0']
+
+
+def test_observe_stage_records_errors_and_request_timings():
+    timings = []
+    token = metrics._request_timings.set(timings)
+    try:
+        with metrics.observe_stage("test_ok"):
+            pass
+        try:
+            with metrics.observe_stage("test_fail"):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+    finally:
+        metrics._request_timings.reset(token)
+
+    assert [stage for stage, _ in timings] == ["test_ok", "test_fail"]
+    assert metrics.STAGE_ERRORS.labels(stage="test_fail").value == 1
+    assert metrics.STAGE_CALLS.labels(stage="test_fail").value == 1
+
+
+def test_timed_supports_coroutines():
+    @metrics.timed("test_async")
+    async def work():
+        return 42
+
+    assert asyncio.run(work()) == 42
+    assert metrics.STAGE_CALLS.labels(stage="test_async").value == 1
+
+
+def test_format_server_timing_merges_stages():
+    header = metrics.format_server_timing([("embed", 0.01), ("llm", 0.5), ("embed", 0.02)], total=0.6)
+    assert header == "embed;dur=30.0, llm;dur=500.0, total;dur=600.0"
+
+
+def test_registry_returns_existing_metric():
+    first = metrics.counter("test_registry_total", "测试")
+    assert metrics.counter("test_registry_total", "测试") is first
+    assert "# TYPE test_registry_total counter" in metrics.render_prometheus()
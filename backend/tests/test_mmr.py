@@ -0,0 +1,113 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from rag_service.embeddings import HashEmbeddings
+from rag_service.mmr import mmr_search, mmr_select, scored_search, search_with_vectors
+from rag_service.vectorstore import LocalVectorStore
+
+
+class FakeCollection:
+    """记录 search 调用的 pymilvus Collection 替身，不支持 query（检索不应再按主键二次查询）"""
+
+    def __init__(self, rows, metric="L2"):
+        self.rows = rows
+        self.metric = metric
+        self.searches = []
+
+    def search(self, data, anns_field, param, limit, expr, output_fields, timeout=None, **kwargs):
+        self.searches.append(output_fields)
+        query = np.asarray(data[0], dtype=np.float32)
+        hits = []
+        for pk, row in self.rows.items():
+            vector = np.asarray(row["vector"], dtype=np.float32)
+            score = float(((vector - query) ** 2).sum()) if self.metric == "L2" else float(vector @ query)
+            entity = {name: row[name] for name in output_fields}
+            hits.append(SimpleNamespace(id=pk, score=score, entity=entity))
+        hits.sort(key=lambda hit: hit.score, reverse=self.metric != "L2")
+        return [hits[:limit]]
+
+    def query(self, **kwargs):
+        raise AssertionError("unexpected second round trip")
+
+
+class FakeMilvus:
+    _primary_field = "pk"
+    _text_field = "text"
+    _vector_field = "vector"
+    fields = ["pk", "text", "source", "vector"]
+
+    def __init__(self, rows, metric="L2"):
+        self.col = FakeCollection(rows, metric)
+        self.search_params = {"metric_type": metric, "params": {}}
+        self.index_params = None
+
+    def _parse_document(self, data):
+        return SimpleNamespace(page_content=data.pop("text"), metadata=data)
+
+
+def _unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+@pytest.fixture
+def milvus():
+    return FakeMilvus({
+        1: {"text": "a", "source": "s1", "vector": _unit(1, 0)},
+        2: {"text": "b", "source": "s2", "vector": _unit(1, 1)},
+        3: {"text": "c", "source": "s3", "vector": _unit(0, 1)},
+    })
+
+
+def test_mmr_select_prefers_diverse_candidates():
+    candidates = [[1, 0], [1, 0.01], [0, 1]]
+    selected, relevance = mmr_select([1, 0], candidates, k=2, lambda_mult=0.3)
+    # 第二个结果跳过与第一个几乎相同的候选
+    assert selected == [0, 2]
+    assert relevance[0] == pytest.approx(1.0)
+
+
+def test_mmr_select_applies_threshold():
+    selected, _ = mmr_select([1, 0], [[1, 0], [0, 1]], k=2, score_threshold=0.5)
+    assert selected == [0]
+
+
+def test_scored_search_on_milvus_uses_native_order_without_vectors(milvus):
+    hits = scored_search(milvus, _unit(1, 0), k=3, score_threshold=0.5)
+
+    assert [doc.page_content for doc, _ in hits] == ["a", "b"]
+    assert [score for _, score in hits] == pytest.approx([1.0, np.sqrt(0.5)], rel=1e-5)
+    assert hits[0][0].metadata == {"source": "s1", "pk": 1}
+    assert milvus.col.searches == [["text", "source"]]
+
+
+def test_scored_search_inner_product_score_is_similarity():
+    store = FakeMilvus({1: {"text": "a", "source": "s", "vector": _unit(1, 1)}}, metric="IP")
+    [(_, score)] = scored_search(store, _unit(1, 0), k=1)
+    assert score == pytest.approx(np.sqrt(0.5), rel=1e-5)
+
+
+def test_search_with_vectors_returns_vectors_in_one_search(milvus):
+    results = search_with_vectors(milvus, _unit(1, 0), fetch_k=2)
+
+    assert [(doc.page_content, vector) for doc, vector in results] == [("a", _unit(1, 0)), ("b", _unit(1, 1))]
+    assert milvus.col.searches == [["text", "source", "vector"]]
+
+
+def test_mmr_search_on_milvus(milvus):
+    hits = mmr_search(milvus, _unit(1, 0.1), k=2, fetch_k=3, lambda_mult=0.3)
+    assert [doc.page_content for doc, _ in hits] == ["a", "c"]
+    assert len(milvus.col.searches) == 1
+
+
+def test_scored_search_on_local_store_is_cosine():
+    store = LocalVectorStore(HashEmbeddings())
+    store.add_texts(["桂枝汤", "麻黄汤", "小柴胡汤"])
+    query = HashEmbeddings().embed_query("桂枝汤")
+
+    hits = scored_search(store, query, k=3, score_threshold=0.99)
+
+    assert [doc.page_content for doc, _ in hits] == ["桂枝汤"]
+    assert hits[0][1] == pytest.approx(1.0, rel=1e-5)
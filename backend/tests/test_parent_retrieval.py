@@ -0,0 +1,36 @@
+from rag_service.parent_retrieval import merge_hits, section_text, split_parent_child
+from rag_service.splitter import ChineseTextSplitter
+
+TEXT = (
+    "太阳之为病，脉浮，头项强痛而恶寒。太阳病，发热，汗出，恶风，脉缓者，名为中风。"
+    "太阳病，或已发热，或未发热，必恶寒，体痛，呕逆，脉阴阳俱紧者，名为伤寒。"
+    "阳明之为病，胃家实是也。少阳之为病，口苦，咽干，目眩也。"
+)
+
+
+def test_children_stay_inside_their_sections():
+    sections, chunks, chunk_sections = split_parent_child(
+        TEXT, ChineseTextSplitter(chunk_size=40, chunk_overlap=0), ChineseTextSplitter(chunk_size=15, chunk_overlap=0)
+    )
+    assert len(sections) > 1
+    assert len(chunks) == len(chunk_sections) > len(sections)
+    for chunk, index in zip(chunks, chunk_sections):
+        start, end = sections[index]
+        assert chunk in TEXT[start:end]
+    # 章节首尾相接，拼起来覆盖全文
+    assert "".join(section_text(TEXT, sections, i, i) for i in range(len(sections))) == TEXT
+
+
+def test_merge_hits_joins_adjacent_sections_and_keeps_rank_order():
+    hits = [("b", 4, 0.9), ("a", 2, 0.8), ("a", 1, 0.7), ("a", 5, 0.6), ("a", 2, 0.5)]
+    merged = merge_hits(hits)
+    assert merged == [
+        {"doc_id": "b", "first_section": 4, "last_section": 4, "score": 0.9, "hits": 1},
+        {"doc_id": "a", "first_section": 1, "last_section": 2, "score": 0.8, "hits": 3},
+        {"doc_id": "a", "first_section": 5, "last_section": 5, "score": 0.6, "hits": 1},
+    ]
+
+
+def test_section_text_spans_range():
+    sections = [(0, 3), (3, 6), (6, 9)]
+    assert section_text("甲乙丙丁戊己庚辛壬", sections, 1, 2) == "丁戊己庚辛壬"
@@ -0,0 +1,99 @@
+import pytest
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app.core import ratelimit
+from app.core.config import settings
+from app.core.ratelimit import MemoryBackend, RateLimiter, SQLiteBackend, TokenReservation, rate_limit, token_quota
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    return SQLiteBackend(str(tmp_path / "ratelimit.sqlite3"))
+
+
+def test_bucket_allows_burst_then_refills(backend):
+    for _ in range(3):
+        assert backend.consume("k", rate=2.0, burst=3, now=100.0) == 0.0
+    assert backend.consume("k", rate=2.0, burst=3, now=100.0) == pytest.approx(0.5)
+    # 0.5 秒补充一个令牌
+    assert backend.consume("k", rate=2.0, burst=3, now=100.5) == 0.0
+    assert backend.consume("other", rate=2.0, burst=3, now=100.5) == 0.0
+
+
+def test_bucket_never_exceeds_burst(backend):
+    backend.consume("k", rate=1.0, burst=2, now=0.0)
+    for _ in range(2):
+        assert backend.consume("k", rate=1.0, burst=2, now=1000.0) == 0.0
+    assert backend.consume("k", rate=1.0, burst=2, now=1000.0) > 0
+
+
+def test_reserve_usage_is_bounded_by_limit(backend):
+    assert backend.reserve_usage("k", "2026-01-01", 60, limit=100)
+    assert not backend.reserve_usage("k", "2026-01-01", 60, limit=100)
+    assert backend.usage("k", "2026-01-01") == 60
+    assert backend.reserve_usage("k", "2026-01-02", 60, limit=100)
+
+
+def test_reservation_settles_actual_usage():
+    limiter = RateLimiter(MemoryBackend(), rate=1.0, burst=1, daily_tokens=1000)
+    reservation, _ = limiter.reserve("k", 400)
+    reservation.settle(150)
+    reservation.settle(999)  # 只结算一次
+    assert limiter.backend.usage("k", reservation.day) == 150
+
+    failed, _ = limiter.reserve("k", 400)
+    failed.settle(0)
+    assert limiter.backend.usage("k", reservation.day) == 150
+
+
+def test_reserve_rejects_until_tomorrow_when_quota_is_used():
+    limiter = RateLimiter(MemoryBackend(), rate=1.0, burst=1, daily_tokens=500)
+    first, _ = limiter.reserve("k", 400)
+    assert first is not None
+    second, retry_after = limiter.reserve("k", 400)
+    assert second is None
+    assert 1 <= retry_after <= 86400
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "CHAT_TOKEN_RESERVATION", 100)
+    monkeypatch.setattr(ratelimit, "_limiter", RateLimiter(MemoryBackend(), rate=0.001, burst=2, daily_tokens=150))
+    chat, knowledge = APIRouter(), APIRouter()
+
+    @chat.post("/chat")
+    def do_chat(quota: TokenReservation = Depends(token_quota)):
+        quota.settle(120)
+        return {"ok": True}
+
+    @knowledge.get("/knowledge/jobs/1")
+    def get_job():
+        return {"ok": True}
+
+    app = FastAPI()
+    app.include_router(chat, dependencies=[Depends(rate_limit)])
+    app.include_router(knowledge, dependencies=[Depends(rate_limit)])
+    return TestClient(app)
+
+
+def test_bucket_returns_429_with_retry_after(client):
+    assert client.get("/knowledge/jobs/1").status_code == 200
+    assert client.get("/knowledge/jobs/1").status_code == 200
+    response = client.get("/knowledge/jobs/1")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_token_quota_only_applies_to_chat(client, monkeypatch):
+    monkeypatch.setattr(ratelimit._limiter, "burst", 100)
+    assert client.post("/chat").status_code == 200
+    # 已用 120，剩余 30 不足一次预留
+    response = client.post("/chat")
+    assert response.status_code == 429
+    assert response.json()["detail"] == "今日 token 配额已用完"
+    assert int(response.headers["Retry-After"]) >= 1
+    assert client.get("/knowledge/jobs/1").status_code == 200
@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+from rag_service.retrieval_cache import RetrievalCache, estimate_size, normalize_query
+
+
+def test_normalize_query():
+    assert normalize_query("  桂枝汤　ＡＢＣ  主治 ") == "桂枝汤 abc 主治"
+
+
+def test_key_ignores_filter_order_and_query_formatting():
+    cache = RetrievalCache(maxbytes=1 << 20, ttl=60)
+    first = cache.key("kb", "桂枝汤", k=3, filters={"tags": ["a"], "category": "方剂"})
+    second = cache.key("kb", " 桂枝汤 ", filters={"category": "方剂", "tags": ["a"]}, k=3)
+    assert first == second
+    assert first != cache.key("kb", "桂枝汤", k=4, filters={"category": "方剂", "tags": ["a"]})
+
+
+def test_bump_invalidates_namespace_only():
+    cache = RetrievalCache(maxbytes=1 << 20, ttl=60)
+    key, other = cache.key("kb1", "q"), cache.key("kb2", "q")
+    cache.set(key, ["hit"])
+    cache.set(other, ["other"])
+    cache.bump("kb1")
+    assert cache.get(cache.key("kb1", "q")) is None
+    assert cache.get(cache.key("kb2", "q")) == ["other"]
+
+
+def test_disabled_cache_never_hits():
+    cache = RetrievalCache(maxbytes=1 << 20, ttl=60, enabled=False)
+    key = cache.key("kb", "q")
+    cache.set(key, ["x"])
+    assert cache.get(key) is None
+
+
+def test_estimate_size_counts_utf8_text():
+    doc = SimpleNamespace(page_content="桂枝汤", metadata={"k": "v"})
+    assert estimate_size("桂枝汤") == 49 + 9
+    assert estimate_size(doc) > estimate_size("桂枝汤")
+    assert estimate_size([doc, doc]) > 2 * estimate_size(doc)
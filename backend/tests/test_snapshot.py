@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pytest
+
+from rag_service.embeddings import HashEmbeddings
+from rag_service.snapshot import (
+    Snapshot, SnapshotError, export_snapshot, insert_records, iter_vectors, restore_vectors
+)
+from rag_service.vectorstore import LocalVectorStore
+
+TEXTS = ["桂枝汤", "麻黄汤", "小柴胡汤", "白虎汤", "承气汤"]
+
+
+@pytest.fixture
+def store():
+    store = LocalVectorStore(HashEmbeddings(), collection_name="source")
+    store.add_texts(TEXTS, metadatas=[
+        {"title": text, "kb_id": "k1" if i % 2 == 0 else "k2", "chunk_index": i} for i, text in enumerate(TEXTS)
+    ])
+    return store
+
+
+def _rows(store):
+    rows = {}
+    for ids, vectors, texts, metadatas in iter_vectors(store, batch_size=2):
+        for pk, vector, text, metadata in zip(ids, vectors, texts, metadatas):
+            rows[pk] = (vector, text, metadata)
+    return rows
+
+
+def test_snapshot_round_trip_preserves_vectors_and_metadata(store, tmp_path):
+    directory = str(tmp_path / "snap")
+    records = {"documents": [{"_id": 1, "title": "伤寒论"}, {"_id": 2, "title": "金匮要略"}]}
+    manifest = export_snapshot(directory, store, records=records, info={"kb_id": "k1"}, batch_size=2)
+    assert manifest["count"] == len(TEXTS)
+
+    snapshot = Snapshot(directory)
+    snapshot.verify()
+    assert snapshot.info == {"kb_id": "k1"}
+    assert [record["title"] for record in snapshot.iter_records("documents")] == ["伤寒论", "金匮要略"]
+    assert list(snapshot.iter_records("missing")) == []
+
+    target = LocalVectorStore(HashEmbeddings(), collection_name="target")
+    id_map = restore_vectors(target, snapshot, batch_size=2)
+
+    before, after = _rows(store), _rows(target)
+    assert set(id_map) == set(before) and all(old == new for old, new in id_map.items())
+    for pk, (vector, text, metadata) in before.items():
+        assert after[pk][1] == text
+        assert after[pk][2] == metadata
+        np.testing.assert_array_equal(after[pk][0], vector)
+    # 恢复后直接可检索，不需要重新计算 embedding
+    query = HashEmbeddings().embed_query("小柴胡汤")
+    assert target.similarity_search_by_vector(query, k=1)[0].page_content == "小柴胡汤"
+
+
+def test_snapshot_float16_and_filters(store, tmp_path):
+    directory = str(tmp_path / "snap16")
+    manifest = export_snapshot(directory, store, float16=True, filters={"kb_id": "k1"})
+    assert manifest["count"] == 3
+
+    target = LocalVectorStore(HashEmbeddings())
+    restore_vectors(target, Snapshot(directory))
+    original = _rows(store)
+    for pk, (vector, text, metadata) in _rows(target).items():
+        assert metadata["kb_id"] == "k1"
+        np.testing.assert_allclose(vector, original[pk][0], atol=1e-3)
+
+
+def test_export_refuses_existing_directory(store, tmp_path):
+    with pytest.raises(SnapshotError):
+        export_snapshot(str(tmp_path), store)
+
+
+def test_verify_detects_corruption(store, tmp_path):
+    directory = str(tmp_path / "snap")
+    export_snapshot(directory, store)
+    with open(os.path.join(directory, "texts.bin"), "r+b") as f:
+        f.write(b"x")
+    with pytest.raises(SnapshotError):
+        Snapshot(directory).verify()
+
+
+def test_not_a_snapshot(tmp_path):
+    with pytest.raises(SnapshotError):
+        Snapshot(str(tmp_path))
+
+
+def test_insert_records_in_batches():
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient().db.documents
+    assert insert_records(collection, ({"_id": i} for i in range(5)), batch_size=2) == 5
+    assert collection.count_documents({}) == 5
@@ -0,0 +1,59 @@
+import pytest
+
+from rag_service.splitter import ChineseTextSplitter, approx_token_len
+
+TEXT = (
+    "第一章 太阳病\n"
+    "太阳之为病，脉浮，头项强痛而恶寒。太阳病，发热，汗出，恶风，脉缓者，名为中风。"
+    "太阳病，或已发热，或未发热，必恶寒，体痛，呕逆，脉阴阳俱紧者，名为伤寒。\n"
+    "第二章 阳明病\n"
+    "阳明之为病，胃家实是也。问曰：何缘得阳明病？答曰：太阳病，若发汗，若下，若利小便，此亡津液。\n"
+)
+
+
+def test_approx_token_len_counts_cjk_chars_and_words():
+    assert approx_token_len("桂枝汤") == 3
+    assert approx_token_len("take 3 g") == 3
+
+
+def test_overlap_must_be_smaller_than_chunk_size():
+    with pytest.raises(ValueError):
+        ChineseTextSplitter(chunk_size=10, chunk_overlap=10)
+
+
+def test_chunks_end_on_sentence_boundaries_and_respect_size():
+    splitter = ChineseTextSplitter(chunk_size=40, chunk_overlap=0)
+    chunks = splitter.split_text(TEXT)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert approx_token_len(chunk) <= 40
+        assert chunk[-1] in "。！？；" or chunk.endswith("病")
+
+
+def test_section_marker_starts_new_chunk():
+    chunks = ChineseTextSplitter(chunk_size=200, chunk_overlap=0).split_text(TEXT)
+    assert len(chunks) == 2
+    assert chunks[0].startswith("第一章") and chunks[1].startswith("第二章")
+
+
+def test_spans_match_split_text():
+    splitter = ChineseTextSplitter(chunk_size=30, chunk_overlap=10)
+    spans = splitter.split_spans(TEXT)
+    assert [TEXT[start:end] for start, end in spans] == splitter.split_text(TEXT)
+
+
+def test_overlap_repeats_whole_sentences():
+    text = "".join(f"第{i}句短话。" for i in range(1, 21))
+    chunks = ChineseTextSplitter(chunk_size=30, chunk_overlap=12).split_text(text)
+    assert len(chunks) > 1
+    for prev, cur in zip(chunks, chunks[1:]):
+        overlap = next(cur[:i] for i in range(len(cur), 0, -1) if prev.endswith(cur[:i]))
+        assert overlap.endswith("。") and approx_token_len(overlap) <= 12
+        assert approx_token_len(cur) <= 30
+    assert chunks[-1].endswith("第20句短话。")
+
+
+def test_stream_matches_whole_text():
+    splitter = ChineseTextSplitter(chunk_size=30, chunk_overlap=10)
+    blocks = [TEXT[i:i + 7] for i in range(0, len(TEXT), 7)]
+    assert list(splitter.iter_split(blocks)) == splitter.split_text(TEXT)
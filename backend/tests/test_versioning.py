@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+from rag_service.versioning import chunk_hash, expired_versions, is_current_hit
+
+NOW = datetime(2026, 1, 10)
+
+
+def _versions(*ages_in_days):
+    return [
+        {"version": number, "archived_at": NOW - timedelta(days=age)}
+        for number, age in enumerate(ages_in_days, start=1)
+    ]
+
+
+def test_chunk_hash_is_content_addressed():
+    assert chunk_hash("桂枝汤") == chunk_hash("桂枝汤")
+    assert chunk_hash("桂枝汤") != chunk_hash("桂枝汤 ")
+    assert len(chunk_hash("")) == 64
+
+
+def test_hit_without_refs_counts_as_current():
+    assert is_current_hit(None, {})
+
+
+def test_hit_is_current_only_for_current_revision():
+    current = {"d1": "rev2", "d2": "rev9"}
+    assert is_current_hit([{"doc_id": "d1", "rev": "rev2", "chunk_index": 0}], current)
+    assert not is_current_hit([{"doc_id": "d1", "rev": "rev1", "chunk_index": 0}], current)
+    # 旧版本和其他文档的当前版本共用的向量
+    assert is_current_hit([
+        {"doc_id": "d1", "rev": "rev1", "chunk_index": 0},
+        {"doc_id": "d2", "rev": "rev9", "chunk_index": 3},
+    ], current)
+
+
+def test_hit_of_deleted_document_is_not_current():
+    assert not is_current_hit([{"doc_id": "gone", "rev": "rev1", "chunk_index": 0}], {"d1": "rev2"})
+    assert not is_current_hit([], {"d1": "rev2"})
+
+
+def test_ref_without_rev_matches_any_revision():
+    assert is_current_hit([{"doc_id": "d1", "chunk_index": 0}], {"d1": "rev2"})
+
+
+def test_expired_versions_by_count():
+    expired = expired_versions(_versions(5, 4, 3, 2), keep=2, now=NOW)
+    assert [version["version"] for version in expired] == [1, 2]
+
+
+def test_expired_versions_by_age():
+    expired = expired_versions(_versions(10, 1), max_age=3 * 86400, now=NOW)
+    assert [version["version"] for version in expired] == [1]
+
+
+def test_expired_versions_combines_count_and_age():
+    expired = expired_versions(_versions(10, 5, 1), keep=2, max_age=7 * 86400, now=NOW)
+    assert [version["version"] for version in expired] == [1]
+    expired = expired_versions(_versions(10, 5, 1), keep=1, max_age=7 * 86400, now=NOW)
+    assert [version["version"] for version in expired] == [1, 2]
+
+
+def test_no_policy_keeps_everything():
+    assert expired_versions(_versions(100, 50), now=NOW) == []